@@ -0,0 +1,101 @@
+"""
+Measures the throughput of the Unreal Notation parsers on a synthetic
+.props.txt dump, or on the files given on the command line.
+Run from the repository's root with `python -m benchmarks.bench_parser`.
+"""
+
+import argparse
+import time
+
+from bl2_skingen.props import PARAMETER_VALUE_KEYS
+from bl2_skingen.unreal_notation import LegacyParser, Parser
+
+def make_props(params, padding):
+	"""
+	Returns the contents of a props file with `params` entries in each of
+	the parameter value lists and `padding` blocks of unrelated data around
+	them, laid out like the files UE Viewer exports.
+	"""
+	lines = ["Parent = MaterialInstanceConstant'GD_Foo.Mat'"]
+	def pad(tag):
+		for i in range(padding):
+			lines.extend((
+				f"{tag}Block{i} =",
+				"{",
+				f"\tName = {tag}_{i}",
+				"\tOrigin = { Offset = { X=-1.0, Y=-1.0, Z=-1.0 } }",
+				"\tFlags = ",
+				"\tComment = Some text with spaces",
+				"}",
+			))
+	pad("Leading")
+	for key in PARAMETER_VALUE_KEYS:
+		lines.append(f"{key}[{params}] =")
+		lines.append("{")
+		for i in range(params):
+			if key == "VectorParameterValues":
+				value = f"{{ R={i / params:.6f}, G=0.5, B=0.25, A=1.000000 }}"
+			elif key == "TextureParameterValues":
+				value = f"Texture2D'GD.Tex.Tex_{i}'"
+			else:
+				value = f"{i / params:.6f}"
+			lines.extend((
+				f"\t{key}[{i}] =",
+				"\t{",
+				f"\t\tParameterName = p_{key[0]}{i}",
+				f"\t\tParameterValue = {value}",
+				"\t\tParameterInfo = None",
+				"\t}",
+			))
+		lines.append("}")
+	pad("Trailing")
+	return "\n".join(lines) + "\n"
+
+def bench(label, func, data, repeat):
+	"""
+	Runs `func` on `data` `repeat` times, prints the best throughput and
+	returns the last result.
+	"""
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		res = func(data)
+		best = min(best, time.perf_counter() - start)
+	print(f"\t{label:<12} {best * 1000:9.2f} ms  {len(data) / best / (1 << 20):8.2f} MiB/s")
+	return res
+
+def main():
+	argparser = argparse.ArgumentParser(description = __doc__,
+		formatter_class = argparse.RawDescriptionHelpFormatter)
+	argparser.add_argument("files", nargs = "*", help = "Props files to parse "
+		"instead of a synthetic one.")
+	argparser.add_argument("-params", type = int, default = 2000, help = "Entries "
+		"per parameter value list of the synthetic file.")
+	argparser.add_argument("-padding", type = int, default = 2000, help = "Unrelated "
+		"blocks around the parameter value lists of the synthetic file.")
+	argparser.add_argument("-repeat", type = int, default = 5, help = "Runs per parser; "
+		"the best one is reported.")
+	args = argparser.parse_args()
+
+	if args.files:
+		inputs = []
+		for path in args.files:
+			with open(path, "r") as h:
+				inputs.append((path, h.read()))
+	else:
+		inputs = [(f"synthetic ({args.params} params, {args.padding} blocks)",
+			make_props(args.params, args.padding))]
+
+	for name, data in inputs:
+		print(f"{name}: {len(data) / 1024:.1f} KiB")
+		legacy = bench("legacy", lambda d: LegacyParser(d).parse(), data, args.repeat)
+		full = bench("tokenizer", lambda d: Parser(d).parse(), data, args.repeat)
+		selective = bench("selective", lambda d: Parser(d, PARAMETER_VALUE_KEYS).parse(),
+			data, args.repeat)
+		if full != legacy:
+			print("\tMISMATCH: tokenizer output differs from the legacy parser's!")
+		if selective != {k: v for k, v in legacy.items() if k in PARAMETER_VALUE_KEYS}:
+			print("\tMISMATCH: selective output differs from the legacy parser's!")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,268 @@
+"""
+Times the imaging kernels of every backend, the props file parser and a
+whole run of the skin generator on synthetic packages of several sizes
+(see benchmarks.synthetic). Results can be written to a JSON file and
+compared to those of another commit with -compare.
+Run from the repository's root with `python -m benchmarks.bench_suite`.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+from pathlib import Path
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+import numpy
+import PIL
+from PIL import Image
+
+from bl2_skingen.backends import BACKENDS, MASK_FILTERS, get_backend
+from bl2_skingen.decalspec import parse_decalspec
+from bl2_skingen.flags import FLAGS
+from bl2_skingen.props import PARAMETER_VALUE_KEYS, unify_props
+from bl2_skingen.skingen import SkinGenerator, __version__
+from bl2_skingen.unreal_notation import Parser
+
+from benchmarks.synthetic import make_package
+
+# Bumped whenever the layout of the results file changes.
+RESULTS_VERSION = 1
+DEFAULT_SIZES = (512, 1024, 2048)
+# Tiles the decal over the whole image, so the decal kernels' cost grows
+# with the image like the others'.
+BENCH_DECALSPEC = "10% 10% 30 1.5 y"
+
+BENCH_LOGGER = logging.getLogger(__name__)
+BENCH_LOGGER.addHandler(logging.NullHandler())
+BENCH_LOGGER.propagate = False
+
+def measure(func, repeat, setup = None):
+	"""
+	Calls `func` once to warm up, then `repeat` more times and returns the
+	durations of those in seconds. If `setup` is given, it is called
+	before every call of `func`, which is passed its result; only `func`
+	is timed.
+	"""
+	times = []
+	for i in range(repeat + 1):
+		args = () if setup is None else (setup(),)
+		start = time.perf_counter()
+		func(*args)
+		if i:
+			times.append(time.perf_counter() - start)
+	return times
+
+def kernel_benchmarks(backend, package, threads):
+	"""
+	Returns a list of (name, function, setup) tuples timing each of the
+	kernels of `backend` on the body of `package`. See `measure` for
+	function and setup.
+	"""
+	sg = SkinGenerator(logger = BENCH_LOGGER, in_dir = package, decalspec = BENCH_DECALSPEC)
+	sg._prepare()
+	part = sg.body
+	sg._fill_part_attrs(part)
+	mask = numpy.array(Image.open(part.msk))
+	dif = numpy.array(Image.open(part.dif))
+	decal = Image.open(sg._get_decal(part))
+	decal.load()
+	spec = parse_decalspec(part.decalspec, dif.shape[1], dif.shape[0])
+	spec_args = (spec.posx, spec.posy, spec.rot, spec.scalex, spec.scaley, spec.repeat)
+	mask_filter = MASK_FILTERS.index("bilinear")
+
+	hard, soft = backend.split_mask(mask, mask_filter)
+	lut = backend.build_color_lut(part.colors)
+	overlay = backend.ue_color_diff(hard, soft, part.colors, threads = threads)
+	decal_arr, decal_x, decal_y = backend.place_decal(decal, dif.shape[1], dif.shape[0],
+		*spec_args)
+	masked_decal, off_x, off_y = backend.apply_decal(decal, hard, part.decal_color,
+		part.decal_area, *spec_args, threads = threads)
+	decal_region = numpy.s_[off_y:off_y + masked_decal.shape[0],
+		off_x:off_x + masked_decal.shape[1]]
+
+	return [
+		("split_mask", lambda: backend.split_mask(mask, mask_filter), None),
+		("build_color_lut", lambda: backend.build_color_lut(part.colors), None),
+		("ue_color_diff", lambda: backend.ue_color_diff(hard, soft, part.colors,
+			threads = threads), None),
+		("ue_color_diff_lut", lambda: backend.ue_color_diff_lut(hard, soft, lut,
+			threads = threads), None),
+		("place_decal", lambda: backend.place_decal(decal, dif.shape[1], dif.shape[0],
+			*spec_args), None),
+		("apply_decal", lambda: backend.apply_decal(decal, hard, part.decal_color,
+			part.decal_area, *spec_args, threads = threads), None),
+		("blend_inplace", lambda base: backend.blend_inplace(masked_decal, base,
+			threads = threads), lambda: overlay[decal_region].copy()),
+		("multiply", lambda: backend.multiply(overlay, dif, threads = threads), None),
+		("render_fused", lambda: backend.render_fused(mask, part.colors, None, decal_arr,
+			decal_x, decal_y, part.decal_color, part.decal_area, dif,
+			mask_filter = mask_filter, threads = threads), None),
+	]
+
+def props_benchmarks(package):
+	"""
+	Returns a list of (name, function, setup) tuples timing the parsing
+	of the body's props file of `package`, as done by the skin generator.
+	"""
+	sg = SkinGenerator(logger = BENCH_LOGGER, in_dir = package)
+	sg._locate_props_files()
+	with open(sg.body.props, "r") as h:
+		data = h.read()
+	parsed = Parser(data, PARAMETER_VALUE_KEYS).parse()
+	return [
+		("parse", lambda: Parser(data, PARAMETER_VALUE_KEYS).parse(), None),
+		("parse_full", lambda: Parser(data).parse(), None),
+		("unify_props", lambda: unify_props(parsed), None),
+	]
+
+def run_benchmark(package, out_dir, backend_name, threads):
+	"""
+	Returns a function rendering and saving both parts of `package` to
+	`out_dir` with a new SkinGenerator.
+	"""
+	def run():
+		SkinGenerator(logger = BENCH_LOGGER, in_dir = package, out_dir = out_dir,
+			out_fmt = "{part}", flag = FLAGS.NO_ASK, backend = backend_name,
+			threads = threads).run()
+	return run
+
+def git_commit():
+	"""
+	Returns the hash of the checked out commit, suffixed with "-dirty" if
+	the working tree has changes, or None if it can not be determined.
+	"""
+	cwd = Path(__file__).parent
+	try:
+		commit = subprocess.run(("git", "rev-parse", "HEAD"), cwd = cwd, check = True,
+			capture_output = True, text = True).stdout.strip()
+		dirty = subprocess.run(("git", "status", "--porcelain", "--untracked-files=no"),
+			cwd = cwd, check = True, capture_output = True, text = True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+	return commit + ("-dirty" if dirty else "")
+
+def get_environment(args):
+	return {
+		"commit": git_commit(),
+		"skingen": __version__,
+		"python": platform.python_version(),
+		"numpy": numpy.__version__,
+		"pillow": PIL.__version__,
+		"platform": platform.platform(),
+		"cpus": os.cpu_count(),
+		"threads": args.threads,
+		"repeat": args.repeat,
+		"date": datetime.datetime.now().isoformat(timespec = "seconds"),
+	}
+
+def result_key(result):
+	return (result["group"], result["name"], result["backend"], result["size"])
+
+def load_baseline(path):
+	"""
+	Returns the results of the results file at `path` as a dict mapping
+	their result_key to them.
+	"""
+	with open(path, "r") as h:
+		data = json.load(h)
+	if data.get("version") != RESULTS_VERSION:
+		raise ValueError(f"{path} has results version {data.get('version')}, "
+			f"expected {RESULTS_VERSION}.")
+	return {result_key(result): result for result in data["results"]}
+
+def report(result, baseline):
+	line = (f"\t{result['group'] + '.' + result['name']:<28} {result['backend'] or '-':<7} "
+		f"{result['size'] or '-':>5} {result['best'] * 1000:10.2f} ms "
+		f"(median {result['median'] * 1000:.2f})")
+	if baseline is not None:
+		old = baseline.get(result_key(result))
+		if old is None:
+			line += "      new"
+		else:
+			line += f" {result['best'] / old['best']:7.2f}x"
+	print(line, flush = True)
+
+def main():
+	argparser = argparse.ArgumentParser(description = __doc__,
+		formatter_class = argparse.RawDescriptionHelpFormatter)
+	argparser.add_argument("-sizes", type = int, nargs = "+", default = DEFAULT_SIZES,
+		help = "Texture sizes of the synthetic packages. Defaults to "
+		f"{' '.join(map(str, DEFAULT_SIZES))}.")
+	argparser.add_argument("-backends", nargs = "+", choices = tuple(BACKENDS),
+		default = None, help = "Backends to time. Defaults to all that can be loaded.")
+	argparser.add_argument("-repeat", type = int, default = 5, help = "Timed runs per "
+		"benchmark, after one to warm up. Defaults to %(default)s.")
+	argparser.add_argument("-threads", type = int, default = 1, help = "Threads to "
+		"pass to the kernels and the skin generator. Defaults to %(default)s.")
+	argparser.add_argument("-groups", nargs = "+", choices = ("kernel", "props", "run"),
+		default = ("kernel", "props", "run"), help = "Benchmarks to run. Defaults to all.")
+	argparser.add_argument("-out", default = None, help = "JSON file to write the "
+		"results to.")
+	argparser.add_argument("-compare", default = None, help = "JSON file written by an "
+		"earlier run; the ratio of each best time to the one in it is printed, values "
+		"above 1 being slower.")
+	argparser.add_argument("-workdir", default = None, help = "Directory to create the "
+		"synthetic packages and output files in. Defaults to a temporary directory, "
+		"which is removed afterwards.")
+	args = argparser.parse_args()
+
+	baseline = None if args.compare is None else load_baseline(args.compare)
+	backends = []
+	for name in (BACKENDS if args.backends is None else args.backends):
+		try:
+			backends.append(get_backend(name))
+		except ImportError as exc:
+			if args.backends is not None:
+				raise
+			print(f"Skipping backend {name}: {exc}")
+
+	workdir = Path(tempfile.mkdtemp(prefix = "skingen_bench_") if args.workdir is None
+		else args.workdir)
+	environment = get_environment(args)
+	print(", ".join(f"{k}: {v}" for k, v in environment.items()))
+	results = []
+	def record(group, name, backend, size, times):
+		result = {
+			"group": group, "name": name, "backend": backend, "size": size,
+			"best": min(times), "median": statistics.median(times), "runs": times,
+		}
+		results.append(result)
+		report(result, baseline)
+
+	try:
+		for size in args.sizes:
+			print(f"Creating {size}x{size} package...", flush = True)
+			package = make_package(Path(workdir, str(size)), size)
+			for backend in backends:
+				if "kernel" in args.groups:
+					for name, func, setup in kernel_benchmarks(backend, package, args.threads):
+						record("kernel", name, backend.name, size,
+							measure(func, args.repeat, setup))
+				if "run" in args.groups:
+					out_dir = Path(workdir, "out", str(size), backend.name)
+					record("run", "skingen", backend.name, size, measure(
+						run_benchmark(package, out_dir, backend.name, args.threads),
+						args.repeat))
+			# The props files do not depend on the texture size.
+			if "props" in args.groups and size == args.sizes[0]:
+				for name, func, setup in props_benchmarks(package):
+					record("props", name, None, None, measure(func, args.repeat, setup))
+	finally:
+		if args.workdir is None:
+			shutil.rmtree(workdir, ignore_errors = True)
+
+	if args.out is not None:
+		with open(args.out, "w") as h:
+			json.dump({"version": RESULTS_VERSION, "environment": environment,
+				"results": results}, h, indent = "\t")
+		print(f"Wrote results to {args.out}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,183 @@
+"""
+Generates synthetic skin packages laid out like the ones UE Viewer
+extracts, for benchmarking without game files. Each package has a props
+file for the body and head and TGA diffuse, mask, normal and decal
+textures. Textures and colors are derived from a seed, so packages made
+with the same arguments are identical.
+Run from the repository's root with
+`python -m benchmarks.synthetic <root> [-size N]` to create one.
+"""
+
+import argparse
+from pathlib import Path
+import random
+
+import numpy
+from PIL import Image
+
+from bl2_skingen.props import TEXTURE_FILE
+from bl2_skingen.skingen import PROPSFILE
+
+PARTS = ("Body", "Head")
+COLOR_NAMES = ("A", "B", "C")
+COLOR_SHADES = ("Shadow", "Midtone", "Hilight")
+
+def _vector(rnd):
+	return (f"{{ R={rnd.random():.6f}, G={rnd.random():.6f}, B={rnd.random():.6f}, "
+		f"A=1.000000 }}")
+
+def _param_list(key, params):
+	lines = [f"{key}[{len(params)}] =", "{"]
+	for i, (name, value) in enumerate(params):
+		lines.extend((
+			f"\t{key}[{i}] =",
+			"\t{",
+			f"\t\tParameterName = {name}",
+			f"\t\tParameterValue = {value}",
+			"\t\tParameterInfo = None",
+			"\t}",
+		))
+	lines.append("}")
+	return lines
+
+def make_props(skin, part, rnd):
+	"""
+	Returns the contents of a props file for the part `part` ("Body" or
+	"Head") of the skin `skin`, with colors drawn from the random.Random
+	instance `rnd`. Besides the parameters skingen reads, it contains
+	the unrelated ones and blocks UE Viewer exports as well.
+	"""
+	vectors = [(f"p_{color}Color{shade}", _vector(rnd))
+		for color in COLOR_NAMES for shade in COLOR_SHADES]
+	vectors.extend((
+		("p_DecalColor", _vector(rnd)),
+		("p_DecalChannelScale", "{ R=1.000000, G=0.500000, B=0.000000, A=1.000000 }"),
+		("p_RimLightColor", _vector(rnd)),
+		("p_SpecularColor", _vector(rnd)),
+	))
+	textures = [
+		("p_Diffuse", f"Texture2D'GD_{skin}.Textures.{part}_Dif'"),
+		("p_Masks", f"Texture2D'GD_{skin}.Textures.{part}_Msk'"),
+		("p_Normal", f"Texture2D'GD_{skin}.Textures.{part}_Nrm'"),
+		("p_Decal", f"Texture2D'GD_{skin}.Textures.Decal'"),
+	]
+	scalars = [
+		("p_SpecularPower", f"{rnd.uniform(1, 64):.6f}"),
+		("p_RimLightScale", f"{rnd.random():.6f}"),
+		("p_DecalOpacity", "1.000000"),
+	]
+	lines = [
+		f"Parent = MaterialInstanceConstant'GD_{skin}.Materials.Mat_{part}_Base'",
+		"PhysMaterial = None",
+		"bHasStaticPermutationResource = true",
+	]
+	lines.extend(_param_list("ScalarParameterValues", scalars))
+	lines.extend(_param_list("TextureParameterValues", textures))
+	lines.extend(_param_list("VectorParameterValues", vectors))
+	lines.extend((
+		"StaticParameters =",
+		"{",
+		"\tStaticSwitchParameters[2] =",
+		"\t{",
+		"\t\tStaticSwitchParameters[0] = { ParameterName = p_UseDecal, Value = true, "
+			"bOverride = true }",
+		"\t\tStaticSwitchParameters[1] = { ParameterName = p_UseRim, Value = false, "
+			"bOverride = false }",
+		"\t}",
+		"}",
+		f"ReferencedTextures[{len(textures)}] =",
+		"{",
+	))
+	lines.extend(f"\tReferencedTextures[{i}] = {value}"
+		for i, (_, value) in enumerate(textures))
+	lines.append("}")
+	return "\n".join(lines) + "\n"
+
+def make_diffuse(size, rng):
+	"""
+	Returns a `size` x `size` RGB diffuse texture of smooth gradients and
+	noise as a numpy array.
+	"""
+	y, x = numpy.mgrid[0:size, 0:size] * (255 / size)
+	arr = numpy.stack((x, y, (x + y) / 2), axis = -1)
+	arr += rng.integers(-24, 24, arr.shape)
+	return numpy.clip(arr, 0, 255).astype(numpy.uint8)
+
+def make_mask(size, rng):
+	"""
+	Returns a `size` x `size` RGB mask texture as a numpy array; its left
+	half is the soft mask, a noisy gradient, and its right half the hard
+	mask, which is divided into regions each dominated by one channel.
+	"""
+	half = size // 2
+	y, x = numpy.mgrid[0:size, 0:half]
+	soft = numpy.stack((x * (255 / half), y * (255 / size),
+		numpy.full(x.shape, 128.0)), axis = -1)
+	soft += rng.integers(-32, 32, soft.shape)
+	region = (x * 4 // half + y * 3 // size) % 3
+	hard = rng.integers(0, 64, (size, half, 3))
+	hard[region == 0, 0] += 192
+	hard[region == 1, 1] += 192
+	hard[region == 2, 2] += 192
+	return numpy.concatenate((numpy.clip(soft, 0, 255), hard), axis = 1).astype(numpy.uint8)
+
+def make_decal(size):
+	"""
+	Returns a `size` x `size` RGBA decal as a numpy array; a ring whose
+	alpha falls off towards its center.
+	"""
+	y, x = numpy.mgrid[0:size, 0:size]
+	dist = numpy.hypot(x - (size - 1) / 2, y - (size - 1) / 2) / (size / 2)
+	arr = numpy.zeros((size, size, 4), dtype = numpy.uint8)
+	arr[..., :3] = 255
+	arr[..., 3] = numpy.where(dist < 1, numpy.clip(dist * 320, 0, 255), 0)
+	return arr
+
+def make_package(root, size, class_ = "Siren", skin = "Synth", seed = 0):
+	"""
+	Creates a synthetic package named CD_<class_>_Skin_<skin>_SF with
+	`size` x `size` textures below `root` and returns its path.
+
+	root : str;pathlib.Path | Directory to create the package in.
+	size : int | Width and height of the diffuse and mask textures, a power
+		of two.
+	class_ : str | Player class, one of bl2_skingen.skingen.CLASSES.
+	skin : str | Name of the skin.
+	seed : int | Seed to derive the textures and colors from.
+	"""
+	package = Path(root, f"CD_{class_}_Skin_{skin}_SF")
+	rnd = random.Random(seed)
+	rng = numpy.random.default_rng(seed)
+	def save(name, arr):
+		path = Path(package, TEXTURE_FILE.format(name))
+		path.parent.mkdir(parents = True, exist_ok = True)
+		Image.fromarray(arr).save(path)
+
+	for part in PARTS:
+		props_path = Path(package, PROPSFILE.format(skin, part))
+		props_path.parent.mkdir(parents = True, exist_ok = True)
+		props_path.write_text(make_props(skin, part, rnd))
+		save(f"{part}_Dif", make_diffuse(size, rng))
+		save(f"{part}_Msk", make_mask(size, rng))
+		save(f"{part}_Nrm", numpy.full((size // 4, size // 4, 3), (128, 128, 255),
+			dtype = numpy.uint8))
+	save("Decal", make_decal(max(size // 8, 8)))
+	return package
+
+def main():
+	argparser = argparse.ArgumentParser(description = __doc__,
+		formatter_class = argparse.RawDescriptionHelpFormatter)
+	argparser.add_argument("root", help = "Directory to create the package in.")
+	argparser.add_argument("-size", type = int, default = 1024, help = "Width and height "
+		"of the textures. Defaults to %(default)s.")
+	argparser.add_argument("-class", default = "Siren", dest = "class_", help = \
+		"Player class of the skin. Defaults to %(default)s.")
+	argparser.add_argument("-skin", default = "Synth", help = "Name of the skin. "
+		"Defaults to %(default)s.")
+	argparser.add_argument("-seed", type = int, default = 0, help = "Seed to derive the "
+		"textures and colors from. Defaults to %(default)s.")
+	args = argparser.parse_args()
+	print(make_package(args.root, args.size, args.class_, args.skin, args.seed))
+
+if __name__ == "__main__":
+	main()
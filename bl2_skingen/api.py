@@ -0,0 +1,90 @@
+"""
+Library interface to the skin generator. render_skin renders a package's
+parts in memory and returns them instead of writing them to disk.
+Every call keeps its state to itself, so it may be called from multiple
+threads at once.
+
+Errors are raised as subclasses of SkinGenerationError:
+	PackageError: The package directory is not laid out as expected.
+	PropsError: A props file can not be parsed or lacks information.
+	TextureError: A texture is missing or can not be used.
+	BackendError: The imaging backend is unknown or can not be loaded.
+	OptionError: Another option, such as mask_filter or parts, has an invalid value.
+	DecalspecError: The given decalspec is invalid.
+"""
+
+import logging
+
+from PIL import Image
+
+from bl2_skingen.decalspec import validate_decalspec
+from bl2_skingen.flags import FLAGS
+from bl2_skingen.skingen import BackendError, OptionError, PackageError, PropsError, \
+	SkinGenerationError, SkinGenerator, TextureError
+
+__all__ = ("render_skin", "FLAGS", "SkinGenerationError", "PackageError", "PropsError",
+	"TextureError", "BackendError", "OptionError", "DecalspecError")
+
+API_LOGGER = logging.getLogger(__name__)
+# Stay quiet unless the embedding application configures logging.
+API_LOGGER.addHandler(logging.NullHandler())
+
+class DecalspecError(SkinGenerationError, ValueError):
+	"""
+	Raised when the decalspec passed to render_skin is invalid.
+	"""
+	pass
+
+def render_skin(package_dir, parts = None, decalspec = None, flags = 0, backend = None,
+		threads = 1, mask_filter = "bilinear", as_image = False, cache = None, index = None,
+		logger = None, preview = None, profiler = None):
+	"""
+	Renders parts of an extracted skin package and returns them as a dict
+	mapping the parts' names ("body", "head") to RGB numpy arrays, or PIL
+	images if `as_image` is set. Nothing is written to disk, except to
+	`cache` if one is given.
+
+	package_dir : str;pathlib.Path | Package directory, following a format
+		like CD_<Class>_Skin_<Skin_name>_SF.
+	parts : None;Iterable[str] | Names of the parts to render. None to
+		render the ones not excluded by FLAGS.EXCLUDE_BODY/EXCLUDE_HEAD.
+	decalspec : None;str | Decalspec to place decals by, see
+		`bl2_skingen.argparser`. None to use the class's default.
+	flags : int | Combination of FLAGS. Only those that affect the rendered
+		image (KEEP_WHITE, NO_DECAL, COLOR_LUT, MULTIPASS, EXCLUDE_BODY,
+		EXCLUDE_HEAD) have an effect.
+	backend : None;str | Name of the imaging backend, None for the fastest
+		available one.
+	threads : int | Amount of threads to split an image's rows across.
+	mask_filter : str | One of bl2_skingen.backends.MASK_FILTERS.
+	as_image : bool | Whether to return PIL images instead of numpy arrays.
+	cache : None;bl2_skingen.texture_cache.TextureCache | Cache to read
+		decoded textures from and store them in.
+	index : None;bl2_skingen.param_index.ParameterIndex | Index to read the
+		parameters of unchanged props files from.
+	logger : None;logging.Logger | Logger to report progress to. Defaults to
+		this module's logger, which is silent unless configured otherwise.
+	preview : None;int | Render scaled down to at most this width, with the
+		decals placed where they are at full size.
+	profiler : None;bl2_skingen.profiler.Profiler | Profiler to record the
+		time and memory every stage takes with. Register hooks on it to
+		receive each stage's measurements as they are made.
+	"""
+	if decalspec is not None and not validate_decalspec(decalspec):
+		raise DecalspecError(f"Invalid decalspec: {decalspec!r}")
+	if parts is not None:
+		parts = list(parts)
+		for part in parts:
+			if part.lower() not in ("body", "head"):
+				raise OptionError(f"Unknown part: {part!r}")
+
+	sg = SkinGenerator(
+		logger = API_LOGGER if logger is None else logger, in_dir = package_dir,
+		flag = flags, decalspec = decalspec, backend = backend, threads = threads,
+		mask_filter = mask_filter, cache = cache, index = index, preview = preview,
+		profiler = profiler,
+	)
+	res = sg.render(parts)
+	if as_image:
+		res = {name: Image.fromarray(arr) for name, arr in res.items()}
+	return res
@@ -1,12 +1,19 @@
 """Provides the get_argparser method, which creates the skingen
-argparser responsible for grabbing parameters from the command line.
+argparser responsible for grabbing parameters from the command line,
+as well as get_batch_argparser, get_index_argparser and get_serve_argparser
+for the batch, index and serve subcommands.
 """
 
 import argparse
 import os
 
 from bl2_skingen.argparse_formatter import SkingenArgparseFormatter
+from bl2_skingen.backends import BACKENDS, MASK_FILTERS
 from bl2_skingen.flags import FLAGS
+from bl2_skingen.output import DEFAULT_PNG_FILTER, DEFAULT_PNG_LEVEL, OUTPUT_FORMATS, \
+	PNG_FILTERS
+from bl2_skingen.param_index import INDEX_NAME
+from bl2_skingen.texture_cache import DEFAULT_CACHE_SIZE
 
 def get_argparser():
 	"""
@@ -16,17 +23,138 @@ def get_argparser():
 
 	argparser.add_argument("input_dir", help = \
 		"Input directory from the extracted Unreal Package. It should follow a " \
-		"format like CD_<Class>_Skin_<Skin_name>_SF.")
+		"format like CD_<Class>_Skin_<Skin_name>_SF.\n"
+		"To render all packages below a directory, run \"batch\" as the first argument "
+		"instead; see \"batch -h\".")
+	argparser.add_argument("-sweep", default = None, metavar = "FILE", help = \
+		"Render the package once for every decalspec in FILE, one per line, instead of "
+		"once. The overlay is generated only once per part and every decalspec only "
+		"renders the region its decal covers again. The output name needs a {variant} "
+		"field, which is the decalspec's number, e.g. \"skin_{part}_{class_}_{variant}\".")
+	argparser.add_argument("-sweep-jobs", type = int, default = 1, dest = "sweep_jobs",
+		help = "Amount of decalspecs of a -sweep to render at the same time. Implies "
+		"-noask if greater than 1.")
+	argparser.add_argument("-profile", default = None, metavar = "FILE", help = \
+		"Measure the wall time, CPU time and peak memory of every stage of the run, such "
+		"as decoding, mask splitting, color diffing, decal placement and encoding, for "
+		"each part and write them to FILE as JSON. Tracing memory slows the run down "
+		"somewhat.")
+	_add_common_arguments(argparser, "skin_{part}_{class_}")
+
+	return argparser
+
+def get_batch_argparser():
+	"""
+	Returns an argparser for the batch subcommand, which renders every
+	package found below a root directory.
+	"""
+	argparser = argparse.ArgumentParser(prog = "bl2-skingen batch",
+		formatter_class = SkingenArgparseFormatter)
+
+	argparser.add_argument("root", help = \
+		"Directory to search for extracted Unreal Packages. Every directory below it "
+		"following the format CD_<Class>_..._SF will be rendered.")
+	argparser.add_argument("-jobs", "-j", type = int, default = os.cpu_count(), help = \
+		"Amount of worker processes to render packages with. Defaults to the amount of "
+		"CPUs.")
+	_add_common_arguments(argparser, "{class_}_{skin}_{part}")
+
+	return argparser
+
+def get_index_argparser():
+	"""
+	Returns an argparser for the index subcommand, which stores the
+	parameters of every material below a root directory in an index.
+	"""
+	argparser = argparse.ArgumentParser(prog = "bl2-skingen index",
+		formatter_class = SkingenArgparseFormatter)
+
+	argparser.add_argument("root", help = \
+		"Directory to search for extracted props files "
+		"(MaterialInstanceConstant/Mati_*.props.txt). Files indexed before are only "
+		"parsed again if they have changed.")
+	argparser.add_argument("-index-file", default = None, dest = "index_file", help = \
+		f"Path of the index. Defaults to \"{INDEX_NAME}\" in the root directory.")
+	argparser.add_argument("-uses", default = None, help = \
+		"After indexing, list the parameters referring to a texture whose path "
+		"matches this SQL LIKE pattern, for example \"%%Decal%%\".")
+	argparser.add_argument("-s", default = 0, action = "count", dest = "silence", help = \
+		"Shut the script up to varying degrees (-s, -ss)")
+
+	return argparser
+
+def get_serve_argparser():
+	"""
+	Returns an argparser for the serve subcommand, which keeps worker
+	processes running and renders packages on request.
+	"""
+	argparser = argparse.ArgumentParser(prog = "bl2-skingen serve",
+		formatter_class = SkingenArgparseFormatter, description = \
+		"Render packages on request. Jobs are POSTed to /render as JSON objects like "
+		"{\"package\": \"<dir>\", \"parts\": [\"body\"]}, which may also contain "
+		"\"decalspec\", \"out\", \"outname\", \"format\" and \"flags\", a list of names "
+		"out of KEEP_WHITE, NO_DECAL, COLOR_LUT, MULTIPASS and FORCE. The job's progress "
+		"is streamed back as one JSON object per line. GET /stats returns the queue depth "
+		"and latencies. The options below are the defaults for jobs that do not specify "
+		"them.")
+
+	argparser.add_argument("-host", default = "127.0.0.1", help = \
+		"Address to listen for HTTP requests on. Defaults to %(default)s.")
+	argparser.add_argument("-port", type = int, default = 8787, help = \
+		"Port to listen for HTTP requests on. Defaults to %(default)s.")
+	argparser.add_argument("-socket", default = None, help = \
+		"Path of a Unix socket to serve HTTP on instead of a port.")
+	argparser.add_argument("-jobs", "-j", type = int, default = os.cpu_count(), help = \
+		"Amount of worker processes to render packages with. Defaults to the amount of "
+		"CPUs.")
+	_add_common_arguments(argparser, "{class_}_{skin}_{part}")
+
+	return argparser
+
+def _add_common_arguments(argparser, default_out_fmt):
+	"""
+	Adds the arguments shared by all of skingen's argparsers to `argparser`.
+	"""
 	argparser.add_argument("-out", "-o", "-output_dir", default = os.getcwd(), help = \
 		"Directory to save generated files to.")
-	argparser.add_argument("-outname", default = "skin_{part}_{class_}", dest = "out_fmt", help = \
+	argparser.add_argument("-outname", default = default_out_fmt, dest = "out_fmt", help = \
 		"Name of the output file. Will be .format()-ted with the following fed into it:\n"
 		"    class_ : Player class the skin is for\n"
 		"    skin   : Internal Skin name, taken from the input directory\n"
 		"    part   : \"head\" or \"body\"\n"
 		"    date   : Date as DDMMYYYY-HHmmSS\n"
+		"    size   : Width of the image in pixels\n"
+		"    variant: Number of the decalspec in a -sweep\n"
 		"For example, \"{class_}_{skin}_{part}\" would result in output files being called "
-		"\"Siren_BlueB_head.png\".")
+		"\"Siren_BlueB_head.png\". The extension depends on -format.")
+	argparser.add_argument("-mips", type = int, default = 0, help = \
+		"Amount of mipmap levels to save below every generated image, each half the "
+		"size of the one before and box filtered from it. The output name needs a "
+		"{size} field for them, e.g. \"{class_}_{skin}_{part}_{size}\".")
+	argparser.add_argument("-preview", type = int, default = None, metavar = "N", help = \
+		"Render a quick preview at most N pixels wide instead of the full image, to try "
+		"out decalspecs. The textures are scaled down before rendering and the decal is "
+		"placed where it would be in the full image. \"_preview\" is appended to the "
+		"output name.")
+	argparser.add_argument("-band", type = int, default = None, metavar = "N", help = \
+		"Render and save the images N rows at a time, reading only the rows of the "
+		"textures each band needs, so memory use depends on N instead of the texture "
+		"size. Uncompressed TGA textures are read straight from disk, others are decoded "
+		"in full first. Ignored with -preview and the MULTIPASS flag.")
+	argparser.add_argument("-format", choices = tuple(OUTPUT_FORMATS), default = "png",
+		help = "File format to save generated images in. \"tga\" is uncompressed, "
+		"\"npy\" is the raw numpy array for numpy.load; both are larger than PNGs, but "
+		"much faster to write and read. Defaults to \"png\".")
+	argparser.add_argument("-png-level", type = int, choices = range(10),
+		default = DEFAULT_PNG_LEVEL, dest = "png_level", metavar = "{0..9}", help = \
+		"Zlib compression level to write PNGs with, from 0 (none, fastest) to 9 "
+		"(smallest files). Defaults to %(default)s.")
+	argparser.add_argument("-png-filter", choices = PNG_FILTERS, default = DEFAULT_PNG_FILTER,
+		dest = "png_filter", help = \
+		"Filter to apply to the rows of PNGs before compressing them. \"adaptive\" picks "
+		"the best one for every row, \"none\" is fastest. Defaults to \"%(default)s\".")
+	argparser.add_argument("-npy-mmap", action = "store_true", dest = "npy_mmap", help = \
+		"Write npy files through a memory map.")
 	argparser.add_argument("-s", default = 0, action = "count", dest = "silence", help = \
 		"Shut the script up to varying degrees (-s, -ss)")
 	argparser.add_argument("-noask", action = "append_const", dest = "flag",
@@ -50,6 +178,16 @@ def get_argparser():
 		"alpha will be set to 0. The reason for this is that skin such as Krieg's "
 		"or faces would appear way brighter than they should be. With this switch, "
 		"you can turn that behavior off.")
+	argparser.add_argument("-lut", action = "append_const", dest = "flag",
+		const = FLAGS.COLOR_LUT, help = \
+		"Precompute every possible overlay color of a part into a lookup table once, "
+		"then generate the overlay image by looking up each pixel in it. Faster on large "
+		"textures, the result is the same.")
+	argparser.add_argument("-multipass", action = "append_const", dest = "flag",
+		const = FLAGS.MULTIPASS, help = \
+		"Render the overlay, decal and final image in separate passes over the whole "
+		"image instead of in a single one. Slower and uses more memory, but the "
+		"intermediate steps are easier to debug. The result is the same.")
 	argparser.add_argument("-decalspec", dest = "decalspec", const = None, help = \
 		"A set of overriding positioning and rotation instructions for decals.\n"
 		"        PosX[%%] PosY[%%] Rot Scale0 [Scale1] [Repeat]\n"
@@ -58,11 +196,45 @@ def get_argparser():
 		"    Rot   : Rotation of the decal around its center point.\n"
 		"    Scale : If only Scale0 is defined, factor to scale image by along both axes\n"
 		"        If Scale1 is defined, treat Scale0 as X- and Scale1 as Y-axis.\n"
-		"        If a scaling arg is < 0.05, the decalspec is deemed bad, as this may "
-		"cause severe CPU load with repeat set to true.\n"
+		"        Scaling args must be greater than 0.\n"
 		"    Repeat: Repeat texture.\n"
 		"If a percent sign is set at the allowed positions, the preceding value will be "
 		"interpreted relatively to the decal dimensions.\n"
 		"It is recommended to exclude head or body with this command.")
-
-	return argparser
+	argparser.add_argument("-backend", "--backend", choices = tuple(BACKENDS), default = None,
+		help = "Imaging backend to render with. \"cython\" requires the compiled "
+		"extension modules, \"numpy\" runs anywhere numpy is installed. By default, the "
+		"fastest available backend is used.")
+	argparser.add_argument("-threads", type = int, default = 1, help = \
+		"Amount of threads to split an image's rows across while rendering it. "
+		"The cython backend only uses more than one if it was compiled with OpenMP.")
+	argparser.add_argument("-mask-filter", choices = MASK_FILTERS, default = "bilinear",
+		dest = "mask_filter", help = \
+		"Filter to stretch the mask texture's soft and hard halves to the full texture "
+		"width with. Defaults to \"bilinear\".")
+	argparser.add_argument("-no-cache", "--no-cache", action = "append_const", dest = "flag",
+		const = FLAGS.NO_CACHE, help = \
+		"Do not read decoded textures from or store them in the texture cache.")
+	argparser.add_argument("-clear-cache", "--clear-cache", action = "store_true",
+		dest = "clear_cache", help = "Empty the texture cache before rendering.")
+	argparser.add_argument("-cache-dir", default = None, dest = "cache_dir", help = \
+		"Directory of the texture cache, which keeps decoded textures so they do not "
+		"have to be decoded again on later runs. Defaults to ~/.cache/bl2_skingen.")
+	argparser.add_argument("-cache-size", type = int, default = DEFAULT_CACHE_SIZE >> 20,
+		dest = "cache_size", help = \
+		"Size in MiB the texture cache may grow to before its least recently used "
+		"entries are removed. Defaults to %(default)s.")
+	argparser.add_argument("-index", default = None, help = \
+		"Path of an index created by the index subcommand. The parameters of props "
+		"files that have not changed since they were indexed are read from it "
+		"instead of being parsed.")
+	argparser.add_argument("-sequential-parts", action = "append_const", dest = "flag",
+		const = FLAGS.SEQUENTIAL_PARTS, help = \
+		"Render the body and head one after another instead of at the same time. "
+		"Uses less memory; reading, rendering and saving of the two parts still "
+		"overlap.")
+	argparser.add_argument("-force", action = "append_const", dest = "flag",
+		const = FLAGS.FORCE, help = \
+		"Generate all parts, even those whose inputs have not changed since their "
+		"output was last generated, according to the manifest kept in the output "
+		"directory.")
@@ -0,0 +1,85 @@
+"""
+Registry of the imaging backends. A backend bundles the kernels
+ue_color_diff, ue_color_diff_lut, place_decal, apply_decal, blend_inplace,
+multiply and render_fused, which share their signatures across all backends,
+as well as build_color_lut to create the lookup table for ue_color_diff_lut,
+split_mask to unpack the mask texture for the multi-pass kernels and
+transform_decal and insert_decal, the two steps of place_decal.
+"""
+
+class Backend():
+	"""
+	Namespace holding a backend's name and kernel functions.
+	"""
+	def __init__(self, name, ue_color_diff, ue_color_diff_lut, build_color_lut,
+			split_mask, place_decal, apply_decal, blend_inplace, multiply, render_fused,
+			transform_decal, insert_decal):
+		self.name = name
+		self.ue_color_diff = ue_color_diff
+		self.ue_color_diff_lut = ue_color_diff_lut
+		self.build_color_lut = build_color_lut
+		self.split_mask = split_mask
+		self.place_decal = place_decal
+		self.apply_decal = apply_decal
+		self.blend_inplace = blend_inplace
+		self.multiply = multiply
+		self.render_fused = render_fused
+		self.transform_decal = transform_decal
+		self.insert_decal = insert_decal
+
+	def __repr__(self):
+		return f"<Backend {self.name!r}>"
+
+def _load_cython():
+	from bl2_skingen.imaging.apply_decal import apply_decal, insert_decal, place_decal, \
+		transform_decal
+	from bl2_skingen.imaging.blend_inplace import blend_inplace
+	from bl2_skingen.imaging.multiply_sqrt import multiply
+	from bl2_skingen.imaging.render_fused import render_fused
+	from bl2_skingen.imaging.ue_color_diff import ue_color_diff, ue_color_diff_lut
+	# Building the table and splitting the mask are one-off whole-array
+	# operations, numpy is fine for those.
+	from bl2_skingen.imaging.numpy_kernels import build_color_lut, split_mask
+	return Backend("cython", ue_color_diff, ue_color_diff_lut, build_color_lut,
+		split_mask, place_decal, apply_decal, blend_inplace, multiply, render_fused,
+		transform_decal, insert_decal)
+
+def _load_numpy():
+	from bl2_skingen.imaging import numpy_kernels
+	return Backend("numpy", numpy_kernels.ue_color_diff, numpy_kernels.ue_color_diff_lut,
+		numpy_kernels.build_color_lut, numpy_kernels.split_mask, numpy_kernels.place_decal,
+		numpy_kernels.apply_decal, numpy_kernels.blend_inplace, numpy_kernels.multiply,
+		numpy_kernels.render_fused, numpy_kernels.transform_decal,
+		numpy_kernels.insert_decal)
+
+# Names of the filters the mask halves can be stretched to full width with; a
+# filter's index is passed to the kernels' mask_filter parameter.
+MASK_FILTERS = ("nearest", "bilinear")
+
+# Backend name -> loader; ordered from fastest to slowest.
+BACKENDS = {
+	"cython": _load_cython,
+	"numpy": _load_numpy,
+}
+
+_loaded_backends = {}
+
+def get_backend(name = None):
+	"""
+	Returns the Backend registered under `name`. If `name` is None, returns
+	the fastest backend that can be loaded.
+	Raises a KeyError for unknown names and an ImportError if the requested
+	backend (or, with `name` being None, none of them) can be loaded.
+	"""
+	if name is None:
+		errors = []
+		for name in BACKENDS:
+			try:
+				return get_backend(name)
+			except ImportError as exc:
+				errors.append(f"{name}: {exc}")
+		raise ImportError("No imaging backend could be loaded. " + "; ".join(errors))
+
+	if name not in _loaded_backends:
+		_loaded_backends[name] = BACKENDS[name]()
+	return _loaded_backends[name]
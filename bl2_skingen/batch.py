@@ -0,0 +1,172 @@
+"""
+Implements the batch subcommand, which renders every package found
+below a root directory, spread out over multiple worker processes.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+from pathlib import Path
+import re
+import sys
+import time
+
+from bl2_skingen.argparser import get_batch_argparser
+from bl2_skingen.flags import FLAGS
+from bl2_skingen.log_formatter import PrefixLoggerAdapter
+from bl2_skingen.manifest import Manifest
+from bl2_skingen.skingen import CLASSES, SKINGEN_LOGGER, SkinGenerator, \
+	SkinGenerationError, get_image_writer, get_parameter_index, get_texture_cache, \
+	process_common_args, save_manifest
+
+RE_PACKAGE_DIR = re.compile(r"^CD_(?:{})_.+_SF$".format("|".join(CLASSES)))
+
+BatchResult = namedtuple("BatchResult", ("package", "success", "message", "duration",
+	"skipped", "manifest_changes", "stage_times"))
+
+def find_packages(root):
+	"""
+	Walks `root` and returns a sorted list of all directories in it
+	following the CD_<Class>_..._SF convention. Packages are not
+	searched for further packages.
+	"""
+	res = []
+	for dirpath, dirnames, _ in os.walk(root):
+		for dirname in dirnames:
+			if RE_PACKAGE_DIR.match(dirname):
+				res.append(Path(dirpath, dirname))
+		dirnames[:] = [d for d in dirnames if not RE_PACKAGE_DIR.match(d)]
+	res.sort()
+	return res
+
+def render_package(package_dir, options):
+	"""
+	Renders a single package, catching any error it raises.
+	Meant to be run inside a worker process.
+
+	package_dir : str;pathlib.Path | Package directory to render.
+	options : dict | Keyword arguments for the SkinGenerator, except for
+		`logger` and `in_dir`. Changes to a manifest passed in it are
+		returned, not saved.
+
+	Returns: BatchResult
+	"""
+	start = time.perf_counter()
+	logger = PrefixLoggerAdapter(SKINGEN_LOGGER, {"prefix": Path(package_dir).name})
+	sg = None
+	def result(success, message):
+		# Parts generated before a failure are still reported.
+		skipped = 0 if sg is None else sg.skipped_parts
+		changes = {} if sg is None or sg.manifest is None else sg.manifest.changes
+		stage_times = {} if sg is None else sg.stage_times
+		return BatchResult(str(package_dir), success, message, time.perf_counter() - start,
+			skipped, changes, stage_times)
+	try:
+		sg = SkinGenerator(logger = logger, in_dir = package_dir, **options)
+		sg.run()
+	except SkinGenerationError as exc:
+		return result(False, str(exc))
+	except Exception as exc:
+		return result(False, f"Unexpected {exc.__class__.__name__}: {exc}")
+	return result(True, "")
+
+def run_batch(packages, options, jobs, logger):
+	"""
+	Renders all `packages` on a pool of `jobs` worker processes. If `jobs`
+	is 1, renders them in this process instead. A failing package does not
+	interrupt the others.
+
+	packages : list[pathlib.Path] | Package directories to render.
+	options : dict | Passed on to render_package.
+	jobs : int | Amount of worker processes.
+	logger : logging.Logger | Logger to report finished packages to.
+
+	Returns: A list of BatchResults in the order of `packages`.
+	"""
+	results = {}
+	def report(res):
+		results[res.package] = res
+		if res.success:
+			logger.log(25, f"Done ({res.duration:.2f}s): {res.package}")
+		else:
+			logger.log(40, f"Failed ({res.duration:.2f}s): {res.package}: {res.message}")
+
+	if jobs <= 1:
+		for package in packages:
+			report(render_package(package, options))
+	else:
+		with ProcessPoolExecutor(max_workers = jobs) as executor:
+			futures = {executor.submit(render_package, package, options): package
+				for package in packages}
+			for future in as_completed(futures):
+				try:
+					res = future.result()
+				except Exception as exc:
+					# The worker died (BrokenProcessPool) or its result could not
+					# be sent back; the package did not render either way.
+					res = BatchResult(str(futures[future]), False,
+						f"{exc.__class__.__name__}: {exc}", 0.0, 0, {}, {})
+				report(res)
+
+	return [results[str(package)] for package in packages]
+
+def main(argv):
+	argparser = get_batch_argparser()
+
+	if not argv:
+		argparser.print_help()
+		sys.exit()
+
+	args = argparser.parse_args(argv)
+	# Workers can not ask anything on stdin.
+	flag = process_common_args(args) | FLAGS.NO_ASK
+	if args.jobs > 1:
+		# The packages already keep all CPUs busy; rendering parts at the
+		# same time as well would only use more memory.
+		flag |= FLAGS.SEQUENTIAL_PARTS
+	silence = args.silence - (((flag & FLAGS.DEBUG) // FLAGS.DEBUG) * 2)
+	SKINGEN_LOGGER.setLevel(21 + (min(silence, 3) * 3))
+
+	packages = find_packages(args.root)
+	if not packages:
+		SKINGEN_LOGGER.log(50, f"No packages found in {args.root}.")
+		sys.exit()
+	SKINGEN_LOGGER.log(25, f"Found {len(packages)} packages, rendering on "
+		f"{max(args.jobs, 1)} processes.")
+	os.makedirs(args.out, exist_ok = True)
+
+	options = {
+		"out_dir": args.out, "out_fmt": args.out_fmt, "silence": silence,
+		"flag": flag, "decalspec": args.decalspec, "backend": args.backend,
+		"threads": args.threads, "mask_filter": args.mask_filter,
+		"cache": get_texture_cache(args, flag), "manifest": Manifest.load(args.out),
+		"index": get_parameter_index(args), "writer": get_image_writer(args),
+		"mips": args.mips, "preview": args.preview, "band": args.band,
+	}
+	start = time.perf_counter()
+	results = run_batch(packages, options, args.jobs, SKINGEN_LOGGER)
+	failed = [res for res in results if not res.success]
+
+	# Workers only received copies of the manifest, so their changes are saved here.
+	manifest = options["manifest"]
+	for res in results:
+		for name, part_fingerprint in res.manifest_changes.items():
+			manifest.record(name, part_fingerprint)
+	save_manifest(manifest, SKINGEN_LOGGER)
+	skipped = sum(res.skipped for res in results)
+	if skipped:
+		SKINGEN_LOGGER.log(25, f"Skipped {skipped} unchanged part(s).")
+	stage_times = {}
+	for res in results:
+		for name, t in res.stage_times.items():
+			stage_times[name] = stage_times.get(name, 0.0) + t
+	if stage_times:
+		SKINGEN_LOGGER.log(25, "Time spent per stage over all packages: " +
+			", ".join(f"{name} {t:.2f}s" for name, t in stage_times.items()))
+
+	SKINGEN_LOGGER.log(30, f"===Summary: {len(results) - len(failed)} succeeded, "
+		f"{len(failed)} failed in {time.perf_counter() - start:.2f}s===")
+	for res in failed:
+		SKINGEN_LOGGER.log(30, f"\t{Path(res.package).name}: {res.message}")
+	if failed:
+		sys.exit(1)
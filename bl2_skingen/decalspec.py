@@ -36,9 +36,9 @@ def validate_decalspec(spec):
 	if matchobj is None:
 		return False
 	if matchobj[7] is not None:
-		if float(matchobj[7]) < 0.05:
+		if float(matchobj[7]) <= 0:
 			return False
-	if float(matchobj[6]) < 0.05:
+	if float(matchobj[6]) <= 0:
 		return False
 	return True
 	
@@ -76,3 +76,30 @@ def parse_decalspec(spec, base_x, base_y):
 		repeat = False
 
 	return Decalspec(posx, posy, rot, scalex, scaley, repeat)
+
+def scale_decalspec(decalspec, factor):
+	"""
+	Returns a copy of the Decalspec `decalspec` for a base image scaled
+	by `factor`; its position and scale are multiplied by it.
+	"""
+	return Decalspec(decalspec.posx * factor, decalspec.posy * factor, decalspec.rot,
+		decalspec.scalex * factor, decalspec.scaley * factor, decalspec.repeat)
+
+def read_decalspec_file(path):
+	"""
+	Reads a file containing one decalspec per line and returns them as a
+	list of strings. Empty lines and lines starting with "#" are skipped.
+	Raises a ValueError naming the line of the first invalid decalspec.
+
+	path : str;pathlib.Path | Path of the file to read.
+	"""
+	specs = []
+	with open(path, "r") as h:
+		for lineno, line in enumerate(h, 1):
+			line = line.strip()
+			if not line or line.startswith("#"):
+				continue
+			if not validate_decalspec(line):
+				raise ValueError(f"Bad decalspec in line {lineno}: {line!r}")
+			specs.append(line)
+	return specs
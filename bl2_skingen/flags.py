@@ -8,3 +8,8 @@ class FLAGS:
 	EXCLUDE_BODY = 16
 	KEEP_WHITE = 32
 	NO_DECAL = 64
+	COLOR_LUT = 128
+	MULTIPASS = 256
+	NO_CACHE = 512
+	FORCE = 1024
+	SEQUENTIAL_PARTS = 2048
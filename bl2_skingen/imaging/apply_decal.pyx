@@ -1,9 +1,10 @@
 import cython
+from cython.parallel cimport prange
 import PIL.Image
 import numpy as np
 cimport numpy as np
 
-from libc.math cimport sin, cos, sqrt
+from libc.math cimport sin, cos, sqrt, floor, ceil
 from shared_funcs cimport calc_alpha, scale_int
 
 np.import_array()
@@ -133,11 +134,218 @@ cpdef char insert_array(
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cpdef np.ndarray[DTYPE_t, ndim = 3] apply_decal(
+cdef inline void _insert_pixel(
+		DTYPE_t[:, :, ::1] target,
+		const DTYPE_t[:, :, :] source,
+		int x,
+		int y,
+		int src_x,
+		int src_y) noexcept nogil:
+	# Inserts a single pixel of source into the RGBA target the way insert_array does.
+	cdef np.uint8_t rgb, alpha
+	cdef int source_c = source.shape[2]
+	if source_c == 4:
+		alpha = source[src_y, src_x, 3]
+		target[y, x, 3] = calc_alpha(target[y, x, 3], alpha)
+		for rgb in range(4):
+			target[y, x, rgb] = scale_int(source[src_y, src_x, rgb], alpha) + \
+				scale_int(target[y, x, rgb], 255 - alpha)
+	else:
+		target[y, x, 3] = 0xFF
+		for rgb in range(source_c):
+			target[y, x, rgb] = source[src_y, src_x, rgb]
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline void _insert_tile_row(
+		DTYPE_t[:, :, ::1] target,
+		const DTYPE_t[:, :, :] source,
+		int x,
+		int y,
+		int dx,
+		int dy,
+		int j,
+		int i0,
+		int i1,
+		int lr_x,
+		int lr_y,
+		int ud_x,
+		int ud_y) noexcept nogil:
+	# Inserts the pixels of the tiles (i0..i1, j) that cover (x, y), in the order
+	# 0, 1, 2, ..., -1, -2, ...
+	cdef int i, src_x, src_y
+	cdef int src_w = source.shape[1]
+	cdef int src_h = source.shape[0]
+	i = i0 if i0 > 0 else 0
+	while i <= i1:
+		src_x = dx - (lr_x * i) - (ud_x * j)
+		src_y = dy - (lr_y * i) - (ud_y * j)
+		if src_x >= 0 and src_x < src_w and src_y >= 0 and src_y < src_h:
+			_insert_pixel(target, source, x, y, src_x, src_y)
+		i += 1
+	i = i1 if i1 < -1 else -1
+	while i >= i0:
+		src_x = dx - (lr_x * i) - (ud_x * j)
+		src_y = dy - (lr_y * i) - (ud_y * j)
+		if src_x >= 0 and src_x < src_w and src_y >= 0 and src_y < src_h:
+			_insert_pixel(target, source, x, y, src_x, src_y)
+		i -= 1
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef tile_array(
+		DTYPE_t[:, :, ::1] target,
+		const DTYPE_t[:, :, :] source,
+		int pos_x,
+		int pos_y,
+		int lr_x,
+		int lr_y,
+		int ud_x,
+		int ud_y,
+		int threads = 1):
+	"""
+	Inserts source into the RGBA target repeatedly, at every
+	(pos_x, pos_y) + i * (lr_x, lr_y) + j * (ud_x, ud_y) for all integers
+	i and j where it is visible. Overlapping tiles are inserted in rows
+	j = 0, -1, -2, ..., 1, 2, ... and in each row in the order
+	i = 0, 1, 2, ..., -1, -2, ..., as apply_decal has always done.
+	Instead of inserting tile after tile, every pixel of target is mapped
+	back into the lattice to find the few tiles covering it, so the cost
+	depends on the target's size and not on the amount of tiles.
+	If the lattice's vectors are parallel, source is inserted once.
+	"""
+	cdef int det = lr_x * ud_y - ud_x * lr_y
+	if det == 0:
+		insert_array(np.asarray(target), np.asarray(source), pos_x, pos_y)
+		return
+
+	cdef int src_w = source.shape[1]
+	cdef int src_h = source.shape[0]
+	cdef double inv_det = 1.0 / det
+	# Lattice coordinates of the tile corners relative to its origin; a pixel with the
+	# lattice coordinates (u, v) can only be covered by tiles in
+	# [u - max_u; u - min_u] x [v - max_v; v - min_v].
+	cdef double corner_u, corner_v
+	cdef double min_u = 0, max_u = 0, min_v = 0, max_v = 0
+	cdef int cx, cy
+	for cx, cy in ((src_w, 0), (0, src_h), (src_w, src_h)):
+		corner_u = (ud_y * cx - ud_x * cy) * inv_det
+		corner_v = (lr_x * cy - lr_y * cx) * inv_det
+		min_u = min(min_u, corner_u); max_u = max(max_u, corner_u)
+		min_v = min(min_v, corner_v); max_v = max(max_v, corner_v)
+
+	cdef int y, x, dx, dy, i0, i1, j0, j1, j
+	cdef double u, v
+	cdef int h = target.shape[0]
+	cdef int w = target.shape[1]
+	threads = max(threads, 1)
+
+	for y in prange(h, nogil = True, num_threads = threads, schedule = "static"):
+		for x in range(w):
+			dx = x - pos_x
+			dy = y - pos_y
+			u = (ud_y * dx - ud_x * dy) * inv_det
+			v = (lr_x * dy - lr_y * dx) * inv_det
+			# Widened a little to be safe from rounding; exact bounds are checked per tile.
+			i0 = <int>ceil(u - max_u - 1e-6)
+			i1 = <int>floor(u - min_u + 1e-6)
+			j0 = <int>ceil(v - max_v - 1e-6)
+			j1 = <int>floor(v - min_v + 1e-6)
+			j = j1 if j1 < 0 else 0
+			while j >= j0:
+				_insert_tile_row(target, source, x, y, dx, dy, j, i0, i1, lr_x, lr_y, ud_x, ud_y)
+				j = j - 1
+			j = j0 if j0 > 1 else 1
+			while j <= j1:
+				_insert_tile_row(target, source, x, y, dx, dy, j, i0, i1, lr_x, lr_y, ud_x, ud_y)
+				j = j + 1
+
+cpdef tuple transform_decal(
 		decal,
-		np.ndarray[DTYPE_t, ndim = 3] hard_mask,
-		np.ndarray[DTYPE_t, ndim = 1] decal_color,
-		np.ndarray[DTYPE_t, ndim = 1] decal_area,
+		double rot = 0,
+		double scale_x = 1.0,
+		double scale_y = 1.0):
+	"""
+	Scales and rotates a decal image as its transformation parameters
+	(see the explanation of the decalspec in `bl2_skingen.argparser`)
+	say, independent of where it is placed. Returns a tuple of
+	(numpy array, lr_x, lr_y, ud_x, ud_y): the transformed RGBA decal and
+	the vectors from one repeated decal to the next along its rows and
+	columns, to be passed on to insert_decal.
+
+	decal : PIL.Image
+	rot : float | Rotation of the decal in degrees.
+	scale_x : float | Scale along x-axis
+	scale_y : float | Scale along y-axis
+	"""
+	# Keep at least a pixel of the decal at very small scales.
+	decal = decal.resize((
+		max(int(scale_x * decal.size[0]), 1),
+		max(int(scale_y * decal.size[1]), 1))
+	)
+	cdef int raw_size_x = decal.size[0]
+	cdef int raw_size_y = decal.size[1]
+
+	decal = decal.rotate(rot, resample = PIL.Image.BICUBIC, expand = True)
+
+	cdef np.ndarray[DTYPE_t, ndim = 3] decal_array =  np.array(decal)
+
+	cdef int rel_lr_x = (int)((cos(<double>(torad(rot)))) * raw_size_x)
+	cdef int rel_lr_y = (int)((-sin(<double>(torad(rot)))) * raw_size_x)
+	cdef int rel_ud_x = (int)((cos(<double>(torad(rot)) + half_pi)) * raw_size_y)
+	cdef int rel_ud_y = (int)((-sin(<double>(torad(rot)) + half_pi)) * raw_size_y)
+
+	return (decal_array, rel_lr_x, rel_lr_y, rel_ud_x, rel_ud_y)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef tuple insert_decal(
+		tuple transformed,
+		int width,
+		int height,
+		int pos_x = 0,
+		int pos_y = 0,
+		char repeat = False):
+	"""
+	Places a decal transformed by transform_decal on a `height` x `width`
+	RGBA image, like place_decal does. Placing a decal on consecutive
+	bands of rows of an image, shifting `pos_y` up by each band's first
+	row, gives the same pixels as placing it on the whole image.
+
+	transformed : tuple | Result of transform_decal.
+	width : int | Width of the image the decal is placed on.
+	height : int | Height of the image the decal is placed on.
+	pos_x : int | x-position of the decal. May be negative.
+	pos_y : int | y-position of the decal. May be negative.
+	repeat : char | (Interpreted as bool) Whether to repeat the decal along its
+		initial placement.
+	"""
+	cdef np.ndarray[DTYPE_t, ndim = 3] res
+	cdef np.ndarray[DTYPE_t, ndim = 3] decal_array
+	cdef int x0, y0, x1, y1
+	cdef int rel_lr_x, rel_lr_y, rel_ud_x, rel_ud_y
+	decal_array, rel_lr_x, rel_lr_y, rel_ud_x, rel_ud_y = transformed
+
+	### REPETITION HERE!
+	if repeat > 0:
+		# The tiles cover the entire image.
+		res = np.zeros([height, width, 4], dtype = DTYPE)
+		tile_array(res, decal_array, pos_x, pos_y, rel_lr_x, rel_lr_y, rel_ud_x, rel_ud_y)
+		return (res, 0, 0)
+
+	x0 = min(max(pos_x, 0), width)
+	y0 = min(max(pos_y, 0), height)
+	x1 = max(min(pos_x + decal_array.shape[1], width), x0)
+	y1 = max(min(pos_y + decal_array.shape[0], height), y0)
+	res = np.zeros([y1 - y0, x1 - x0, 4], dtype = DTYPE)
+	insert_array(res, decal_array, pos_x - x0, pos_y - y0)
+
+	return (res, x0, y0)
+
+cpdef tuple place_decal(
+		decal,
+		int width,
+		int height,
 		int pos_x = 0,
 		int pos_y = 0,
 		double rot = 0,
@@ -145,10 +353,49 @@ cpdef np.ndarray[DTYPE_t, ndim = 3] apply_decal(
 		double scale_y = 1.0,
 		char repeat = False):
 	"""
+	Takes a decal image and its transformation parameters (see the
+	explanation of the decalspec in `bl2_skingen.argparser`) and places
+	the decal on a `height` x `width` RGBA image, neither masked nor
+	colored. Only the region the decal was inserted into is returned, as a
+	tuple of (numpy array, offset_x, offset_y), the offsets being the
+	region's position on the image. The region may be empty if the decal
+	lies completely outside of the image.
+
+	decal : PIL.Image
+	width : int | Width of the image the decal is placed on.
+	height : int | Height of the image the decal is placed on.
+	pos_x : int | x-position of the decal. May be negative.
+	pos_y : int | y-position of the decal. May be negative.
+	rot : float | Rotation of the decal in degrees.
+	scale_x : float | Scale along x-axis
+	scale_y : float | Scale along y-axis
+	repeat : char | (Interpreted as bool) Whether to repeat the decal along its
+		initial placement.
+	"""
+	return insert_decal(transform_decal(decal, rot, scale_x, scale_y), width, height,
+		pos_x, pos_y, repeat)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef tuple apply_decal(
+		decal,
+		const DTYPE_t[:, :, :] hard_mask,
+		const DTYPE_t[:] decal_color,
+		const DTYPE_t[:] decal_area,
+		int pos_x = 0,
+		int pos_y = 0,
+		double rot = 0,
+		double scale_x = 1.0,
+		double scale_y = 1.0,
+		char repeat = False,
+		int threads = 1):
+	"""
 	Takes a decal image, hard mask and additional parameters (see the
 	explanation of the decalspec in `bl2_skingen.argparser`), returns
 	a numpy array representing the decal transformed according to the
-	parameters.
+	parameters. Like place_decal, only the region the decal was inserted
+	into is returned and masked, as a tuple of (numpy array, offset_x,
+	offset_y).
 
 	decal : PIL.Image
 	hard_mask : np.ndarray[uint_8, ndim = 3]
@@ -163,94 +410,50 @@ cpdef np.ndarray[DTYPE_t, ndim = 3] apply_decal(
 	scale_y : float | Scale along y-axis
 	repeat : char | (Interpreted as bool) Whether to repeat the decal along its
 		initial placement.
+	threads : int | Amount of threads to split the image's rows across when
+		masking and coloring the decal.
 	"""
-	#if type(decal) is not PIL.Image:
-	#	raise TypeError("Decal must be a PIL.Image!")
-
-	cdef np.ndarray[DTYPE_t, ndim = 3] res = \
-		np.ndarray([hard_mask.shape[0], hard_mask.shape[1], 4], dtype = DTYPE)
-
-	decal = decal.resize((
-		int(scale_x * decal.size[0]),
-		int(scale_y * decal.size[1]))
-	)
-	cdef int raw_size_x = decal.size[0]
-	cdef int raw_size_y = decal.size[1]
-
-	decal = decal.rotate(rot, resample = PIL.Image.BICUBIC, expand = True)
-
-	cdef np.ndarray[DTYPE_t, ndim = 3] decal_array =  np.array(decal)
-
-	cdef int rel_lr_x = (int)((cos(<double>(torad(rot)))) * raw_size_x)
-	cdef int rel_lr_y = (int)((-sin(<double>(torad(rot)))) * raw_size_x)
-	cdef int rel_ud_x = (int)((cos(<double>(torad(rot)) + half_pi)) * raw_size_y)
-	cdef int rel_ud_y = (int)((-sin(<double>(torad(rot)) + half_pi)) * raw_size_y)
+	cdef np.ndarray[DTYPE_t, ndim = 3] res
+	cdef int off_x, off_y
+	res, off_x, off_y = place_decal(decal,
+		hard_mask.shape[1], hard_mask.shape[0], pos_x, pos_y, rot, scale_x, scale_y, repeat)
 
+	cdef DTYPE_t[:, :, ::1] res_view = res
 	cdef int y, x # Loop variables
-	cdef int runs_for_x = 0
-	cdef int y_direction = -1
+	cdef int my, mx # Position on the hard mask
+	cdef int h = res.shape[0]
+	cdef int w = res.shape[1]
 	cdef np.uint8_t rgb, tmp_col
 	cdef np.uint8_t area_channel = 0
-
-	insert_array(res, decal_array, pos_x, pos_y)
-
-	### REPETITION HERE!
-	if repeat > 0:
-		x = 1; y = 0
-		while True:
-			while (insert_array(
-				res,
-				decal_array,
-				pos_x + (rel_lr_x * x) + (rel_ud_x * y),
-				pos_y + (rel_lr_y * x) + (rel_ud_y * y)) == 0
-			):
-				runs_for_x += 1
-				x += 1
-			x = -1
-			while (insert_array(
-				res,
-				decal_array,
-				pos_x + (rel_lr_x * x) + (rel_ud_x * y),
-				pos_y + (rel_lr_y * x) + (rel_ud_y * y)) == 0
-			):
-				runs_for_x += 1
-				x -= 1
-			if runs_for_x == 0:
-				if y_direction == 1:
-					break
-				y_direction = 1
-				y = 0 # will result in y = 1 in next run
-			runs_for_x = 0
-			y += y_direction
-			x = 0
+	threads = max(threads, 1)
 
 	### HARD MASK REMOVAL HERE!
-	for y in range(res.shape[0]):
-		for x in range(res.shape[1]):
-			if res[y, x, 3] == 0x00:
+	for y in prange(h, nogil = True, num_threads = threads, schedule = "static"):
+		for x in range(w):
+			if res_view[y, x, 3] == 0x00:
 				continue
-			if hard_mask[y, x, 0] == 0 and hard_mask[y, x, 1] == 0 and hard_mask[y, x, 2] == 0:
-				res[y, x, 3] = 0x00
+			my = y + off_y
+			mx = x + off_x
+			if hard_mask[my, mx, 0] == 0 and hard_mask[my, mx, 1] == 0 and hard_mask[my, mx, 2] == 0:
+				res_view[y, x, 3] = 0x00
 				continue
-			if hard_mask[y, x, 0] >= hard_mask[y, x, 1] and hard_mask[y, x, 0] >= hard_mask[y, x, 2]:
+			if hard_mask[my, mx, 0] >= hard_mask[my, mx, 1] and hard_mask[my, mx, 0] >= hard_mask[my, mx, 2]:
 				area_channel = 0
-			elif hard_mask[y, x, 1] >= hard_mask[y, x, 0] and hard_mask[y, x, 1] >= hard_mask[y, x, 2]:
+			elif hard_mask[my, mx, 1] >= hard_mask[my, mx, 0] and hard_mask[my, mx, 1] >= hard_mask[my, mx, 2]:
 				area_channel = 1
-			elif hard_mask[y, x, 2] >= hard_mask[y, x, 0] and hard_mask[y, x, 2] >= hard_mask[y, x, 1]:
-				area_channel = 2
 			else:
-				print("this should not happen")
-			res[y, x, 3] = scale_int(res[y, x, 3], decal_area[area_channel])
+				area_channel = 2
+			res_view[y, x, 3] = scale_int(res_view[y, x, 3], decal_area[area_channel])
 
 	### COLORING HERE!
-	for y in range(res.shape[0]):
-		for x in range(res.shape[1]):
-			if res[y, x, 3] == 0:
+	for y in prange(h, nogil = True, num_threads = threads, schedule = "static"):
+		for x in range(w):
+			if res_view[y, x, 3] == 0:
 				continue
 			for rgb in range(3):
 				#tmp_col = sq_root[scale_int(decal_color[rgb], res[y, x, rgb])]
 				#res[y, x, rgb] = tmp_col
 				# Apparently, square rooting not necessary for decal.
-				res[y, x, rgb] = scale_int(decal_color[rgb], res[y, x, rgb])
+				res_view[y, x, rgb] = scale_int(decal_color[rgb], res_view[y, x, rgb])
 
-	return res
+	return (res, off_x, off_y)
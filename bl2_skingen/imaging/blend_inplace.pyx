@@ -1,4 +1,5 @@
 import cython
+from cython.parallel cimport prange
 import numpy as np
 cimport numpy as np
 
@@ -11,11 +12,12 @@ ctypedef np.uint8_t DTYPE_t
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-cpdef np.ndarray[DTYPE_t, ndim = 3] blend_inplace(np.ndarray[DTYPE_t, ndim = 3] top_img, np.ndarray[DTYPE_t, ndim = 3] base_img):
+cpdef blend_inplace(const DTYPE_t[:, :, :] top_img, DTYPE_t[:, :, :] base_img, int threads = 1):
 	"""
 	Blends top_img with base_img using regular alpha composition.
 	base_img will be modified in the process.
 	Both images should be supplied as RGBA.
+	The image's rows are split across `threads` threads.
 	"""
 	if top_img.ndim != 3 or base_img.ndim != 3:
 		raise ValueError("Supplied numpy arrays must be threedimensional!")
@@ -37,7 +39,8 @@ cpdef np.ndarray[DTYPE_t, ndim = 3] blend_inplace(np.ndarray[DTYPE_t, ndim = 3]
 
 	height = top_img.shape[0]
 	width = top_img.shape[1]
-	for y in range(height):
+	threads = max(threads, 1)
+	for y in prange(height, nogil = True, num_threads = threads, schedule = "static"):
 		for x in range(width):
 			base_img[y, x, 3] = calc_alpha(top_img[y, x, 3], base_img[y, x, 3])
 			for c in range(3):
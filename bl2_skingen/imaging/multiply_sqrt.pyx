@@ -1,4 +1,5 @@
 import cython
+from cython.parallel cimport prange
 import numpy as np
 cimport numpy as np
 
@@ -13,11 +14,13 @@ ctypedef np.uint8_t DTYPE_t
 @cython.boundscheck(False)
 @cython.wraparound(False)
 cpdef np.ndarray[DTYPE_t, ndim = 3] multiply(
-		np.ndarray[DTYPE_t, ndim = 3] top_img,
-		np.ndarray[DTYPE_t, ndim = 3] base_img):
+		const DTYPE_t[:, :, :] top_img,
+		const DTYPE_t[:, :, :] base_img,
+		int threads = 1):
 	"""Blends top_img with base_img using multiply,
 	then takes the square root of the result, returning a numpy array.
 	Top image should be supplied as RGBA, base image as RGB.
+	The image's rows are split across `threads` threads.
 	"""
 	if top_img.ndim != 3 or base_img.ndim != 3:
 		raise ValueError("Supplied numpy arrays must be threedimensional!")
@@ -34,14 +37,16 @@ cpdef np.ndarray[DTYPE_t, ndim = 3] multiply(
 	if base_img.shape[2] != 3:
 		raise ValueError("Bottom array must specify 3-value arrays as its innermost layer; [RGB]")
 
-	cdef np.ndarray[DTYPE_t, ndim = 3] res = np.ndarray([top_img.shape[0], top_img.shape[1], 3], dtype = DTYPE)
+	res_arr = np.ndarray([top_img.shape[0], top_img.shape[1], 3], dtype = DTYPE)
+	cdef DTYPE_t[:, :, ::1] res = res_arr
 	cdef int y, x
 	cdef int h = top_img.shape[0]
 	cdef int w = top_img.shape[1]
 	cdef unsigned char rgb
 	cdef np.uint8_t tmp_col
+	threads = max(threads, 1)
 
-	for y in range(h):
+	for y in prange(h, nogil = True, num_threads = threads, schedule = "static"):
 		for x in range(w):
 			for rgb in range(3):
 				tmp_col = sq_root[scale_int(top_img[y, x, rgb], base_img[y, x, rgb])]
@@ -50,4 +55,4 @@ cpdef np.ndarray[DTYPE_t, ndim = 3] multiply(
 					scale_int((255 - top_img[y, x, 3]), base_img[y, x, rgb])
 				)
 
-	return res
+	return res_arr
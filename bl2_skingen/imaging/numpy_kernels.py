@@ -0,0 +1,643 @@
+"""
+Vectorized NumPy implementations of the imaging kernels, usable where
+the Cython modules have not been compiled.
+Every function mirrors the Cython function of the same name and produces
+the same results, down to the fixed-point arithmetic of shared_funcs.pxd.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from math import sin, cos
+
+import numpy as np
+import PIL.Image
+
+DTYPE = np.uint8
+
+# Same as sqrt_arr.pxd: int(sqrt(i / 255.0) * 255)
+SQ_ROOT = (np.sqrt(np.arange(256) / 255.0) * 255).astype(DTYPE)
+
+HALF_PI = 1.5707963267948966
+
+def torad(deg):
+	return deg * 0.017453292519943295
+
+def scale_int(a, b):
+	"""
+	Multiplies two (arrays of) integers [0x0; 0xFF] as if they were
+	floats. (127, 127) -> 65
+	"""
+	product = np.asarray(a, dtype = np.uint16) * np.asarray(b, dtype = np.uint16) + 0x80
+	return (((product >> 8) + product) >> 8).astype(DTYPE)
+
+def calc_alpha(a, b):
+	return scale_int(a, 255 - np.asarray(b, dtype = DTYPE)) + np.asarray(b, dtype = DTYPE)
+
+def col_median(a, b, percentage):
+	# Returns median value between input values; if percentage is 0, return a, if percentage is 255 return b
+	return scale_int(a, 255 - percentage) + scale_int(b, percentage)
+
+def swoop(a, b):
+	# Fancy mathematics
+	# The Cython kernel is compiled with cdivision, so the divisions are integer ones.
+	a = a.astype(np.int32)
+	b = b.astype(np.int32)
+	above = 127 + (1 - (b // np.maximum(a, 1))) * 128
+	below = 127 - (1 - (a // np.maximum(b, 1))) * 127
+	res = np.where(a >= b, above, below)
+	res[(a == 0) & (b == 0)] = 127
+	return res.astype(DTYPE)
+
+def _for_bands(func, height, threads, max_rows = None):
+	"""
+	Splits the rows [0; height) into `threads` bands and calls `func(y0, y1)`
+	for each of them on its own thread. numpy releases the GIL for most of
+	the work done on the bands, so they are processed in parallel.
+	If `max_rows` is given, the rows are split into more bands where needed
+	so none of them is larger than that.
+	"""
+	threads = max(min(threads, height), 1)
+	bands = threads
+	if max_rows is not None:
+		bands = max(bands, -(-height // max_rows))
+	bounds = [(height * i) // bands for i in range(bands + 1)]
+	if threads == 1:
+		for y0, y1 in zip(bounds[:-1], bounds[1:]):
+			func(y0, y1)
+		return
+	with ThreadPoolExecutor(max_workers = threads) as executor:
+		for _ in executor.map(func, bounds[:-1], bounds[1:]):
+			pass
+
+def _dominant_channel(mask):
+	"""
+	Returns the index of the first channel of the 3-channel `mask` that
+	is greater or equal to the other ones, for each pixel.
+	"""
+	c0 = mask[..., 0]; c1 = mask[..., 1]; c2 = mask[..., 2]
+	return np.where((c0 >= c1) & (c0 >= c2), 0,
+		np.where((c1 >= c0) & (c1 >= c2), 1, 2)).astype(np.intp)
+
+def _check_masks(hard_mask, soft_mask):
+	if hard_mask.ndim != 3 or soft_mask.ndim != 3:
+		raise ValueError("Masks must be supplied as three dimensional arrays.")
+
+	if hard_mask.shape[0] == 0 or hard_mask.shape[1] == 0 or soft_mask.shape[0] == 0 or soft_mask.shape[1] == 0:
+		raise ValueError("Mask array must not be 0 in width or height!")
+
+	if hard_mask.shape[2] != 3 or soft_mask.shape[2] != 3:
+		raise ValueError("Mask image arrays must specify 3-value arrays as their innermost layer; [R, G, B]")
+
+	if hard_mask.shape[0] != soft_mask.shape[0] or hard_mask.shape[1] != soft_mask.shape[1]:
+		raise ValueError("Mask images must perfectly overlap eachother (so have the same size)")
+
+# Values of the mask_filter parameters, see bl2_skingen.backends.MASK_FILTERS
+MASK_NEAREST = 0
+MASK_BILINEAR = 1
+
+def _stretch_half(half, mask_filter):
+	"""
+	Stretches a mask half to twice its width. Bilinear weighs the nearer
+	source column 3:1 against its neighbour, the edges are clamped.
+	"""
+	out_x = np.arange(half.shape[1] * 2)
+	near = out_x >> 1
+	if mask_filter == MASK_NEAREST:
+		return half[:, near]
+	neighbour = np.where(out_x & 1, np.minimum(near + 1, half.shape[1] - 1),
+		np.maximum(near - 1, 0))
+	return ((3 * half[:, near].astype(np.uint16) + half[:, neighbour] + 2) >> 2).astype(DTYPE)
+
+def split_mask(mask, mask_filter = MASK_BILINEAR):
+	"""
+	Splits the packed mask texture into its hard and soft mask, stretching
+	both to the texture's full width. Returns a tuple of (hard, soft) numpy
+	arrays.
+
+	mask : np.ndarray[uint_8, ndim = 3] | The packed mask texture, with the
+		soft mask in its left and the hard mask in its right half.
+	mask_filter : int | 0 to stretch the mask halves with nearest neighbour,
+		1 to stretch them bilinearly.
+	"""
+	if mask.ndim != 3 or mask.shape[2] != 3:
+		raise ValueError("Mask image array must specify 3-value arrays as its innermost layer; [R, G, B]")
+
+	if mask.shape[1] % 2 != 0:
+		raise ValueError("Mask must be of even width!")
+
+	if mask_filter != MASK_NEAREST and mask_filter != MASK_BILINEAR:
+		raise ValueError(f"Unknown mask filter: {mask_filter}")
+
+	half_w = mask.shape[1] // 2
+	return (
+		_stretch_half(mask[:, half_w:], mask_filter),
+		_stretch_half(mask[:, :half_w], mask_filter),
+	)
+
+def _ue_color_diff_band(hard_mask, soft_mask, colors, res):
+	ccol = _dominant_channel(hard_mask)
+	visible = np.take_along_axis(hard_mask, ccol[..., None], 2)[..., 0] >= 40
+	ccol = ccol[visible]
+	soft_r = soft_mask[..., 0][visible][:, None]
+	soft_g = soft_mask[..., 1][visible][:, None]
+
+	dif = swoop(soft_r, soft_g)
+	c0 = col_median(colors[ccol, 1], colors[ccol, 0], soft_g)
+	c1 = col_median(colors[ccol, 1], colors[ccol, 2], soft_r)
+	res[visible] = col_median(c0, c1, dif)
+
+def ue_color_diff(hard_mask, soft_mask, colors, threads = 1):
+	# [0]: A, [1]: B, [2]: C
+	# [x][0]: "shadow", [x][1]: "mid", [x][2]: "hilight"
+	# [x][y][0]: R, [x][y][1]: G, [x][y][2]: B, [x][y][3]: A
+	# threads: Amount of threads to split the image's rows across.
+	_check_masks(hard_mask, soft_mask)
+
+	res = np.zeros((hard_mask.shape[0], hard_mask.shape[1], 4), dtype = DTYPE)
+	_for_bands(
+		lambda y0, y1: _ue_color_diff_band(hard_mask[y0:y1], soft_mask[y0:y1], colors, res[y0:y1]),
+		res.shape[0], threads
+	)
+
+	return res
+
+def build_color_lut(colors):
+	"""
+	Precomputes the result of ue_color_diff for every possible input, so
+	it can be replaced by a lookup with ue_color_diff_lut.
+	Returns a [3, 256, 256, 4] array, indexed by the dominant hard mask
+	channel, the soft mask's red and the soft mask's green value.
+	"""
+	soft_r = np.arange(256, dtype = DTYPE)[:, None, None]
+	soft_g = np.arange(256, dtype = DTYPE)[None, :, None]
+	dif = swoop(soft_r, soft_g)
+
+	res = np.empty((3, 256, 256, 4), dtype = DTYPE)
+	for ccol in range(3):
+		c0 = col_median(colors[ccol, 1], colors[ccol, 0], soft_g)
+		c1 = col_median(colors[ccol, 1], colors[ccol, 2], soft_r)
+		res[ccol] = col_median(c0, c1, dif)
+
+	return res
+
+def _ue_color_diff_lut_band(hard_mask, soft_mask, lut, res):
+	ccol = _dominant_channel(hard_mask)
+	visible = np.take_along_axis(hard_mask, ccol[..., None], 2)[..., 0] >= 40
+	res[visible] = lut[ccol[visible], soft_mask[..., 0][visible], soft_mask[..., 1][visible]]
+
+def ue_color_diff_lut(hard_mask, soft_mask, lut, threads = 1):
+	"""
+	Produces the same result as ue_color_diff, but takes the colors from a
+	lookup table built by build_color_lut.
+	"""
+	_check_masks(hard_mask, soft_mask)
+
+	if lut.shape != (3, 256, 256, 4):
+		raise ValueError("Lookup table must be of shape [3, 256, 256, 4].")
+
+	res = np.zeros((hard_mask.shape[0], hard_mask.shape[1], 4), dtype = DTYPE)
+	_for_bands(
+		lambda y0, y1: _ue_color_diff_lut_band(hard_mask[y0:y1], soft_mask[y0:y1], lut, res[y0:y1]),
+		res.shape[0], threads
+	)
+
+	return res
+
+def insert_array(target, source, offset_x = 0, offset_y = 0):
+	"""
+	Inserts source into target, designed for a 2-Dimensional images with
+	at most 4 channels at the lowest level.
+	Optionally offset the insertion by offset_x and offset_y.
+	If the offset is negative/source image is too large,
+	it will be cut off accordingly.
+	Returns 0 on success, returns 1 if the image was completely out of bounds
+	and modification would have been unnecessary.
+	"""
+	target_y, target_x, target_c = target.shape
+	source_y, source_x, source_c = source.shape
+
+	if offset_x > target_x or offset_y > target_y:
+		return 1
+	if offset_x + source_x <= 0 or offset_y + source_y <= 0:
+		return 1 #Image out of bounds, would have no effect.
+
+	rngx_beg = max(offset_x, 0)
+	rngx_end = min(offset_x + source_x, target_x)
+	rngy_beg = max(offset_y, 0)
+	rngy_end = min(offset_y + source_y, target_y)
+	rng_chl = min(source_c, target_c)
+
+	tgt = target[rngy_beg:rngy_end, rngx_beg:rngx_end]
+	src = source[rngy_beg - offset_y:rngy_end - offset_y, rngx_beg - offset_x:rngx_end - offset_x]
+	if tgt.size == 0:
+		return 0
+
+	if source_c == 4 and target_c == 4: # Regular alpha overlay
+		src_alpha = src[..., 3:4]
+		tgt[..., 3] = calc_alpha(tgt[..., 3], src_alpha[..., 0])
+		# The alpha channel is blended once more, using its already updated value.
+		tgt[..., :rng_chl] = scale_int(src[..., :rng_chl], src_alpha) + \
+			scale_int(tgt[..., :rng_chl], 255 - src_alpha)
+	elif source_c == 4 and target_c <= 3:
+		src_alpha = src[..., 3:4]
+		tgt[..., :rng_chl] = scale_int(src[..., :rng_chl], src_alpha) + \
+			scale_int(tgt[..., :rng_chl], 255 - src_alpha)
+	elif source_c <= 3 and target_c == 4: # Set target alpha to 0xFF, overwrite source
+		tgt[..., 3] = 0xFF
+		tgt[..., :rng_chl] = src[..., :rng_chl]
+	elif rng_chl <= 3: # No alpha, complete overwrite.
+		tgt[..., :rng_chl] = src[..., :rng_chl]
+
+	return 0
+
+# Rows tile_array maps into the decal lattice at once
+TILE_BAND_ROWS = 64
+
+def _nth_in_row_order(lo, hi, k):
+	# Returns the k-th of the tile rows lo..hi in the order 0, -1, -2, ..., 1, 2, ...
+	top = np.minimum(hi, 0)
+	non_positive = np.maximum(top - lo + 1, 0)
+	return np.where(k < non_positive, top - k, np.maximum(lo, 1) + (k - non_positive))
+
+def _nth_in_column_order(lo, hi, k):
+	# Returns the k-th of the tile columns lo..hi in the order 0, 1, 2, ..., -1, -2, ...
+	bottom = np.maximum(lo, 0)
+	non_negative = np.maximum(hi - bottom + 1, 0)
+	return np.where(k < non_negative, bottom + k, np.minimum(hi, -1) - (k - non_negative))
+
+def _tile_array_band(target, y0, source, pos_x, pos_y, lr_x, lr_y, ud_x, ud_y,
+		inv_det, u_range, v_range):
+	height, width = target.shape[:2]
+	src_h, src_w = source.shape[:2]
+	ys, xs = np.mgrid[y0:y0 + height, 0:width]
+	dx = xs - pos_x
+	dy = ys - pos_y
+	# Widened a little to be safe from rounding; exact bounds are checked per tile.
+	i0 = np.ceil((ud_y * dx - ud_x * dy) * inv_det - u_range[1] - 1e-6).astype(np.int32)
+	j0 = np.ceil((lr_x * dy - lr_y * dx) * inv_det - v_range[1] - 1e-6).astype(np.int32)
+	i_count = int(u_range[1] - u_range[0] + 2e-6) + 1
+	j_count = int(v_range[1] - v_range[0] + 2e-6) + 1
+	i1 = i0 + (i_count - 1)
+	j1 = j0 + (j_count - 1)
+	dx = dx.astype(np.int32)
+	dy = dy.astype(np.int32)
+
+	# Every pixel's candidate tiles are visited in their insertion order, one
+	# (rows, width) layer at a time; thin rotated decals have hundreds of them.
+	for kj in range(j_count):
+		j = _nth_in_row_order(j0, j1, kj)
+		row_x = dx - ud_x * j
+		row_y = dy - ud_y * j
+		for ki in range(i_count):
+			i = _nth_in_column_order(i0, i1, ki)
+			src_x = row_x - lr_x * i
+			src_y = row_y - lr_y * i
+			# Negative coordinates wrap around to large unsigned ones.
+			covers = (src_x.view(np.uint32) < src_w) & (src_y.view(np.uint32) < src_h)
+			if not covers.any():
+				continue
+			# Only the covered pixels are blended, as a strip of one pixel per row.
+			layer = source[src_y[covers], src_x[covers]][:, None]
+			covered = target[covers][:, None]
+			insert_array(covered, layer)
+			target[covers] = covered[:, 0]
+
+def tile_array(target, source, pos_x, pos_y, lr_x, lr_y, ud_x, ud_y, threads = 1):
+	"""
+	Inserts source into the RGBA target repeatedly, at every
+	(pos_x, pos_y) + i * (lr_x, lr_y) + j * (ud_x, ud_y) for all integers
+	i and j where it is visible. Overlapping tiles are inserted in rows
+	j = 0, -1, -2, ..., 1, 2, ... and in each row in the order
+	i = 0, 1, 2, ..., -1, -2, ..., as apply_decal has always done.
+	Instead of inserting tile after tile, every pixel of target is mapped
+	back into the lattice to find the few tiles covering it, so the cost
+	depends on the target's size and not on the amount of tiles.
+	If the lattice's vectors are parallel, source is inserted once.
+	"""
+	det = lr_x * ud_y - ud_x * lr_y
+	if det == 0:
+		insert_array(target, source, pos_x, pos_y)
+		return
+
+	src_h, src_w = source.shape[:2]
+	inv_det = 1.0 / det
+	# Lattice coordinates of the source's pixels relative to its origin; a pixel
+	# with the lattice coordinates (u, v) can only be covered by tiles in
+	# [u - max_u; u - min_u] x [v - max_v; v - min_v]. Transparent pixels change
+	# nothing when inserted, so only the visible ones count. A rotated decal's
+	# corners are transparent, and for thin ones, this shrinks the ranges to a
+	# few tiles instead of hundreds.
+	if source.shape[2] == 4:
+		ys, xs = np.nonzero(source[..., 3])
+		if ys.size == 0:
+			return
+	else:
+		xs = np.array((0, src_w - 1, 0, src_w - 1))
+		ys = np.array((0, 0, src_h - 1, src_h - 1))
+	pixel_u = (ud_y * xs - ud_x * ys) * inv_det
+	pixel_v = (lr_x * ys - lr_y * xs) * inv_det
+	u_range = (pixel_u.min(), pixel_u.max())
+	v_range = (pixel_v.min(), pixel_v.max())
+
+	_for_bands(
+		lambda y0, y1: _tile_array_band(target[y0:y1], y0, source, pos_x, pos_y,
+			lr_x, lr_y, ud_x, ud_y, inv_det, u_range, v_range),
+		target.shape[0], threads, TILE_BAND_ROWS
+	)
+
+def _mask_and_color_decal_band(res, hard_mask, decal_color, decal_area):
+	### HARD MASK REMOVAL HERE!
+	alpha = res[..., 3]
+	area_channel = _dominant_channel(hard_mask)
+	masked_alpha = np.where(
+		(hard_mask[..., 0] == 0) & (hard_mask[..., 1] == 0) & (hard_mask[..., 2] == 0),
+		0, scale_int(alpha, decal_area[area_channel])
+	)
+	res[..., 3] = np.where(alpha == 0, alpha, masked_alpha)
+
+	### COLORING HERE!
+	# Apparently, square rooting not necessary for decal.
+	visible = res[..., 3] != 0
+	res[..., :3][visible] = scale_int(decal_color[:3], res[..., :3][visible])
+
+def transform_decal(decal, rot = 0, scale_x = 1.0, scale_y = 1.0):
+	"""
+	Scales and rotates a decal image as its transformation parameters
+	(see the explanation of the decalspec in `bl2_skingen.argparser`)
+	say, independent of where it is placed. Returns a tuple of
+	(numpy array, lr_x, lr_y, ud_x, ud_y): the transformed RGBA decal and
+	the vectors from one repeated decal to the next along its rows and
+	columns, to be passed on to insert_decal.
+
+	decal : PIL.Image
+	rot : float | Rotation of the decal in degrees.
+	scale_x : float | Scale along x-axis
+	scale_y : float | Scale along y-axis
+	"""
+	# Keep at least a pixel of the decal at very small scales.
+	decal = decal.resize((
+		max(int(scale_x * decal.size[0]), 1),
+		max(int(scale_y * decal.size[1]), 1))
+	)
+	raw_size_x, raw_size_y = decal.size
+
+	decal = decal.rotate(rot, resample = PIL.Image.BICUBIC, expand = True)
+
+	decal_array = np.array(decal)
+
+	rel_lr_x = int(cos(torad(rot)) * raw_size_x)
+	rel_lr_y = int(-sin(torad(rot)) * raw_size_x)
+	rel_ud_x = int(cos(torad(rot) + HALF_PI) * raw_size_y)
+	rel_ud_y = int(-sin(torad(rot) + HALF_PI) * raw_size_y)
+
+	return (decal_array, rel_lr_x, rel_lr_y, rel_ud_x, rel_ud_y)
+
+def insert_decal(transformed, width, height, pos_x = 0, pos_y = 0, repeat = False):
+	"""
+	Places a decal transformed by transform_decal on a `height` x `width`
+	RGBA image, like place_decal does. Placing a decal on consecutive
+	bands of rows of an image, shifting `pos_y` up by each band's first
+	row, gives the same pixels as placing it on the whole image.
+
+	transformed : tuple | Result of transform_decal.
+	width : int | Width of the image the decal is placed on.
+	height : int | Height of the image the decal is placed on.
+	pos_x : int | x-position of the decal. May be negative.
+	pos_y : int | y-position of the decal. May be negative.
+	repeat : bool | Whether to repeat the decal along its initial placement.
+	"""
+	pos_x = int(pos_x)
+	pos_y = int(pos_y)
+	decal_array, rel_lr_x, rel_lr_y, rel_ud_x, rel_ud_y = transformed
+
+	### REPETITION HERE!
+	if repeat:
+		# The tiles cover the entire image.
+		res = np.zeros((height, width, 4), dtype = DTYPE)
+		tile_array(res, decal_array, pos_x, pos_y, rel_lr_x, rel_lr_y, rel_ud_x, rel_ud_y)
+		return (res, 0, 0)
+
+	x0 = min(max(pos_x, 0), width)
+	y0 = min(max(pos_y, 0), height)
+	x1 = max(min(pos_x + decal_array.shape[1], width), x0)
+	y1 = max(min(pos_y + decal_array.shape[0], height), y0)
+	res = np.zeros((y1 - y0, x1 - x0, 4), dtype = DTYPE)
+	insert_array(res, decal_array, pos_x - x0, pos_y - y0)
+
+	return (res, x0, y0)
+
+def place_decal(decal, width, height, pos_x = 0, pos_y = 0, rot = 0,
+		scale_x = 1.0, scale_y = 1.0, repeat = False):
+	"""
+	Takes a decal image and its transformation parameters (see the
+	explanation of the decalspec in `bl2_skingen.argparser`) and places
+	the decal on a `height` x `width` RGBA image, neither masked nor
+	colored. Only the region the decal was inserted into is returned, as a
+	tuple of (numpy array, offset_x, offset_y), the offsets being the
+	region's position on the image. The region may be empty if the decal
+	lies completely outside of the image.
+
+	decal : PIL.Image
+	width : int | Width of the image the decal is placed on.
+	height : int | Height of the image the decal is placed on.
+	pos_x : int | x-position of the decal. May be negative.
+	pos_y : int | y-position of the decal. May be negative.
+	rot : float | Rotation of the decal in degrees.
+	scale_x : float | Scale along x-axis
+	scale_y : float | Scale along y-axis
+	repeat : bool | Whether to repeat the decal along its initial placement.
+	"""
+	return insert_decal(transform_decal(decal, rot, scale_x, scale_y), width, height,
+		pos_x, pos_y, repeat)
+
+def apply_decal(decal, hard_mask, decal_color, decal_area, pos_x = 0, pos_y = 0,
+		rot = 0, scale_x = 1.0, scale_y = 1.0, repeat = False, threads = 1):
+	"""
+	Takes a decal image, hard mask and additional parameters (see the
+	explanation of the decalspec in `bl2_skingen.argparser`), returns
+	a numpy array representing the decal transformed according to the
+	parameters. Like place_decal, only the region the decal was inserted
+	into is returned and masked, as a tuple of (numpy array, offset_x,
+	offset_y).
+
+	decal : PIL.Image
+	hard_mask : np.ndarray[uint_8, ndim = 3]
+	decal_color : np.ndarray[unit_8, ndim = 1] | 4-value numpy array
+		containing the RGBA colors of the decal.
+	decal_area : np.ndarray[uint_8, ndim = 1] | A 3-value numpy array containing
+		the channels of the hard mask the decal should be visible on.
+	pos_x : int | x-position of the decal. May be negative.
+	pos_y : int | y-position of the decal. May be negative.
+	rot : float | Rotation of the decal in degrees.
+	scale_x : float | Scale along x-axis
+	scale_y : float | Scale along y-axis
+	repeat : bool | Whether to repeat the decal along its initial placement.
+	threads : int | Amount of threads to split the image's rows across when
+		masking and coloring the decal.
+	"""
+	res, off_x, off_y = place_decal(decal, hard_mask.shape[1], hard_mask.shape[0],
+		pos_x, pos_y, rot, scale_x, scale_y, repeat)
+	hard_mask = hard_mask[off_y:off_y + res.shape[0], off_x:off_x + res.shape[1]]
+
+	_for_bands(
+		lambda y0, y1: _mask_and_color_decal_band(res[y0:y1], hard_mask[y0:y1],
+			decal_color, decal_area),
+		res.shape[0], threads
+	)
+
+	return (res, off_x, off_y)
+
+def _blend_inplace_band(top_img, base_img):
+	top_alpha = top_img[..., 3:4]
+	base_img[..., 3] = calc_alpha(top_alpha[..., 0], base_img[..., 3])
+	base_img[..., :3] = scale_int(top_img[..., :3], top_alpha) + \
+		scale_int(base_img[..., :3], 255 - top_alpha)
+
+def blend_inplace(top_img, base_img, threads = 1):
+	"""
+	Blends top_img with base_img using regular alpha composition.
+	base_img will be modified in the process.
+	Both images should be supplied as RGBA.
+	The image's rows are split across `threads` threads.
+	"""
+	if top_img.ndim != 3 or base_img.ndim != 3:
+		raise ValueError("Supplied numpy arrays must be threedimensional!")
+
+	if top_img.shape[0] != base_img.shape[0] or top_img.shape[1] != base_img.shape[1]:
+		raise ValueError("Arrays must be of equal size!")
+
+	if top_img.shape[0] == 0 or base_img.shape[1] == 0 or top_img.shape[0] == 0 or base_img.shape[1] == 0:
+		raise ValueError("Arrays must not be 0 in width or height!")
+
+	if top_img.shape[2] != 4:
+		raise ValueError("Top Array must specify 4-value arrays as its innermost layer; [RGBA]")
+
+	if base_img.shape[2] != 4:
+		raise ValueError("Bottom array must specify 3-value arrays as its innermost layer; [RGBA]")
+
+	_for_bands(
+		lambda y0, y1: _blend_inplace_band(top_img[y0:y1], base_img[y0:y1]),
+		top_img.shape[0], threads
+	)
+
+def _multiply_band(top_img, base_img, res):
+	top_alpha = top_img[..., 3:4]
+	tmp_col = SQ_ROOT[scale_int(top_img[..., :3], base_img)]
+	res[:] = scale_int(top_alpha, tmp_col) + scale_int(255 - top_alpha, base_img)
+
+def multiply(top_img, base_img, threads = 1):
+	"""Blends top_img with base_img using multiply,
+	then takes the square root of the result, returning a numpy array.
+	Top image should be supplied as RGBA, base image as RGB.
+	The image's rows are split across `threads` threads.
+	"""
+	if top_img.ndim != 3 or base_img.ndim != 3:
+		raise ValueError("Supplied numpy arrays must be threedimensional!")
+
+	if top_img.shape[0] != base_img.shape[0] or top_img.shape[1] != base_img.shape[1]:
+		raise ValueError("Arrays must be of equal size!")
+
+	if top_img.shape[0] == 0 or base_img.shape[1] == 0 or top_img.shape[0] == 0 or base_img.shape[1] == 0:
+		raise ValueError("Arrays must not be 0 in width or height!")
+
+	if top_img.shape[2] != 4:
+		raise ValueError("Top Array must specify 4-value arrays as its innermost layer; [RGBA]")
+
+	if base_img.shape[2] != 3:
+		raise ValueError("Bottom array must specify 3-value arrays as its innermost layer; [RGB]")
+
+	res = np.empty((top_img.shape[0], top_img.shape[1], 3), dtype = DTYPE)
+	_for_bands(
+		lambda y0, y1: _multiply_band(top_img[y0:y1], base_img[y0:y1], res[y0:y1]),
+		res.shape[0], threads
+	)
+
+	return res
+
+
+# Rows rendered at once by render_fused; keeps a band's temporary arrays small
+# enough to stay in the CPU's cache.
+FUSED_BAND_ROWS = 64
+
+def _render_fused_band(mask, mask_filter, colors, lut, decal, decal_x, decal_y,
+		decal_color, decal_area, base_img, res):
+	# decal_y is relative to the band here.
+	hard_mask, soft_mask = split_mask(mask, mask_filter)
+	overlay = np.zeros((mask.shape[0], mask.shape[1], 4), dtype = DTYPE)
+	if lut is None:
+		_ue_color_diff_band(hard_mask, soft_mask, colors, overlay)
+	else:
+		_ue_color_diff_lut_band(hard_mask, soft_mask, lut, overlay)
+	if decal is not None:
+		y0 = max(decal_y, 0)
+		y1 = min(decal_y + decal.shape[0], mask.shape[0])
+		if y0 < y1 and decal.shape[1] != 0:
+			decal = decal[y0 - decal_y:y1 - decal_y].copy()
+			region = (slice(y0, y1), slice(decal_x, decal_x + decal.shape[1]))
+			_mask_and_color_decal_band(decal, hard_mask[region], decal_color, decal_area)
+			_blend_inplace_band(decal, overlay[region])
+	_multiply_band(overlay, base_img, res)
+
+def render_fused(mask, colors, lut, decal, decal_x, decal_y, decal_color, decal_area,
+		base_img, mask_filter = MASK_BILINEAR, threads = 1):
+	"""
+	Renders a part band by band, producing the same image as running
+	ue_color_diff (or ue_color_diff_lut), apply_decal, blend_inplace and
+	multiply on the masks returned by split_mask after another, but without
+	creating any of their intermediate images in full size. Returns the final
+	image as an RGB numpy array.
+
+	mask : np.ndarray[uint_8, ndim = 3] | The packed mask texture, with the
+		soft mask in its left and the hard mask in its right half. Both are
+		stretched to the full width while rendering.
+	colors : np.ndarray[uint_8, ndim = 3] | The part's colors, see ue_color_diff.
+	lut : None;np.ndarray[uint_8, ndim = 4] | Lookup table built by
+		build_color_lut. If given, the colors are looked up in it instead of
+		being calculated from `colors`.
+	decal : None;np.ndarray[uint_8, ndim = 3] | RGBA decal region as returned
+		by place_decal. None to render without a decal.
+	decal_x : int | x-position of the decal region on the image.
+	decal_y : int | y-position of the decal region on the image.
+	decal_color : np.ndarray[unit_8, ndim = 1] | 4-value numpy array
+		containing the RGBA colors of the decal.
+	decal_area : np.ndarray[uint_8, ndim = 1] | A 3-value numpy array containing
+		the channels of the hard mask the decal should be visible on.
+	base_img : np.ndarray[uint_8, ndim = 3] | The RGB diffuse texture.
+	mask_filter : int | 0 to stretch the mask halves with nearest neighbour,
+		1 to stretch them bilinearly.
+	threads : int | Amount of threads to split the image's rows across.
+	"""
+	if mask.shape[0] != base_img.shape[0] or mask.shape[1] != base_img.shape[1]:
+		raise ValueError("Mask and base image must be of equal size!")
+
+	if mask.shape[0] == 0 or mask.shape[1] == 0:
+		raise ValueError("Arrays must not be 0 in width or height!")
+
+	if mask.shape[1] % 2 != 0:
+		raise ValueError("Mask must be of even width!")
+
+	if mask.shape[2] != 3:
+		raise ValueError("Mask image array must specify 3-value arrays as its innermost layer; [R, G, B]")
+
+	if base_img.shape[2] != 3:
+		raise ValueError("Base array must specify 3-value arrays as its innermost layer; [RGB]")
+
+	if mask_filter != MASK_NEAREST and mask_filter != MASK_BILINEAR:
+		raise ValueError(f"Unknown mask filter: {mask_filter}")
+
+	if lut is not None and lut.shape != (3, 256, 256, 4):
+		raise ValueError("Lookup table must be of shape [3, 256, 256, 4].")
+
+	if decal is not None and (decal_x < 0 or decal_y < 0 or
+			decal_x + decal.shape[1] > mask.shape[1] or
+			decal_y + decal.shape[0] > mask.shape[0] or decal.shape[2] != 4):
+		raise ValueError("Decal region must be an RGBA array within the mask's bounds.")
+
+	res = np.empty((mask.shape[0], mask.shape[1], 3), dtype = DTYPE)
+	_for_bands(
+		lambda y0, y1: _render_fused_band(mask[y0:y1], mask_filter, colors, lut,
+			decal, decal_x, decal_y - y0, decal_color, decal_area,
+			base_img[y0:y1], res[y0:y1]),
+		res.shape[0], threads, FUSED_BAND_ROWS
+	)
+
+	return res
@@ -0,0 +1,201 @@
+import cython
+from cython.parallel cimport prange
+import numpy as np
+cimport numpy as np
+
+from shared_funcs cimport calc_alpha, col_median, scale_int, swoop
+include "sqrt_arr.pxd"
+
+np.import_array()
+
+DTYPE = np.uint8
+ctypedef np.uint8_t DTYPE_t
+
+# Values of render_fused's mask_filter parameter, see bl2_skingen.backends.MASK_FILTERS
+cdef enum:
+	MASK_NEAREST = 0
+	MASK_BILINEAR = 1
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline np.uint8_t sample_half(
+		const DTYPE_t[:, :, :] mask,
+		int y,
+		int x,
+		int c,
+		int offset,
+		int half_w,
+		bint bilinear) noexcept nogil:
+	# Samples channel c of the mask half starting at column `offset`, stretched to twice
+	# its width, at (x, y). Bilinear weighs the nearer source column 3:1 against its
+	# neighbour, the edges of the half are clamped.
+	cdef int i = x >> 1
+	cdef int j
+	if not bilinear:
+		return mask[y, offset + i, c]
+	if x & 1:
+		j = i + 1 if i + 1 < half_w else i
+	else:
+		j = i - 1 if i > 0 else i
+	return (3 * mask[y, offset + i, c] + mask[y, offset + j, c] + 2) >> 2
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef np.ndarray[DTYPE_t, ndim = 3] render_fused(
+		const DTYPE_t[:, :, :] mask,
+		const DTYPE_t[:, :, :] colors,
+		const DTYPE_t[:, :, :, :] lut,
+		const DTYPE_t[:, :, :] decal,
+		int decal_x,
+		int decal_y,
+		const DTYPE_t[:] decal_color,
+		const DTYPE_t[:] decal_area,
+		const DTYPE_t[:, :, :] base_img,
+		int mask_filter = MASK_BILINEAR,
+		int threads = 1):
+	"""
+	Renders a part in a single pass, producing the same image as running
+	ue_color_diff (or ue_color_diff_lut), apply_decal, blend_inplace and
+	multiply on the masks returned by split_mask after another, but without
+	creating any of their intermediate images. Returns the final image as an
+	RGB numpy array.
+
+	mask : np.ndarray[uint_8, ndim = 3] | The packed mask texture, with the
+		soft mask in its left and the hard mask in its right half. Both are
+		stretched to the full width while rendering.
+	colors : np.ndarray[uint_8, ndim = 3] | The part's colors, see ue_color_diff.
+	lut : None;np.ndarray[uint_8, ndim = 4] | Lookup table built by
+		build_color_lut. If given, the colors are looked up in it instead of
+		being calculated from `colors`.
+	decal : None;np.ndarray[uint_8, ndim = 3] | RGBA decal region as returned
+		by place_decal. None to render without a decal.
+	decal_x : int | x-position of the decal region on the image.
+	decal_y : int | y-position of the decal region on the image.
+	decal_color : np.ndarray[unit_8, ndim = 1] | 4-value numpy array
+		containing the RGBA colors of the decal.
+	decal_area : np.ndarray[uint_8, ndim = 1] | A 3-value numpy array containing
+		the channels of the hard mask the decal should be visible on.
+	base_img : np.ndarray[uint_8, ndim = 3] | The RGB diffuse texture.
+	mask_filter : int | 0 to stretch the mask halves with nearest neighbour,
+		1 to stretch them bilinearly.
+	threads : int | Amount of threads to split the image's rows across.
+	"""
+	if mask.shape[0] != base_img.shape[0] or mask.shape[1] != base_img.shape[1]:
+		raise ValueError("Mask and base image must be of equal size!")
+
+	if mask.shape[0] == 0 or mask.shape[1] == 0:
+		raise ValueError("Arrays must not be 0 in width or height!")
+
+	if mask.shape[1] % 2 != 0:
+		raise ValueError("Mask must be of even width!")
+
+	if mask.shape[2] != 3:
+		raise ValueError("Mask image array must specify 3-value arrays as its innermost layer; [R, G, B]")
+
+	if base_img.shape[2] != 3:
+		raise ValueError("Base array must specify 3-value arrays as its innermost layer; [RGB]")
+
+	if mask_filter != MASK_NEAREST and mask_filter != MASK_BILINEAR:
+		raise ValueError(f"Unknown mask filter: {mask_filter}")
+
+	cdef bint use_lut = lut is not None
+	cdef bint use_decal = decal is not None
+	cdef bint bilinear = mask_filter == MASK_BILINEAR
+
+	if use_lut and (lut.shape[0] != 3 or lut.shape[1] != 256 or lut.shape[2] != 256 or lut.shape[3] != 4):
+		raise ValueError("Lookup table must be of shape [3, 256, 256, 4].")
+
+	if use_decal and (decal_x < 0 or decal_y < 0 or
+			decal_x + decal.shape[1] > mask.shape[1] or
+			decal_y + decal.shape[0] > mask.shape[0] or decal.shape[2] != 4):
+		raise ValueError("Decal region must be an RGBA array within the mask's bounds.")
+
+	res_arr = np.empty([mask.shape[0], mask.shape[1], 3], dtype = DTYPE)
+	cdef DTYPE_t[:, :, ::1] res = res_arr
+
+	cdef np.uint8_t rgb # channel iterator variable
+	cdef np.uint8_t ccol # current color
+	cdef np.uint8_t mix # mixing multiplier
+	cdef np.uint8_t s_r, s_g # soft mask values
+	cdef np.uint8_t h_a, h_b, h_c, h_cur # hard mask values
+	cdef np.uint8_t ov_a, ov_c # overlay alpha and color
+	cdef np.uint8_t dec_a # decal alpha
+	cdef np.uint8_t fin_a # overlay alpha after stamping the decal on it
+	cdef bint visible
+	cdef int y, x
+	cdef int dy, dx # position in the decal region
+
+	cdef int w = res.shape[1]
+	cdef int h = res.shape[0] # y
+	cdef int half_w = w // 2
+	cdef int dec_w = decal.shape[1] if use_decal else 0
+	cdef int dec_h = decal.shape[0] if use_decal else 0
+	threads = max(threads, 1)
+
+	for y in prange(h, nogil = True, num_threads = threads, schedule = "static"):
+		for x in range(w):
+			h_a = sample_half(mask, y, x, 0, half_w, half_w, bilinear)
+			h_b = sample_half(mask, y, x, 1, half_w, half_w, bilinear)
+			h_c = sample_half(mask, y, x, 2, half_w, half_w, bilinear)
+			if h_a >= h_b and h_a >= h_c:   # A
+				ccol = 0
+				h_cur = h_a
+			elif h_b >= h_a and h_b >= h_c: # B
+				ccol = 1
+				h_cur = h_b
+			else: # C
+				ccol = 2
+				h_cur = h_c
+			visible = h_cur >= 40
+			s_r = sample_half(mask, y, x, 0, 0, half_w, bilinear)
+			s_g = sample_half(mask, y, x, 1, 0, half_w, bilinear)
+			mix = swoop(s_r, s_g)
+
+			### OVERLAY ALPHA
+			ov_a = 0
+			if visible:
+				if use_lut:
+					ov_a = lut[ccol, s_r, s_g, 3]
+				else:
+					ov_a = col_median(
+						col_median(colors[ccol, 1, 3], colors[ccol, 0, 3], s_g),
+						col_median(colors[ccol, 1, 3], colors[ccol, 2, 3], s_r),
+						mix
+					)
+
+			### DECAL ALPHA, masked by the hard mask
+			dec_a = 0
+			dy = y - decal_y
+			dx = x - decal_x
+			if (dy >= 0 and dy < dec_h and dx >= 0 and dx < dec_w and decal[dy, dx, 3] != 0 and
+					(h_a != 0 or h_b != 0 or h_c != 0)):
+				dec_a = scale_int(decal[dy, dx, 3], decal_area[ccol])
+
+			fin_a = ov_a
+			if dec_a != 0:
+				fin_a = calc_alpha(dec_a, ov_a)
+
+			for rgb in range(3):
+				ov_c = 0
+				if visible:
+					if use_lut:
+						ov_c = lut[ccol, s_r, s_g, rgb]
+					else:
+						ov_c = col_median(
+							col_median(colors[ccol, 1, rgb], colors[ccol, 0, rgb], s_g),
+							col_median(colors[ccol, 1, rgb], colors[ccol, 2, rgb], s_r),
+							mix
+						)
+				### DECAL, colored and blended onto the overlay
+				if dec_a != 0:
+					ov_c = (
+						scale_int(scale_int(decal_color[rgb], decal[dy, dx, rgb]), dec_a) +
+						scale_int(ov_c, 255 - dec_a)
+					)
+				### MULTIPLY with the base image
+				res[y, x, rgb] = (
+					scale_int(fin_a, sq_root[scale_int(ov_c, base_img[y, x, rgb])]) +
+					scale_int(255 - fin_a, base_img[y, x, rgb])
+				)
+
+	return res_arr
@@ -1,5 +1,5 @@
 """
-Serves as a host for scale_int and calc_alpha
+Serves as a host for scale_int, calc_alpha, col_median and swoop
 """
 import cython
 import numpy as np
@@ -10,10 +10,24 @@ np.import_array()
 #DTYPE = np.uint8
 ctypedef np.uint8_t DTYPE_t
 
-cdef inline np.uint8_t scale_int(np.uint8_t a, np.uint8_t b):
+cdef inline np.uint8_t scale_int(np.uint8_t a, np.uint8_t b) noexcept nogil:
 	# Multiplies two integers [0x0; 0xFF] as if they were floats. (127, 127) -> 65
 	cdef unsigned short product = (a * b) + 0x80
 	return ((product >> 8) + product) >> 8
 
-cdef inline np.uint8_t calc_alpha(np.uint8_t a, np.uint8_t b):
+cdef inline np.uint8_t calc_alpha(np.uint8_t a, np.uint8_t b) noexcept nogil:
 	return scale_int(a, (255 - b)) + b
+
+cdef inline np.uint8_t col_median(np.uint8_t a, np.uint8_t b, np.uint8_t percentage) noexcept nogil:
+	# Returns median value between input values; if percentage is 0, return a, if percentage is 255 return b
+	return scale_int(a, (255 - percentage)) + scale_int(b, percentage)
+
+@cython.cdivision(True)
+cdef inline np.uint8_t swoop(np.uint8_t a, np.uint8_t b) noexcept nogil:
+	# Fancy mathematics
+	if a == 0 and b == 0:
+		return 127
+	if a >= b:
+		return 127+<np.uint8_t>((1-(b/a))*128)
+	else:
+		return 127-<np.uint8_t>((1-(a/b))*127)
@@ -1,34 +1,16 @@
 import cython
+from cython.parallel cimport prange
 import numpy as np
 cimport numpy as np
 
-from shared_funcs cimport scale_int
+from shared_funcs cimport col_median, swoop
 
 np.import_array()
 
 DTYPE = np.uint8
 ctypedef np.uint8_t DTYPE_t
 
-cdef np.uint8_t col_median(np.uint8_t a, np.uint8_t b, np.uint8_t percentage):
-	# Returns median value between input values; if percentage is 0, return a, if percentage is 255 return b
-	return scale_int(a, (255 - percentage)) + scale_int(b, percentage)
-
-@cython.cdivision(True)
-cdef np.uint8_t swoop(np.uint8_t a, np.uint8_t b):
-	# Fancy mathematics
-	if a == 0 and b == 0:
-		return 127
-	if a >= b:
-		return 127+<np.uint8_t>((1-(b/a))*128)
-	else:
-		return 127-<np.uint8_t>((1-(a/b))*127)
-
-@cython.boundscheck(False)
-@cython.wraparound(False)
-cpdef ue_color_diff(np.ndarray[DTYPE_t, ndim = 3] hard_mask, np.ndarray[DTYPE_t, ndim = 3] soft_mask, np.ndarray[DTYPE_t, ndim = 3] colors):
-	# [0]: A, [1]: B, [2]: C
-	# [x][0]: "shadow", [x][1]: "mid", [x][2]: "hilight"
-	# [x][y][0]: R, [x][y][1]: G, [x][y][2]: B, [x][y][3]: A
+def _check_masks(hard_mask, soft_mask):
 	if hard_mask.ndim != 3 or soft_mask.ndim != 3:
 		raise ValueError("Masks must be supplied as three dimensional arrays.")
 
@@ -41,31 +23,42 @@ cpdef ue_color_diff(np.ndarray[DTYPE_t, ndim = 3] hard_mask, np.ndarray[DTYPE_t,
 	if hard_mask.shape[0] != soft_mask.shape[0] or hard_mask.shape[1] != soft_mask.shape[1]:
 		raise ValueError("Mask images must perfectly overlap eachother (so have the same size)")
 
-	cdef np.ndarray[DTYPE_t, ndim = 3] res = np.ndarray([hard_mask.shape[0], hard_mask.shape[1], 4], dtype = DTYPE)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef ue_color_diff(
+		const DTYPE_t[:, :, :] hard_mask,
+		const DTYPE_t[:, :, :] soft_mask,
+		const DTYPE_t[:, :, :] colors,
+		int threads = 1):
+	# [0]: A, [1]: B, [2]: C
+	# [x][0]: "shadow", [x][1]: "mid", [x][2]: "hilight"
+	# [x][y][0]: R, [x][y][1]: G, [x][y][2]: B, [x][y][3]: A
+	# threads: Amount of threads to split the image's rows across.
+	_check_masks(hard_mask, soft_mask)
+
+	res_arr = np.zeros([hard_mask.shape[0], hard_mask.shape[1], 4], dtype = DTYPE)
+	cdef DTYPE_t[:, :, ::1] res = res_arr
 
 	cdef np.uint8_t rgba # channel iterator variable
 	cdef np.uint8_t ccol # current color
 	cdef np.uint8_t c0 # calculation storage
 	cdef np.uint8_t c1 # calculation storage
 	cdef np.uint8_t dif # mixing multiplier
+	cdef int y, x
 
 	cdef int w = res.shape[1]
 	cdef int h = res.shape[0] # y
+	threads = max(threads, 1)
 
-	for y in range(h):
+	for y in prange(h, nogil = True, num_threads = threads, schedule = "static"):
 		for x in range(w):
-			res[y, x, 3] = 0xFF
 			if hard_mask[y, x, 0] >= hard_mask[y, x, 1] and hard_mask[y, x, 0] >= hard_mask[y, x, 2]:   # A
 				ccol = 0
 			elif hard_mask[y, x, 1] >= hard_mask[y, x, 0] and hard_mask[y, x, 1] >= hard_mask[y, x, 2]: # B
 				ccol = 1
-			elif hard_mask[y, x, 2] >= hard_mask[y, x, 0] and hard_mask[y, x, 2] >= hard_mask[y, x, 1]: # C
+			else: # C
 				ccol = 2
-			else:
-				res[y, x, 3] = 0x00
-				continue
 			if hard_mask[y, x, ccol] < 40:
-				res[y, x, 3] = 0x00
 				continue
 			dif = swoop(soft_mask[y, x, 0], soft_mask[y, x, 1])
 			for rgba in range(4):
@@ -73,4 +66,48 @@ cpdef ue_color_diff(np.ndarray[DTYPE_t, ndim = 3] hard_mask, np.ndarray[DTYPE_t,
 				c1 = col_median(colors[ccol, 1, rgba], colors[ccol, 2, rgba], soft_mask[y, x, 0])
 				res[y, x, rgba] = col_median(c0, c1, dif)
 
-	return res
+	return res_arr
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef ue_color_diff_lut(
+		const DTYPE_t[:, :, :] hard_mask,
+		const DTYPE_t[:, :, :] soft_mask,
+		const DTYPE_t[:, :, :, :] lut,
+		int threads = 1):
+	"""
+	Produces the same result as ue_color_diff, but takes the colors from a
+	[3, 256, 256, 4] lookup table, indexed by the dominant hard mask channel
+	and the soft mask's red and green values.
+	See bl2_skingen.imaging.numpy_kernels.build_color_lut.
+	"""
+	_check_masks(hard_mask, soft_mask)
+
+	if lut.shape[0] != 3 or lut.shape[1] != 256 or lut.shape[2] != 256 or lut.shape[3] != 4:
+		raise ValueError("Lookup table must be of shape [3, 256, 256, 4].")
+
+	res_arr = np.zeros([hard_mask.shape[0], hard_mask.shape[1], 4], dtype = DTYPE)
+	cdef DTYPE_t[:, :, ::1] res = res_arr
+
+	cdef np.uint8_t rgba # channel iterator variable
+	cdef np.uint8_t ccol # current color
+	cdef int y, x
+
+	cdef int w = res.shape[1]
+	cdef int h = res.shape[0] # y
+	threads = max(threads, 1)
+
+	for y in prange(h, nogil = True, num_threads = threads, schedule = "static"):
+		for x in range(w):
+			if hard_mask[y, x, 0] >= hard_mask[y, x, 1] and hard_mask[y, x, 0] >= hard_mask[y, x, 2]:   # A
+				ccol = 0
+			elif hard_mask[y, x, 1] >= hard_mask[y, x, 0] and hard_mask[y, x, 1] >= hard_mask[y, x, 2]: # B
+				ccol = 1
+			else: # C
+				ccol = 2
+			if hard_mask[y, x, ccol] < 40:
+				continue
+			for rgba in range(4):
+				res[y, x, rgba] = lut[ccol, soft_mask[y, x, 0], soft_mask[y, x, 1], rgba]
+
+	return res_arr
@@ -0,0 +1,47 @@
+"""
+Implements the index subcommand, which stores the parameters of every
+material below a root directory in a ParameterIndex.
+"""
+
+from pathlib import Path
+import sqlite3
+import sys
+import time
+
+from bl2_skingen.argparser import get_index_argparser
+from bl2_skingen.param_index import INDEX_NAME, ParameterIndex
+from bl2_skingen.skingen import SKINGEN_LOGGER
+
+def main(argv):
+	argparser = get_index_argparser()
+
+	if not argv:
+		argparser.print_help()
+		sys.exit()
+
+	args = argparser.parse_args(argv)
+	SKINGEN_LOGGER.setLevel(21 + (min(args.silence, 3) * 3))
+
+	index_file = args.index_file
+	if index_file is None:
+		index_file = Path(args.root, INDEX_NAME)
+	index = ParameterIndex(index_file)
+
+	start = time.perf_counter()
+	try:
+		res = index.update(args.root, SKINGEN_LOGGER)
+		SKINGEN_LOGGER.log(25, f"Indexed {res.indexed} props file(s) in "
+			f"{time.perf_counter() - start:.2f}s; {res.unchanged} unchanged, {res.removed} "
+			f"removed, {res.failed} failed. Index: {index.path}")
+		if args.uses is not None:
+			users = index.find_texture_users(args.uses)
+			SKINGEN_LOGGER.log(30, f"{len(users)} parameter(s) refer to textures matching "
+				f"{args.uses!r}:")
+			for user in users:
+				SKINGEN_LOGGER.log(30, f"\t{user.package} {user.part} {user.parameter}: "
+					f"{user.texture_path}")
+	except sqlite3.Error as exc:
+		SKINGEN_LOGGER.log(50, f"Unable to use index {index.path}: {exc}")
+		sys.exit(1)
+	finally:
+		index.close()
@@ -19,3 +19,10 @@ class SkingenLogFormatter(logging.Formatter):
 				record.levelname = LEVELS[re_res // 10] 
 
 		return super().format(record)
+
+class PrefixLoggerAdapter(logging.LoggerAdapter):
+	"""Logger adapter that prepends "[<prefix>] " to every message, so output
+	of several simultaneous jobs stays attributable.
+	"""
+	def process(self, msg, kwargs):
+		return f"[{self.extra['prefix']}] {msg}", kwargs
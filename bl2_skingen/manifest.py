@@ -0,0 +1,103 @@
+"""
+Provides the Manifest, which remembers a fingerprint of the inputs of
+every generated file, so unchanged parts can be skipped on later runs.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+
+MANIFEST_NAME = ".skingen_manifest.json"
+MANIFEST_VERSION = 1
+
+def file_digest(path):
+	"""
+	Returns the hex SHA-1 digest of the file at `path`'s contents.
+	"""
+	hasher = hashlib.sha1()
+	with open(path, "rb") as h:
+		for chunk in iter(lambda: h.read(1 << 20), b""):
+			hasher.update(chunk)
+	return hasher.hexdigest()
+
+def fingerprint(components):
+	"""
+	Returns a hex digest uniquely identifying `components`, a dict of
+	json-serializable values.
+	"""
+	return hashlib.sha1(json.dumps(components, sort_keys = True).encode("utf-8")).hexdigest()
+
+def _read_entries(path):
+	try:
+		with open(path, "r") as h:
+			data = json.load(h)
+	except (OSError, ValueError):
+		return {}
+	if not isinstance(data, dict) or data.get("version") != MANIFEST_VERSION or \
+			not isinstance(data.get("parts"), dict):
+		return {}
+	return data["parts"]
+
+class Manifest():
+	"""
+	Maps the names of generated files in an output directory to the
+	fingerprints of the inputs they were generated from.
+	Recorded fingerprints are kept apart in `changes` until the manifest
+	is saved, so multiple processes can record into copies of the same
+	manifest and have them merged.
+	"""
+	def __init__(self, path, entries = None):
+		"""
+		path : str;pathlib.Path | Path of the manifest file.
+		entries : None;dict | Fingerprints already known.
+		"""
+		self.path = Path(path)
+		self.entries = {} if entries is None else entries
+		self.changes = {}
+
+	@classmethod
+	def load(cls, out_dir):
+		"""
+		Returns the manifest of the output directory `out_dir`. If there is
+		none or it can not be read, it will be empty.
+		"""
+		path = Path(out_dir, MANIFEST_NAME)
+		return cls(path, _read_entries(path))
+
+	def is_current(self, name, fingerprint):
+		"""
+		Returns whether the file `name` was generated from inputs with the
+		given fingerprint.
+		"""
+		return self.entries.get(name) == fingerprint
+
+	def record(self, name, fingerprint):
+		"""
+		Records that the file `name` was generated from inputs with the
+		given fingerprint.
+		"""
+		self.entries[name] = fingerprint
+		self.changes[name] = fingerprint
+
+	def save(self):
+		"""
+		Merges the recorded changes into the manifest file on disk.
+		"""
+		if not self.changes:
+			return
+		entries = _read_entries(self.path)
+		entries.update(self.changes)
+		self.path.parent.mkdir(parents = True, exist_ok = True)
+		fd, tmp_path = tempfile.mkstemp(suffix = ".tmp", dir = self.path.parent)
+		try:
+			with os.fdopen(fd, "w") as h:
+				json.dump({"version": MANIFEST_VERSION, "parts": entries}, h,
+					indent = "\t", sort_keys = True)
+			os.replace(tmp_path, self.path)
+		except BaseException:
+			os.remove(tmp_path)
+			raise
+		self.entries.update(entries)
+		self.changes = {}
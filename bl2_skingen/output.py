@@ -0,0 +1,326 @@
+"""
+Provides the ImageWriter, which saves generated images in one of the
+OUTPUT_FORMATS. Images are written band by band, straight from numpy
+arrays or an iterable producing their rows, so they are never copied as
+a whole.
+"""
+
+import os
+from pathlib import Path
+import secrets
+import struct
+import zlib
+
+import numpy
+
+# Zlib compression level Pillow uses for PNGs by default.
+DEFAULT_PNG_LEVEL = 6
+
+# Format name -> extension of the files written in it.
+OUTPUT_FORMATS = {
+	"png": ".png",
+	"tga": ".tga",
+	"npy": ".npy",
+}
+
+# Row filters a PNG can be written with; their index is their PNG filter type.
+# "adaptive" picks the one with the smallest sum of absolute differences for
+# every row, as libpng does.
+PNG_FILTERS = ("none", "sub", "up", "average", "paeth", "adaptive")
+DEFAULT_PNG_FILTER = "adaptive"
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_COLOR_TYPES = {3: 2, 4: 6} # Channels -> PNG color type; RGB, RGBA
+# Amount of compressed data to gather before writing it as an IDAT chunk.
+PNG_IDAT_SIZE = 1 << 16
+
+TGA_ALPHA_BITS = {3: 0, 4: 8}
+
+# Rows an array is split into bands of for writing.
+BAND_ROWS = 16
+
+def iter_bands(arr, band_rows = BAND_ROWS):
+	"""
+	Yields views of consecutive bands of `band_rows` rows of `arr`.
+	"""
+	for y in range(0, arr.shape[0], band_rows):
+		yield arr[y:y + band_rows]
+
+def halve(arr):
+	"""
+	Returns the image in the numpy array `arr` scaled to half its width
+	and height with a box filter; every pixel is the rounded average of a
+	2x2 block. An odd last row or column is dropped.
+	"""
+	h, w = arr.shape[0] & ~1, arr.shape[1] & ~1
+	res = arr[0:h:2, 0:w:2].astype(numpy.uint16)
+	res += arr[1:h:2, 0:w:2]
+	res += arr[0:h:2, 1:w:2]
+	res += arr[1:h:2, 1:w:2]
+	res += 2
+	res >>= 2
+	return res.astype(numpy.uint8)
+
+def iter_mips(arr, levels):
+	"""
+	Yields `arr` followed by up to `levels` successively halved versions
+	of it, stopping early once a side would shrink below one pixel.
+	"""
+	yield arr
+	for _ in range(levels):
+		if arr.shape[0] < 2 or arr.shape[1] < 2:
+			return
+		arr = halve(arr)
+		yield arr
+
+def _png_chunk(h, tag, data):
+	h.write(struct.pack(">I", len(data)))
+	h.write(tag)
+	h.write(data)
+	h.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag))))
+
+def _png_predictors(rows, prev, bpp):
+	"""
+	Returns the left, upper and upper left neighbours of every byte in
+	`rows`, an int16 array of shape (n, stride), as int16 arrays. `prev`
+	is the row preceding them.
+	"""
+	up = numpy.empty_like(rows)
+	up[0] = prev
+	up[1:] = rows[:-1]
+	left = numpy.zeros_like(rows)
+	left[:, bpp:] = rows[:, :-bpp]
+	up_left = numpy.zeros_like(rows)
+	up_left[:, bpp:] = up[:, :-bpp]
+	return left, up, up_left
+
+def _png_paeth(left, up, up_left):
+	p = left + up - up_left
+	pa = numpy.abs(p - left)
+	pb = numpy.abs(p - up)
+	pc = numpy.abs(p - up_left)
+	return numpy.where((pa <= pb) & (pa <= pc), left, numpy.where(pb <= pc, up, up_left))
+
+def _png_prediction(filter_type, left, up, up_left):
+	if filter_type == 1:
+		return left
+	if filter_type == 2:
+		return up
+	if filter_type == 3:
+		return (left + up) >> 1
+	return _png_paeth(left, up, up_left)
+
+def _png_scores(filtered):
+	# Sum of the absolute values of each row's bytes taken as signed, which
+	# estimates how well it compresses. abs(-128) stays -128 as int8, but
+	# is read back correctly as uint8.
+	return numpy.abs(filtered.view(numpy.int8)).view(numpy.uint8).sum(axis = 1,
+		dtype = numpy.uint32)
+
+def _png_filter_rows(rows, prev, bpp, filter_type):
+	"""
+	Filters `rows`, a uint8 array of shape (n, stride), and returns them
+	with the filter type byte prepended to each as a uint8 array of shape
+	(n, stride + 1). `prev` is the row preceding them, zeros for the first.
+	"""
+	res = numpy.empty((rows.shape[0], rows.shape[1] + 1), dtype = numpy.uint8)
+	if filter_type == 0:
+		res[:, 0] = 0
+		res[:, 1:] = rows
+		return res
+
+	# PNG filters predict from the unfiltered bytes, so all rows can be
+	# filtered at once.
+	wide = rows.astype(numpy.int16)
+	left, up, up_left = _png_predictors(wide, prev.astype(numpy.int16), bpp)
+	if filter_type == 5:
+		res[:, 0] = 0
+		res[:, 1:] = rows
+		best_scores = _png_scores(rows)
+		for candidate_type in range(1, 5):
+			candidate = (wide - _png_prediction(candidate_type, left, up, up_left)) \
+				.astype(numpy.uint8)
+			scores = _png_scores(candidate)
+			better = scores < best_scores
+			res[better, 0] = candidate_type
+			res[better, 1:] = candidate[better]
+			best_scores[better] = scores[better]
+		return res
+
+	res[:, 0] = filter_type
+	# Wraps around modulo 256, as required
+	res[:, 1:] = wide - _png_prediction(filter_type, left, up, up_left)
+	return res
+
+def write_png(h, bands, shape, level = DEFAULT_PNG_LEVEL, filter_ = DEFAULT_PNG_FILTER):
+	"""
+	Writes a PNG image to the binary file handle `h`, filtering and
+	compressing every band as it arrives.
+
+	h : BinaryIO | File handle to write to.
+	bands : Iterable[numpy.ndarray[numpy.uint8, ndim = 3]] | Consecutive
+		bands of rows of the image, each of shape (n, width, channels).
+	shape : tuple[int, int, int] | Shape of the whole image;
+		(height, width, channels) with 3 or 4 channels.
+	level : int | Zlib compression level, 0 - 9.
+	filter_ : str | One of PNG_FILTERS.
+	"""
+	height, width, channels = shape
+	stride = width * channels
+	filter_type = PNG_FILTERS.index(filter_)
+	h.write(PNG_SIGNATURE)
+	_png_chunk(h, b"IHDR", struct.pack(">IIBBBBB", width, height, 8,
+		PNG_COLOR_TYPES[channels], 0, 0, 0))
+
+	# Like libpng, favor short matches on filtered data.
+	compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9,
+		zlib.Z_FILTERED if filter_type else zlib.Z_DEFAULT_STRATEGY)
+	pending = []
+	pending_size = 0
+	prev = numpy.zeros(stride, dtype = numpy.uint8)
+	rows_written = 0
+	for band in bands:
+		rows = numpy.ascontiguousarray(band, dtype = numpy.uint8).reshape(-1, stride)
+		if rows.shape[0] == 0:
+			continue
+		data = compressor.compress(_png_filter_rows(rows, prev, channels, filter_type))
+		prev = rows[-1].copy() # The producer may reuse the band's memory
+		rows_written += rows.shape[0]
+		if data:
+			pending.append(data)
+			pending_size += len(data)
+		if pending_size >= PNG_IDAT_SIZE:
+			_png_chunk(h, b"IDAT", b"".join(pending))
+			pending = []
+			pending_size = 0
+	if rows_written != height:
+		raise ValueError(f"Expected {height} rows, got {rows_written}.")
+	pending.append(compressor.flush())
+	_png_chunk(h, b"IDAT", b"".join(pending))
+	_png_chunk(h, b"IEND", b"")
+
+def write_tga(h, bands, shape):
+	"""
+	Writes an uncompressed TGA image with its origin in the upper left
+	corner to the binary file handle `h`. See write_png for `bands` and
+	`shape`.
+	"""
+	height, width, channels = shape
+	h.write(struct.pack("<BBBHHBHHHHBB", 0, 0, 2, 0, 0, 0, 0, 0, width, height,
+		channels * 8, 0x20 | TGA_ALPHA_BITS[channels]))
+	rows_written = 0
+	for band in bands:
+		bgr = band.copy()
+		bgr[..., 0] = band[..., 2]
+		bgr[..., 2] = band[..., 0]
+		h.write(bgr.tobytes())
+		rows_written += band.shape[0]
+	if rows_written != height:
+		raise ValueError(f"Expected {height} rows, got {rows_written}.")
+
+def write_npy(h, bands, shape):
+	"""
+	Writes an uint8 array in the npy format to the binary file handle `h`.
+	See write_png for `bands` and `shape`.
+	"""
+	numpy.lib.format.write_array_header_1_0(h, {
+		"descr": numpy.lib.format.dtype_to_descr(numpy.dtype(numpy.uint8)),
+		"fortran_order": False, "shape": tuple(shape),
+	})
+	rows_written = 0
+	for band in bands:
+		h.write(numpy.ascontiguousarray(band, dtype = numpy.uint8).data)
+		rows_written += band.shape[0]
+	if rows_written != shape[0]:
+		raise ValueError(f"Expected {shape[0]} rows, got {rows_written}.")
+
+class ImageWriter():
+	"""
+	Writes images as files of one of the OUTPUT_FORMATS:
+		png: Filtered with `png_filter` and compressed with zlib at `png_level`.
+		tga: Uncompressed Truevision TGA.
+		npy: The raw numpy array, readable with numpy.load.
+	"""
+	def __init__(self, format_ = "png", png_level = DEFAULT_PNG_LEVEL, mmap = False,
+			png_filter = DEFAULT_PNG_FILTER):
+		"""
+		format_ : str | One of OUTPUT_FORMATS.
+		png_level : int | Zlib compression level from 0 (none, fastest) to 9
+			(smallest files) to write PNGs with.
+		mmap : bool | Whether to write npy files through a memory map instead
+			of a buffered file.
+		png_filter : str | One of PNG_FILTERS to filter the rows of PNGs with.
+		"""
+		if format_ not in OUTPUT_FORMATS:
+			raise ValueError(f"Unknown output format: {format_!r}")
+		if png_filter not in PNG_FILTERS:
+			raise ValueError(f"Unknown PNG filter: {png_filter!r}")
+		self.format = format_
+		self.png_level = png_level
+		self.mmap = mmap
+		self.png_filter = png_filter
+
+	@property
+	def extension(self):
+		return OUTPUT_FORMATS[self.format]
+
+	def write(self, arr, path):
+		"""
+		Writes the image in the numpy array `arr`, of shape (h, w, 3) or
+		(h, w, 4), to `path`.
+		"""
+		self.write_bands(iter_bands(arr), arr.shape, path)
+
+	def write_bands(self, bands, shape, path):
+		"""
+		Writes an image given as consecutive bands of rows to `path`, as
+		they are produced.
+
+		bands : Iterable[numpy.ndarray[numpy.uint8, ndim = 3]] | Bands of
+			rows of the image, each of shape (n, width, channels).
+		shape : tuple[int, int, int] | Shape of the whole image;
+			(height, width, channels) with 3 or 4 channels.
+		path : str;pathlib.Path | Path of the file to write.
+		The image is written to a temporary file next to `path`, which only
+		replaces it once all bands were written, so a file already at `path`
+		is left intact if producing a band fails.
+		"""
+		path = Path(path)
+		# Not created by tempfile, which would restrict the file's permissions.
+		tmp_path = path.with_name(f".{path.name}.{secrets.token_hex(4)}.tmp")
+		try:
+			self._write_file(bands, shape, tmp_path)
+			os.replace(tmp_path, path)
+		except BaseException:
+			try:
+				os.remove(tmp_path)
+			except OSError:
+				pass
+			raise
+
+	def _write_file(self, bands, shape, path):
+		if self.format == "npy" and self.mmap:
+			out = numpy.lib.format.open_memmap(path, mode = "w+", dtype = numpy.uint8,
+				shape = tuple(shape))
+			try:
+				y = 0
+				for band in bands:
+					out[y:y + band.shape[0]] = band
+					y += band.shape[0]
+				out.flush()
+			finally:
+				# Unmaps the file, so it can be removed or replaced.
+				del out
+			if y != shape[0]:
+				raise ValueError(f"Expected {shape[0]} rows, got {y}.")
+			return
+		with open(path, "xb") as h:
+			if self.format == "npy":
+				write_npy(h, bands, shape)
+			elif self.format == "tga":
+				write_tga(h, bands, shape)
+			else:
+				write_png(h, bands, shape, self.png_level, self.png_filter)
+
+	def __repr__(self):
+		return f"<ImageWriter {self.format!r}>"
@@ -0,0 +1,236 @@
+"""
+Provides the ParameterIndex, an SQLite database of the parameters of every
+material found in a UE Viewer extraction tree, so they can be queried and
+read without parsing the props files again.
+"""
+
+from collections import namedtuple
+import json
+import os
+from pathlib import Path
+import sqlite3
+import threading
+
+from bl2_skingen.props import PARAMETER_VALUE_KEYS, UEParameterList, UEParameterNode, \
+	UnifiedProps, resolve_texture_path, unify_props
+from bl2_skingen.unreal_notation import Parser
+
+INDEX_NAME = ".skingen_index.sqlite"
+INDEX_VERSION = 1
+
+PROPS_GLOB = "**/MaterialInstanceConstant/Mati_*.props.txt"
+PROPS_SUFFIX = ".props.txt"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+	key TEXT PRIMARY KEY,
+	value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS props_files (
+	id INTEGER PRIMARY KEY,
+	path TEXT NOT NULL UNIQUE,
+	package TEXT NOT NULL,
+	part TEXT NOT NULL,
+	mtime_ns INTEGER NOT NULL,
+	size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parameters (
+	file_id INTEGER NOT NULL REFERENCES props_files(id),
+	list TEXT NOT NULL,
+	position INTEGER NOT NULL,
+	name TEXT NOT NULL,
+	value TEXT NOT NULL,
+	info TEXT NOT NULL,
+	texture_path TEXT,
+	PRIMARY KEY (file_id, list, position)
+);
+CREATE INDEX IF NOT EXISTS parameters_name ON parameters(name);
+CREATE INDEX IF NOT EXISTS parameters_texture_path ON parameters(texture_path);
+"""
+
+IndexUpdate = namedtuple("IndexUpdate", ("indexed", "unchanged", "removed", "failed"))
+TextureUser = namedtuple("TextureUser", ("package", "part", "parameter", "texture_path"))
+
+class ParameterIndexError(Exception):
+	"""
+	Raised when a props file can not be indexed.
+	"""
+	pass
+
+def parse_props_file(path):
+	"""
+	Parses the props file at `path` and returns it as UnifiedProps.
+	Raises a ParameterIndexError if that fails.
+	"""
+	with open(path, "r") as h:
+		raw = h.read()
+	try:
+		res = unify_props(Parser(raw, PARAMETER_VALUE_KEYS).parse())
+	except Exception as exc:
+		raise ParameterIndexError(f"{exc.__class__.__name__}: {exc}") from exc
+	for key in ("TexturePV", "ScalarPV", "VectorPV"):
+		if not isinstance(getattr(res, key), UEParameterList):
+			raise ParameterIndexError(f"{key} is not a parameter list.")
+	return res
+
+def _part_name(path):
+	# Mati_<Skin>_<Part>.props.txt
+	return path.name[:-len(PROPS_SUFFIX)].rsplit("_", 1)[-1]
+
+class ParameterIndex():
+	"""
+	Stores the parameters of props files along with the paths of the
+	textures they refer to. Each file is stored with its modification time
+	and size, so changed files are noticed; they are only ever read from
+	the index while those match.
+	The database is only opened once it is first used, so the index can
+	be passed to worker processes. Every thread uses a connection of its own.
+	"""
+	def __init__(self, path):
+		"""
+		path : str;pathlib.Path | Path of the SQLite database. It is created
+			if it does not exist.
+		"""
+		self.path = Path(path)
+		self._local = threading.local()
+
+	def _connection(self):
+		conn = getattr(self._local, "conn", None)
+		if conn is not None:
+			return conn
+		self.path.parent.mkdir(parents = True, exist_ok = True)
+		conn = sqlite3.connect(str(self.path))
+		with conn:
+			conn.executescript(SCHEMA)
+			row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+			if row is None or row[0] != str(INDEX_VERSION):
+				# Written by another version; start over.
+				conn.execute("DELETE FROM parameters")
+				conn.execute("DELETE FROM props_files")
+				conn.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)",
+					(str(INDEX_VERSION),))
+		self._local.conn = conn
+		return conn
+
+	def close(self):
+		"""
+		Closes the calling thread's connection to the database.
+		"""
+		conn = getattr(self._local, "conn", None)
+		if conn is not None:
+			conn.close()
+			self._local.conn = None
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		del state["_local"]
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._local = threading.local()
+
+	def update(self, root, logger = None):
+		"""
+		Indexes all props files below `root`. Files that have not changed
+		since they were last indexed are skipped, files that no longer exist
+		are removed from the index.
+
+		root : str;pathlib.Path | Directory to search for props files.
+		logger : None;logging.Logger | Logger to report files that could not be
+			indexed to.
+
+		Returns: IndexUpdate with the amount of files in each category.
+		"""
+		root = Path(root).absolute()
+		conn = self._connection()
+		known = {path: (file_id, mtime_ns, size) for file_id, path, mtime_ns, size in
+			conn.execute("SELECT id, path, mtime_ns, size FROM props_files")}
+		indexed = unchanged = failed = 0
+		with conn:
+			seen = set()
+			for path in sorted(root.glob(PROPS_GLOB)):
+				key = str(path)
+				seen.add(key)
+				stat = path.stat()
+				if key in known and known[key][1:] == (stat.st_mtime_ns, stat.st_size):
+					unchanged += 1
+					continue
+				if key in known:
+					self._remove(known[key][0])
+				try:
+					props = parse_props_file(path)
+				except (OSError, ParameterIndexError) as exc:
+					if logger is not None:
+						logger.log(30, f"Could not index {path}: {exc}")
+					failed += 1
+					continue
+				self._insert(path, stat, props)
+				indexed += 1
+
+			removed = 0
+			prefix = os.path.join(str(root), "")
+			for key, (file_id, _, _) in known.items():
+				if key.startswith(prefix) and key not in seen:
+					self._remove(file_id)
+					removed += 1
+
+		return IndexUpdate(indexed, unchanged, removed, failed)
+
+	def _remove(self, file_id):
+		conn = self._connection()
+		conn.execute("DELETE FROM parameters WHERE file_id = ?", (file_id,))
+		conn.execute("DELETE FROM props_files WHERE id = ?", (file_id,))
+
+	def _insert(self, path, stat, props):
+		conn = self._connection()
+		package_dir = path.parent.parent
+		file_id = conn.execute(
+			"INSERT INTO props_files (path, package, part, mtime_ns, size) VALUES (?, ?, ?, ?, ?)",
+			(str(path), package_dir.name, _part_name(path), stat.st_mtime_ns, stat.st_size)
+		).lastrowid
+		rows = []
+		for key, param_list in zip(PARAMETER_VALUE_KEYS,
+				(props.TexturePV, props.ScalarPV, props.VectorPV)):
+			for position, node in enumerate(param_list):
+				texture_path = resolve_texture_path(package_dir, node.value)
+				rows.append((file_id, key, position, node.name, json.dumps(node.value),
+					node.info, None if texture_path is None else str(texture_path)))
+		conn.executemany("INSERT INTO parameters VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+	def get_props(self, path):
+		"""
+		Returns the UnifiedProps of the props file at `path` as they were
+		indexed, or None if the file is not indexed or has changed since.
+		As only parameter values are indexed, their `root_elems` is empty.
+		"""
+		path = Path(path).absolute()
+		try:
+			stat = path.stat()
+		except OSError:
+			return None
+		conn = self._connection()
+		row = conn.execute("SELECT id, mtime_ns, size FROM props_files WHERE path = ?",
+			(str(path),)).fetchone()
+		if row is None or row[1:] != (stat.st_mtime_ns, stat.st_size):
+			return None
+		proc_dict = {key: UEParameterList() for key in PARAMETER_VALUE_KEYS}
+		for key, name, value, info in conn.execute("SELECT list, name, value, info "
+				"FROM parameters WHERE file_id = ? ORDER BY list, position", (row[0],)):
+			proc_dict[key].append_node(UEParameterNode(name, json.loads(value), info))
+		return UnifiedProps(proc_dict)
+
+	def find_texture_users(self, pattern):
+		"""
+		Returns a list of TextureUsers; every parameter of an indexed file
+		that refers to a texture whose path matches the SQL LIKE `pattern`.
+		"""
+		conn = self._connection()
+		return [TextureUser(*row) for row in conn.execute(
+			"SELECT props_files.package, props_files.part, parameters.name, "
+			"parameters.texture_path FROM parameters JOIN props_files "
+			"ON parameters.file_id = props_files.id WHERE parameters.texture_path LIKE ? "
+			"ORDER BY props_files.package, props_files.part, parameters.name", (pattern,))]
+
+	def __repr__(self):
+		return f"<ParameterIndex {str(self.path)!r}>"
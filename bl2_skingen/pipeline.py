@@ -0,0 +1,166 @@
+"""
+Provides the Pipeline, which passes items through a sequence of stages
+that each run on a thread of their own and are connected by bounded
+queues, so one item can be read while another is computed and a third
+one is written. Alternatively, it runs every item through all stages on
+a thread of its own.
+"""
+
+import queue
+import threading
+import time
+
+# Marks the end of the items in a queue.
+_DONE = object()
+
+class _Failure():
+	"""
+	Passed down the pipeline in place of an item a stage raised on.
+	"""
+	def __init__(self, exc):
+		self.exc = exc
+
+class Pipeline():
+	"""
+	Runs items through stages on separate threads. Between two stages, at
+	most `queue_size` items wait; a stage that is ahead blocks until the
+	next one catches up, which bounds the memory held by items in flight.
+	The time each stage spent working is summed up in `stage_times`.
+	"""
+	def __init__(self, stages, queue_size = 1):
+		"""
+		stages : Sequence[tuple[str, Callable]] | Name and function of each
+			stage. A function is called with every item the previous stage
+			returned; items it returns None for are dropped.
+		queue_size : int | Amount of items that may wait between two stages.
+		"""
+		self.stages = stages
+		self.queue_size = queue_size
+		self.stage_times = {name: 0.0 for name, _ in stages}
+
+	def run(self, items):
+		"""
+		Passes all `items` through the stages and returns a list of what the
+		last stage returned for them, in order.
+		If a stage raises an exception, the items after the one it was
+		raised for are abandoned; it is reraised once the items before it
+		went through all stages.
+		"""
+		# Index of the earliest stage that failed. Stages before it only
+		# hold items after the one that failed, so they stop working.
+		failed_stage = [None]
+		lock = threading.Lock()
+		queues = [queue.Queue(self.queue_size) for _ in self.stages]
+		threads = []
+		source = iter(items)
+		for idx, (name, func) in enumerate(self.stages):
+			thread = threading.Thread(target = self._work, name = f"pipeline-{name}",
+				args = (idx, func, source, queues[idx], failed_stage, lock), daemon = True)
+			threads.append(thread)
+			source = _drain(queues[idx])
+		for thread in threads:
+			thread.start()
+
+		results = []
+		failure = None
+		for item in source:
+			if isinstance(item, _Failure):
+				failure = item
+			else:
+				results.append(item)
+		for thread in threads:
+			thread.join()
+		if failure is not None:
+			raise failure.exc
+		return results
+
+	def _work(self, idx, func, source, out_queue, failed_stage, lock):
+		name = self.stages[idx][0]
+		def fail(exc):
+			with lock:
+				if failed_stage[0] is None or idx < failed_stage[0]:
+					failed_stage[0] = idx
+			out_queue.put(_Failure(exc))
+
+		failed = False
+		try:
+			for item in source:
+				# Keep draining after a failure, so earlier stages are not blocked.
+				if isinstance(item, _Failure):
+					failed = True
+					out_queue.put(item)
+					continue
+				if failed or (failed_stage[0] is not None and idx < failed_stage[0]):
+					continue
+				start = time.perf_counter()
+				try:
+					res = func(item)
+				except BaseException as exc:
+					failed = True
+					fail(exc)
+					continue
+				finally:
+					self.stage_times[name] += time.perf_counter() - start
+				if res is not None:
+					out_queue.put(res)
+		except BaseException as exc:
+			# Raised by the source of the first stage.
+			fail(exc)
+		out_queue.put(_DONE)
+
+	def run_parallel(self, items, prepare = None):
+		"""
+		Passes each of the `items` through all stages on a thread of its
+		own, so they are processed at the same time instead of one stage
+		after another. Returns a list of what the last stage returned for
+		them, in order.
+		An exception raised for one item does not stop the others; once all
+		are finished, the one raised for the earliest item is reraised.
+
+		prepare : None;Callable | Called with each item on its thread before
+			the stages are.
+		"""
+		items = list(items)
+		results = [None] * len(items)
+		errors = [None] * len(items)
+		lock = threading.Lock()
+		def work(idx, item):
+			try:
+				if prepare is not None:
+					prepare(item)
+				for name, func in self.stages:
+					start = time.perf_counter()
+					try:
+						item = func(item)
+					finally:
+						with lock:
+							self.stage_times[name] += time.perf_counter() - start
+					if item is None:
+						return
+				results[idx] = item
+			except BaseException as exc:
+				errors[idx] = exc
+
+		threads = [threading.Thread(target = work, name = f"pipeline-item-{idx}",
+			args = (idx, item), daemon = True) for idx, item in enumerate(items)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		for exc in errors:
+			if exc is not None:
+				raise exc
+		return [res for res in results if res is not None]
+
+	def format_times(self):
+		"""
+		Returns the time each stage spent working as a string.
+		"""
+		return ", ".join(f"{name} {t:.2f}s" for name, t in self.stage_times.items())
+
+def _drain(in_queue):
+	while True:
+		item = in_queue.get()
+		if item is _DONE:
+			return
+		yield item
@@ -0,0 +1,211 @@
+"""
+Provides the Profiler, which records the wall time, CPU time and peak
+memory of the stages of a skin generator run, such as decoding a part's
+textures or encoding the image, and can write them as a JSON report.
+Embedding code can register hooks to receive every StageRecord as soon
+as its stage is finished.
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+import json
+import logging
+import threading
+import time
+import tracemalloc
+
+# Bumped whenever the layout of the report changes.
+REPORT_VERSION = 1
+
+PROFILER_LOGGER = logging.getLogger(__name__)
+
+StageRecord = namedtuple("StageRecord", ("stage", "part", "wall", "cpu", "peak_memory"))
+StageRecord.__doc__ = """
+Measurements of one stage.
+stage : str | Name of the stage, like "decode".
+part : None;str | Name of the part the stage was run for, None for stages
+	concerning the whole package.
+wall : float | Wall time the stage took, in seconds, not counting stages
+	nested in it.
+cpu : float | CPU time the thread running the stage spent, in seconds, not
+	counting stages nested in it.
+peak_memory : None;int | Most memory allocated through Python and numpy
+	while the stage ran, in bytes above the amount allocated when it
+	started. None if memory is not traced.
+"""
+
+class _OpenStage():
+	def __init__(self, start_memory):
+		self.start_memory = start_memory
+		self.peak = start_memory
+
+def _merge_records(total, record):
+	# Sums up the times of two records, keeping the higher peak memory.
+	peaks = [p for p in (total.peak_memory, record.peak_memory) if p is not None]
+	return total._replace(wall = total.wall + record.wall, cpu = total.cpu + record.cpu,
+		peak_memory = max(peaks) if peaks else None)
+
+class Profiler():
+	"""
+	Records the stages a SkinGenerator it was passed to runs through.
+	Stages may run on several threads at once; the peak memory of each is
+	the peak of the whole process while it ran, so with parts rendered
+	concurrently, it includes the other part's allocations.
+	Stages may be nested on one thread; the time spent in the inner one
+	is only counted towards it and not towards the outer one.
+	"""
+	def __init__(self, trace_memory = True):
+		"""
+		trace_memory : bool | Whether to measure peak memory with tracemalloc,
+			which slows down allocations somewhat. Tracing is started if it
+			is not running already and stopped again by `close`. Needs
+			tracemalloc.reset_peak, which Python 3.8 lacks; memory is not
+			traced there.
+		"""
+		self.records = []
+		self._hooks = []
+		self._lock = threading.Lock()
+		self._open = []
+		# Per thread: "nested", a list of [wall, cpu] spent in the stages
+		# nested in each open stage, and "merging", see `merged`.
+		self._local = threading.local()
+		if trace_memory and not hasattr(tracemalloc, "reset_peak"):
+			PROFILER_LOGGER.log(30, "tracemalloc.reset_peak is not available before "
+				"Python 3.9, peak memory will not be measured.")
+			trace_memory = False
+		self._started_tracing = trace_memory and not tracemalloc.is_tracing()
+		if self._started_tracing:
+			tracemalloc.start()
+		self.trace_memory = trace_memory
+
+	def add_hook(self, hook):
+		"""
+		Registers `hook` to be called with the StageRecord of every stage
+		finished from now on. Hooks are called on the thread that ran the
+		stage and must not raise.
+		"""
+		self._hooks.append(hook)
+
+	def _sample(self):
+		# Folds the process-wide peak since the last sample into every open
+		# stage, then starts a new sampling interval.
+		current, peak = tracemalloc.get_traced_memory()
+		for open_stage in self._open:
+			open_stage.peak = max(open_stage.peak, peak)
+		tracemalloc.reset_peak()
+		return current
+
+	@contextmanager
+	def stage(self, name, part = None):
+		"""
+		Context manager measuring the code run in it as the stage `name` of
+		the part `part`. The stage is recorded even if an exception is
+		raised in it.
+		"""
+		open_stage = None
+		if self.trace_memory and tracemalloc.is_tracing():
+			with self._lock:
+				open_stage = _OpenStage(self._sample())
+				self._open.append(open_stage)
+		nested = getattr(self._local, "nested", None)
+		if nested is None:
+			nested = self._local.nested = []
+		nested.append([0.0, 0.0])
+		start_wall = time.perf_counter()
+		start_cpu = time.thread_time()
+		try:
+			yield
+		finally:
+			wall = time.perf_counter() - start_wall
+			cpu = time.thread_time() - start_cpu
+			nested_wall, nested_cpu = nested.pop()
+			if nested:
+				nested[-1][0] += wall
+				nested[-1][1] += cpu
+			peak_memory = None
+			if open_stage is not None:
+				with self._lock:
+					self._sample()
+					self._open.remove(open_stage)
+				peak_memory = open_stage.peak - open_stage.start_memory
+			record = StageRecord(name, part, wall - nested_wall, cpu - nested_cpu,
+				peak_memory)
+			merging = getattr(self._local, "merging", None)
+			if merging is None:
+				self._record(record)
+			else:
+				key = (name, part)
+				merging[key] = record if key not in merging else \
+					_merge_records(merging[key], record)
+
+	@contextmanager
+	def merged(self):
+		"""
+		Context manager merging the stages finished on the current thread
+		while in it: Once it is left, every stage of a part is recorded only
+		once, with the times of all its runs summed up and the highest peak
+		memory among them. Meant for stages run once for each of many small
+		pieces of work, such as the bands of an image.
+		"""
+		if getattr(self._local, "merging", None) is not None:
+			yield
+			return
+		self._local.merging = merging = {}
+		try:
+			yield
+		finally:
+			self._local.merging = None
+			for record in merging.values():
+				self._record(record)
+
+	def _record(self, record):
+		with self._lock:
+			self.records.append(record)
+		for hook in self._hooks:
+			hook(record)
+
+	def totals(self):
+		"""
+		Returns a dict mapping the name of every recorded stage to a
+		StageRecord summing up its wall and CPU time over all parts, with
+		the highest peak memory among them.
+		"""
+		res = {}
+		for record in self.records:
+			total = res.get(record.stage)
+			if total is None:
+				res[record.stage] = record._replace(part = None)
+				continue
+			res[record.stage] = _merge_records(total, record)
+		return res
+
+	def to_dict(self):
+		"""
+		Returns the recorded stages and their totals as a dict that can be
+		serialized as JSON.
+		"""
+		return {
+			"version": REPORT_VERSION,
+			"stages": [record._asdict() for record in self.records],
+			"totals": {name: {k: v for k, v in record._asdict().items()
+					if k not in ("stage", "part")}
+				for name, record in self.totals().items()},
+		}
+
+	def write_json(self, path, **extra):
+		"""
+		Writes the report returned by `to_dict` to `path`, adding the
+		keyword arguments as additional entries.
+		"""
+		report = self.to_dict()
+		report.update(extra)
+		with open(path, "w") as h:
+			json.dump(report, h, indent = "\t")
+
+	def close(self):
+		"""
+		Stops tracing memory if this profiler started it.
+		"""
+		if self._started_tracing:
+			tracemalloc.stop()
+			self._started_tracing = False
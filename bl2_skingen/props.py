@@ -2,6 +2,31 @@
 Module for processing and unifying the props files.
 """
 
+from pathlib import Path
+import re
+
+# Top-level keys of a props file holding the material's parameters
+PARAMETER_VALUE_KEYS = ("TextureParameterValues", "ScalarParameterValues",
+	"VectorParameterValues")
+
+TEXTURE_FILE = "Texture2D/{}.tga"
+UE_TEX_SEP = "."
+RE_TEXTURE_UE_INTERNAL_PATH = re.compile(r"Texture2D'(.*)'") # NOTE: MAYBE \' IS ESC SEQUENCE
+
+def resolve_texture_path(package_dir, value):
+	"""
+	Resolves the value of a texture parameter, such as
+	"Texture2D'GD_Foo.Textures.Bar'", to the path UE Viewer extracts the
+	texture to in `package_dir`. Returns None if the value does not refer
+	to a texture. The path is not checked for existence.
+	"""
+	if not isinstance(value, str):
+		return None
+	match = RE_TEXTURE_UE_INTERNAL_PATH.search(value)
+	if match is None:
+		return None
+	return Path(package_dir, TEXTURE_FILE.format(match[1].split(UE_TEX_SEP)[-1]))
+
 class SkippedNonNodelikeWarning(Warning):
 	pass
 
@@ -20,56 +45,57 @@ class UnifiedProps():
 		self.ScalarPV = proc_dict["ScalarParameterValues"]
 		self.VectorPV = proc_dict["VectorParameterValues"]
 		self.root_elems = \
-			{k: v for k ,v in proc_dict.items() if not k in (
-				"TextureParameterValues", "ScalarParameterValues",
-				"VectorParameterValues"
-			)}
+			{k: v for k ,v in proc_dict.items() if not k in PARAMETER_VALUE_KEYS}
 
 class UEParameterList():
 	"""
 	Makes Nodes easily accessible via a list-like structure.
+	Nodes are indexed by their name, which makes looking them up by it
+	constant-time. Iteration follows insertion order.
 	"""
 	def __init__(self):
-		self.node_list = []
+		self.nodes = {}
+
+	@property
+	def node_list(self):
+		return list(self.nodes.values())
 
 	def append_node(self, node):
 		if not isinstance(node, UEParameterNode):
 			raise TypeError("Not a node.")
-		if node.name in self:
+		if node.name in self.nodes:
 			raise ValueError("Node name {} already in list.".format(node.name))
-		self.node_list.append(node)
+		self.nodes[node.name] = node
 
 	def pop_node(self, idx):
-		self.node_list.pop(idx)
+		self.remove_node(self.node_list[idx].name)
 
 	def get_node(self, name):
 		"""
 		Returns a node by its name.
 		"""
-		for i in self:
-			if i.name == name:
-				return i
-		raise ValueError("Node {} not present in list.".format(name))
+		try:
+			return self.nodes[name]
+		except KeyError:
+			raise ValueError("Node {} not present in list.".format(name)) from None
 
 	def remove_node(self, name):
 		"""
 		Removes a node by its name.
 		"""
-		for i, j in enumerate(self):
-			if name == j.name:
-				self.node_list.pop(i)
-				break
-		else:
-			raise ValueError("Node {} not present in list.".format(name))
+		try:
+			del self.nodes[name]
+		except KeyError:
+			raise ValueError("Node {} not present in list.".format(name)) from None
 
 	def __contains__(self, name):
-		for i in self:
-			if name == i.name:
-				return True
-		return False
+		return name in self.nodes
 
 	def __iter__(self):
-		return iter(self.node_list)
+		return iter(self.nodes.values())
+
+	def __len__(self):
+		return len(self.nodes)
 
 
 class UEParameterNode():
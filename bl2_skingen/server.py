@@ -0,0 +1,401 @@
+"""
+Implements the serve subcommand, which keeps a pool of worker processes
+with the imaging backend loaded and renders packages on request, so tools
+triggering many single renders do not pay for starting up every time.
+
+Requests are made over HTTP, either on a localhost port or a Unix socket:
+	POST /render: Renders the package described by the JSON object in the
+		request body:
+			package   : Package directory to render. Required.
+			parts     : List of parts to render, "body" and/or "head".
+			decalspec : Decalspec to place decals by.
+			out       : Directory to save generated files to.
+			outname   : Name of the output files, see the -outname option.
+			format    : One of OUTPUT_FORMATS to save the output files in.
+			preview   : Width to render a preview at, see the -preview option.
+			flags     : List of additional FLAGS names out of KEEP_WHITE,
+			            NO_DECAL, COLOR_LUT, MULTIPASS and FORCE.
+		Omitted values default to the options the server was started with.
+		The job's progress is streamed back as one JSON object per line, the
+		last of which has a "status" of "done" or "failed".
+	GET /stats: Returns the queue depth, the amount of finished jobs and
+		their latencies as a JSON object.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+
+from bl2_skingen.argparser import get_serve_argparser
+from bl2_skingen.backends import get_backend
+from bl2_skingen.batch import BatchResult, render_package
+from bl2_skingen.decalspec import validate_decalspec
+from bl2_skingen.flags import FLAGS
+from bl2_skingen.manifest import Manifest
+from bl2_skingen.output import OUTPUT_FORMATS, ImageWriter
+from bl2_skingen.skingen import SKINGEN_LOGGER, check_out_fmt, get_image_writer, \
+	get_parameter_index, get_texture_cache, process_common_args, save_manifest
+
+# Amount of most recent jobs the latency statistics are computed over.
+LATENCY_WINDOW = 1000
+
+PART_EXCLUDE_FLAGS = {"body": FLAGS.EXCLUDE_BODY, "head": FLAGS.EXCLUDE_HEAD}
+# FLAGS a job may set; those changing the rendered image, as in
+# bl2_skingen.api.render_skin, and FORCE. The others concern the daemon as a
+# whole and are fixed when starting it.
+JOB_FLAGS = {name: getattr(FLAGS, name)
+	for name in ("KEEP_WHITE", "NO_DECAL", "COLOR_LUT", "MULTIPASS", "FORCE")}
+
+class JobError(Exception):
+	"""
+	Raised when a render job's description is invalid.
+	"""
+	pass
+
+def _init_worker(backend):
+	# Interrupts reach the whole process group; the server shuts workers down.
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+	# Load the backend's extension modules before the first job arrives.
+	get_backend(backend)
+
+def _warm_up():
+	return os.getpid()
+
+def _nearest_rank(values, fraction):
+	# Smallest of the sorted `values` that at least `fraction` of them are not above.
+	return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+def _summarize(values):
+	if not values:
+		return None
+	values = sorted(values)
+	return {
+		"mean": sum(values) / len(values),
+		"p50": _nearest_rank(values, 0.5),
+		"p95": _nearest_rank(values, 0.95),
+		"max": values[-1],
+	}
+
+class ServerStats():
+	"""
+	Counts queued, running and finished jobs and keeps the latencies of the
+	most recent ones. Safe to use from multiple threads.
+	"""
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.start = time.time()
+		self.queued = 0
+		self.running = 0
+		self.completed = 0
+		self.failed = 0
+		self.latencies = deque(maxlen = LATENCY_WINDOW)
+
+	def job_queued(self):
+		with self._lock:
+			self.queued += 1
+			return self.queued
+
+	def job_started(self):
+		with self._lock:
+			self.queued -= 1
+			self.running += 1
+
+	def job_finished(self, success, wait, render, total):
+		with self._lock:
+			self.running -= 1
+			if success:
+				self.completed += 1
+			else:
+				self.failed += 1
+			self.latencies.append((wait, render, total))
+
+	def snapshot(self):
+		"""
+		Returns the statistics as a json-serializable dict.
+		"""
+		with self._lock:
+			latencies = list(self.latencies)
+			return {
+				"queue_depth": self.queued,
+				"running": self.running,
+				"completed": self.completed,
+				"failed": self.failed,
+				"uptime": time.time() - self.start,
+				"latency": {name: _summarize([lat[i] for lat in latencies])
+					for i, name in enumerate(("wait", "render", "total"))},
+			}
+
+class RenderService():
+	"""
+	Renders jobs on a pool of warm worker processes, at most one per
+	worker at a time; jobs exceeding that wait in a queue.
+	"""
+	def __init__(self, options, jobs, logger):
+		"""
+		options : dict | Default keyword arguments for the SkinGenerator,
+			except for `logger`, `in_dir` and `manifest`.
+		jobs : int | Amount of worker processes.
+		logger : logging.Logger | Logger to report jobs to.
+		"""
+		self.options = options
+		self.jobs = jobs
+		self.logger = logger
+		self.stats = ServerStats()
+		self._slots = threading.Semaphore(jobs)
+		self._executor_lock = threading.Lock()
+		self._manifest_lock = threading.Lock()
+		self._executor = self._start_executor()
+
+	def _start_executor(self):
+		executor = ProcessPoolExecutor(max_workers = self.jobs, initializer = _init_worker,
+			initargs = (self.options["backend"],))
+		# Start all workers now instead of once jobs arrive.
+		pids = {future.result() for future in
+			[executor.submit(_warm_up) for _ in range(self.jobs)]}
+		self.logger.log(22, f"Started {len(pids)} worker process(es).")
+		return executor
+
+	def close(self):
+		with self._executor_lock:
+			self._executor.shutdown()
+
+	def build_options(self, job):
+		"""
+		Returns the package directory and the SkinGenerator options for the
+		job described by the dict `job`. Raises a JobError if it is invalid.
+		"""
+		if not isinstance(job, dict):
+			raise JobError("Job must be a JSON object.")
+		package = job.get("package")
+		if not isinstance(package, str) or not package:
+			raise JobError("Job needs a \"package\" directory.")
+		options = self.options.copy()
+
+		flag = options["flag"]
+		flags = job.get("flags", [])
+		if not isinstance(flags, list):
+			raise JobError("\"flags\" must be a list of flag names.")
+		for name in flags:
+			if not isinstance(name, str) or name not in JOB_FLAGS:
+				raise JobError(f"Unknown flag: {name!r}; jobs may set "
+					f"{', '.join(JOB_FLAGS)}.")
+			flag |= JOB_FLAGS[name]
+		if "parts" in job:
+			parts = job["parts"]
+			if not isinstance(parts, list) or not parts or any(
+					not isinstance(part, str) or part not in PART_EXCLUDE_FLAGS
+					for part in parts):
+				raise JobError("\"parts\" must be a list of \"body\" and/or \"head\".")
+			for part, exclude in PART_EXCLUDE_FLAGS.items():
+				flag = (flag & ~exclude) if part in parts else (flag | exclude)
+		options["flag"] = flag | FLAGS.NO_ASK
+
+		if "decalspec" in job:
+			if not isinstance(job["decalspec"], str) or \
+					not validate_decalspec(job["decalspec"]):
+				raise JobError(f"Bad decalspec: {job['decalspec']!r}")
+			options["decalspec"] = job["decalspec"]
+		if "outname" in job:
+			if not isinstance(job["outname"], str):
+				raise JobError("\"outname\" must be a string.")
+			out_fmt_error = check_out_fmt(job["outname"], options["mips"])
+			if out_fmt_error is not None:
+				raise JobError(out_fmt_error)
+			options["out_fmt"] = job["outname"]
+		if "format" in job:
+			if not isinstance(job["format"], str) or job["format"] not in OUTPUT_FORMATS:
+				raise JobError(f"Unknown format: {job['format']!r}")
+			writer = options["writer"]
+			options["writer"] = ImageWriter(job["format"], writer.png_level, writer.mmap,
+				writer.png_filter)
+		if "preview" in job:
+			preview = job["preview"]
+			if preview is not None and (type(preview) is not int or preview < 1):
+				raise JobError("\"preview\" must be a positive width or null.")
+			options["preview"] = preview
+		if "out" in job:
+			if not isinstance(job["out"], str) or not job["out"]:
+				raise JobError("\"out\" must be a directory.")
+			options["out_dir"] = job["out"]
+		options["manifest"] = Manifest.load(options["out_dir"])
+		return package, options
+
+	def render(self, package, options, emit):
+		"""
+		Queues a job, waits for a worker to render it and returns the
+		final status as a dict. Progress is passed to `emit` as dicts.
+		"""
+		queued_at = time.perf_counter()
+		emit({"status": "queued", "package": package,
+			"queue_depth": self.stats.job_queued()})
+		with self._slots:
+			self.stats.job_started()
+			started_at = time.perf_counter()
+			emit({"status": "started", "wait": started_at - queued_at})
+			res = self._run(package, options)
+			if res.manifest_changes:
+				with self._manifest_lock:
+					manifest = Manifest.load(options["out_dir"])
+					for name, part_fingerprint in res.manifest_changes.items():
+						manifest.record(name, part_fingerprint)
+					save_manifest(manifest, self.logger)
+		finished_at = time.perf_counter()
+		status = {
+			"status": "done" if res.success else "failed",
+			"package": package,
+			"message": res.message,
+			"skipped": res.skipped,
+			"wait": started_at - queued_at,
+			"render": res.duration,
+			"total": finished_at - queued_at,
+			"stages": res.stage_times,
+		}
+		self.stats.job_finished(res.success, status["wait"], status["render"],
+			status["total"])
+		if res.success:
+			self.logger.log(25, f"Done ({status['total']:.2f}s): {package}")
+		else:
+			self.logger.log(40, f"Failed ({status['total']:.2f}s): {package}: {res.message}")
+		return status
+
+	def _run(self, package, options):
+		with self._executor_lock:
+			executor = self._executor
+		try:
+			return executor.submit(render_package, package, options).result()
+		except BrokenProcessPool:
+			# A worker died; replace the pool for the jobs still to come.
+			with self._executor_lock:
+				if self._executor is executor:
+					self.logger.log(40, "A worker process died, restarting workers.")
+					self._executor = self._start_executor()
+			return BatchResult(package, False, "Worker process died while rendering.", 0.0,
+				0, {}, {})
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+	"""
+	Hands requests to the server's RenderService.
+	"""
+	def do_GET(self):
+		if self.path != "/stats":
+			self._send_json(404, {"status": "error", "message": "Not found."})
+			return
+		self._send_json(200, self.server.service.stats.snapshot())
+
+	def do_POST(self):
+		if self.path != "/render":
+			self._send_json(404, {"status": "error", "message": "Not found."})
+			return
+		try:
+			length = int(self.headers.get("Content-Length", 0))
+			job = json.loads(self.rfile.read(length).decode("utf-8"))
+			package, options = self.server.service.build_options(job)
+		except (ValueError, JobError) as exc:
+			self._send_json(400, {"status": "error", "message": str(exc)})
+			return
+
+		self.send_response(200)
+		self.send_header("Content-Type", "application/x-ndjson")
+		self.end_headers()
+		connected = True
+		def emit(status):
+			nonlocal connected
+			if not connected:
+				return
+			try:
+				self.wfile.write(json.dumps(status).encode("utf-8") + b"\n")
+				self.wfile.flush()
+			except OSError:
+				# The job is still finished and counted if the client left.
+				connected = False
+		emit(self.server.service.render(package, options, emit))
+
+	def _send_json(self, code, obj):
+		body = json.dumps(obj).encode("utf-8")
+		self.send_response(code)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def address_string(self):
+		# Unix socket clients have no address.
+		if isinstance(self.client_address, tuple):
+			return self.client_address[0]
+		return "local"
+
+	def log_message(self, format, *args):
+		SKINGEN_LOGGER.log(19, f"{self.address_string()}: {format % args}")
+
+class RenderHTTPServer(ThreadingHTTPServer):
+	daemon_threads = True
+
+if hasattr(socketserver, "UnixStreamServer"):
+	class RenderUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+		daemon_threads = True
+else:
+	RenderUnixServer = None
+
+def make_server(service, host, port, socket_path):
+	"""
+	Returns a server handing requests to `service`, listening on the Unix
+	socket `socket_path` if it is not None, else on `host`:`port`.
+	"""
+	if socket_path is not None:
+		if RenderUnixServer is None:
+			raise OSError("Unix sockets are not supported on this platform.")
+		if os.path.exists(socket_path):
+			os.remove(socket_path)
+		server = RenderUnixServer(socket_path, RenderRequestHandler)
+	else:
+		server = RenderHTTPServer((host, port), RenderRequestHandler)
+	server.service = service
+	return server
+
+def main(argv):
+	argparser = get_serve_argparser()
+	args = argparser.parse_args(argv)
+	# Workers can not ask anything on stdin.
+	flag = process_common_args(args) | FLAGS.NO_ASK
+	if args.jobs > 1:
+		# Jobs already run side by side on the workers.
+		flag |= FLAGS.SEQUENTIAL_PARTS
+	silence = args.silence - (((flag & FLAGS.DEBUG) // FLAGS.DEBUG) * 2)
+	SKINGEN_LOGGER.setLevel(21 + (min(silence, 3) * 3))
+
+	options = {
+		"out_dir": args.out, "out_fmt": args.out_fmt, "silence": silence,
+		"flag": flag, "decalspec": args.decalspec, "backend": args.backend,
+		"threads": args.threads, "mask_filter": args.mask_filter,
+		"cache": get_texture_cache(args, flag), "index": get_parameter_index(args),
+		"writer": get_image_writer(args),
+		"mips": args.mips, "preview": args.preview, "band": args.band,
+	}
+	service = RenderService(options, max(args.jobs, 1), SKINGEN_LOGGER)
+	try:
+		server = make_server(service, args.host, args.port, args.socket)
+	except OSError as exc:
+		service.close()
+		SKINGEN_LOGGER.log(50, f"Unable to listen: {exc}")
+		sys.exit(1)
+
+	where = args.socket if args.socket is not None else f"http://{args.host}:{args.port}"
+	SKINGEN_LOGGER.log(25, f"Listening on {where} with {service.jobs} worker(s).")
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		SKINGEN_LOGGER.log(25, "Shutting down.")
+	finally:
+		server.server_close()
+		service.close()
+		if args.socket is not None and os.path.exists(args.socket):
+			os.remove(args.socket)
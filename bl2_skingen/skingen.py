@@ -10,6 +10,12 @@ import logging
 from pprint import pprint
 import argparse
 import datetime
+import importlib
+import sqlite3
+import string
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from math import log2
 
 import numpy # gotta get that sweet C array
@@ -17,17 +23,31 @@ from PIL import Image, ImageFilter, ImageDraw
 
 from bl2_skingen.unreal_notation import Parser as UParser
 from bl2_skingen.unreal_notation import UnrealNotationParseError
-from bl2_skingen.log_formatter import SkingenLogFormatter
+from bl2_skingen.log_formatter import PrefixLoggerAdapter, SkingenLogFormatter
 from bl2_skingen.argparser import get_argparser
-from bl2_skingen.decalspec import parse_decalspec, validate_decalspec
-from bl2_skingen.props import unify_props
+from bl2_skingen.decalspec import parse_decalspec, read_decalspec_file, scale_decalspec, \
+	validate_decalspec
+from bl2_skingen.props import PARAMETER_VALUE_KEYS, resolve_texture_path, unify_props
 from bl2_skingen.flags import FLAGS
-from bl2_skingen.imaging.apply_decal import apply_decal
-from bl2_skingen.imaging.multiply_sqrt import multiply
-from bl2_skingen.imaging.blend_inplace import blend_inplace
-from bl2_skingen.imaging.ue_color_diff import ue_color_diff
+from bl2_skingen.backends import MASK_FILTERS, get_backend
+from bl2_skingen.texture_cache import TextureCache
+from bl2_skingen.manifest import Manifest, file_digest, fingerprint
+from bl2_skingen.param_index import ParameterIndex
+from bl2_skingen.output import ImageWriter, halve, iter_bands, iter_mips
+from bl2_skingen.pipeline import Pipeline
+from bl2_skingen.profiler import Profiler
+from bl2_skingen.texture_rows import TextureRows
 
 __author__ = "Square789"
+__version__ = "1.4.0"
+
+# Maps the first command line argument to the module whose main function
+# takes over the remaining arguments.
+SUBCOMMANDS = {
+	"batch": "bl2_skingen.batch",
+	"index": "bl2_skingen.index",
+	"serve": "bl2_skingen.server",
+}
 
 BAD_PATH_CHARS = (os.path.sep, "\\", "/", "..", ":", "*", ">", "<", "|")
 
@@ -43,12 +63,9 @@ SKINGEN_LOGGER.addHandler(log_hdlr)
 
 CLASSES = ("Assassin", "Mechro", "Mercenary", "Soldier", "Siren", "Psycho")
 
-PROPSFILE = "MaterialInstanceConstant\\Mati_{}_{}.props.txt"
+PROPSFILE = "MaterialInstanceConstant/Mati_{}_{}.props.txt"
 
-TEXTURE_FILE = "Texture2D\\{}.tga"
-UE_TEX_SEP = "."
-RE_TEXTURE_UE_INTERNAL_PATH = re.compile(r"Texture2D'(.*)'") # NOTE: MAYBE \' IS ESC SEQUENCE
-RE_DEFINES_CHNL_COL = re.compile(r"p_([ABC])Color(.*)$")
+RE_DEFINES_CHNL_COL = re.compile(r"p_([ABC])Color(.*)$") # Suffix matched case-insensitively
 MAP_TEX_PARAM_NAME_TO_PART_ATTR = {"p_Normal": "nrm", "p_Diffuse": "dif", "p_Masks": "msk"}
 
 MAP_COLOR_TO_IDX = {"A": 0, "B": 1, "C": 2}
@@ -66,8 +83,49 @@ DEF_DECALSPEC = {
 	"Psycho":    {"head": "0 0 0 1", "body": "211 785 0 0.6953125"},
 }
 
+# Flags that change the generated image. Other flags do not invalidate
+# previously generated files.
+FINGERPRINT_FLAGS = FLAGS.KEEP_WHITE | FLAGS.NO_DECAL
+
 logging.getLogger().setLevel(0) # this magically works, whoop-de-doo
 
+class SkinGenerationError(Exception):
+	"""
+	Raised by the SkinGenerator when a package can not be processed.
+	The message is meant to be shown to the user.
+	"""
+	pass
+
+class PackageError(SkinGenerationError):
+	"""
+	Raised when the package directory is not laid out as expected.
+	"""
+	pass
+
+class PropsError(SkinGenerationError):
+	"""
+	Raised when a props file can not be parsed or lacks information.
+	"""
+	pass
+
+class TextureError(SkinGenerationError):
+	"""
+	Raised when a texture is missing or can not be used.
+	"""
+	pass
+
+class BackendError(SkinGenerationError):
+	"""
+	Raised when the imaging backend can not be loaded.
+	"""
+	pass
+
+class OptionError(SkinGenerationError, ValueError):
+	"""
+	Raised when an option passed to the SkinGenerator has an invalid value.
+	"""
+	pass
+
 class Bodypart():
 	"""
 	Small namespace for different files of Head/Body.
@@ -82,6 +140,18 @@ class Bodypart():
 	dif = None
 	msk = None
 	nrm = None
+	scale = 1.0 # Size of the rendered image relative to the textures'
+	# Carried between the stages of SkinGenerator.run's pipeline
+	decalpath = None
+	part_fingerprint = None
+	mask_arr = None
+	dif_arr = None
+	final_arr = None
+	# Used instead of the arrays when rendering band by band
+	mask_rows = None
+	dif_rows = None
+	final_bands = None
+	final_shape = None
 
 	def __init__(self, name):
 		self.name = name
@@ -99,63 +169,270 @@ class Bodypart():
 
 class SkinGenerator():
 	"""Main Program class that takes control of the command line."""
-	body = Bodypart("Body")
-	head = Bodypart("Head")
 	skin_name = None
 	skin_type = None
 
-	def __init__(self, logger, in_dir, out_dir, out_fmt, silence, flag, decalspec = None):
+	def __init__(self, logger, in_dir, out_dir = None, out_fmt = None, silence = None, flag = 0,
+			decalspec = None, backend = None, threads = 1, mask_filter = "bilinear", cache = None,
+			manifest = None, index = None, writer = None, mips = 0, preview = None,
+			profiler = None, band = None):
 		"""
 		logger: Logger to be used by the skingenerator.
 		in_dir: Input directory to be read from.
-		out_dir: Directory result files should be written to.
-		out_fmt: Format string to name the output files after.
-		silence: Integer to change the logger's sensitivity.
+		out_dir: Directory result files should be written to. Only needed by run.
+		out_fmt: Format string to name the output files after. Only needed by run.
+		silence: Integer to change the logger's sensitivity. None to leave the
+			logger's level as it is.
 		flag: Flagnumber.
 		decalspec: None or an acceptable decalspec string.
+		backend: Name of the imaging backend to use, None to pick the fastest
+			available one.
+		threads: Amount of threads the imaging kernels split an image's rows
+			across.
+		mask_filter: Name of the filter to stretch the mask texture's halves
+			with; one of bl2_skingen.backends.MASK_FILTERS.
+		cache: TextureCache to keep decoded textures in, None to decode
+			them on every run.
+		manifest: Manifest of the output directory. Parts whose inputs have
+			not changed since they were last generated are skipped and newly
+			generated ones are recorded in it. None to always generate all parts.
+		index: ParameterIndex to read the parameters of unchanged props files
+			from, None to always parse them.
+		writer: ImageWriter to save generated images with, None to save them
+			as PNGs with default compression.
+		mips: Amount of mipmap levels to save below each generated image, each
+			half the size of the one before. Needs out_fmt to contain {size}.
+		preview: None, or the width in pixels to render a preview at. The
+			textures are halved until they are at most as wide, the decalspec
+			is scaled to match. Previews are saved with "_preview" appended to
+			their name and neither skipped nor recorded by the manifest.
+		profiler: bl2_skingen.profiler.Profiler to record the time and memory
+			every stage of generating the images takes with. None to not
+			record them.
+		band: None, or the amount of rows to render and save images in at a
+			time, reading only the rows of the textures each band needs. Rounded
+			up to an even amount. Ignored for previews and with FLAGS.MULTIPASS.
 		"""
-		self.in_dir = Path(in_dir)
-		self.out_dir = Path(out_dir)
-		self.in_dir = self.in_dir.absolute()
-		self.out_dir = self.out_dir.absolute()
+		self.in_dir = Path(in_dir).absolute()
+		self.out_dir = None if out_dir is None else Path(out_dir).absolute()
 		self.flag = flag
 		self.out_fmt = out_fmt
 		self.decalspec = decalspec
+		self.threads = threads
+		if mask_filter not in MASK_FILTERS:
+			raise OptionError(f"Unknown mask filter: {mask_filter!r}, expected one of "
+				f"{', '.join(MASK_FILTERS)}")
+		self.mask_filter = MASK_FILTERS.index(mask_filter)
+		self.cache = cache
+		self.manifest = manifest if preview is None else None
+		self.index = index
+		self.writer = ImageWriter() if writer is None else writer
+		self.mips = mips
+		self.preview = preview
+		self.profiler = profiler
+		self.band = None if band is None else band + (band & 1)
+		self.skipped_parts = 0
+		self.stage_times = {}
+		self.body = Bodypart("Body")
+		self.head = Bodypart("Head")
 
-		self.logger = logger
-		self.logger.setLevel(21 + (min(silence, 3) * 3))
+		self._logger = logger
+		# Parts rendered on threads of their own log through a prefixed logger.
+		self._local = threading.local()
+		# Held while asking the user something, so the parts' threads never
+		# ask at the same time.
+		self._ask_lock = threading.Lock()
+		if silence is not None:
+			self._logger.setLevel(21 + (min(silence, 3) * 3))
 
 		for i in CLASSES:
 			if i in self.in_dir.stem:
 				self.class_ = i
 				break
 		else:
-			self.logger.log(50, f"Unable to find class in path name: {self.in_dir.stem}")
-			sys.exit()
+			raise PackageError(f"Unable to find class in path name: {self.in_dir.stem}")
 		try:
 			tmp = self.in_dir.stem.split("_")
 			self.skin_name = tmp[3]
 			self.skin_type = tmp[2]
 		except IndexError:
-			self.logger.log(50, "Path not conforming to expected format.")
-			sys.exit()
+			raise PackageError("Path not conforming to expected format.")
+
+		try:
+			self.backend = get_backend(backend)
+		except KeyError:
+			raise BackendError(f"Unknown backend: {backend!r}") from None
+		except ImportError as exc:
+			raise BackendError(f"Unable to load imaging backend: {exc}") from exc
 
 	def run(self):
 		"""Do the thing."""
 		self.logger.log(22, f"Input directory: {self.in_dir}")
 		self.logger.log(22, f"Output directory: {self.out_dir}")
+		self._prepare()
+		parts = [part for part, exclude in ((self.body, FLAGS.EXCLUDE_BODY),
+			(self.head, FLAGS.EXCLUDE_HEAD)) if not (self.flag & exclude)]
+		pipeline = Pipeline((
+			("read", self._read_part),
+			("render", self._render_read_part),
+			("write", self._write_part),
+		))
+		start = time.perf_counter()
+		try:
+			if len(parts) > 1 and not (self.flag & FLAGS.SEQUENTIAL_PARTS):
+				# The parts share nothing from here on, so each is rendered on
+				# a thread of its own; the kernels release the GIL.
+				pipeline.run_parallel(parts, self._set_part_logger)
+			else:
+				# The next part's textures are decoded while the current one
+				# renders and the previous one is saved.
+				pipeline.run(parts)
+		finally:
+			self.stage_times = pipeline.stage_times
+			self.logger.log(22, f"Finished in {time.perf_counter() - start:.2f}s; time spent "
+				f"per stage: {pipeline.format_times()}")
+
+	def sweep(self, decalspecs, jobs = 1):
+		"""
+		Renders every part once for each of the `decalspecs` and saves the
+		images with the decalspec's number as {variant} in their name.
+		The textures are decoded and the image without its decal is rendered
+		once per part; each decalspec then only renders the region its
+		decal covers again.
+
+		decalspecs : Sequence[str] | Decalspecs to render.
+		jobs : int | Amount of decalspecs to render at the same time.
+		"""
+		self.logger.log(22, f"Input directory: {self.in_dir}")
+		self.logger.log(22, f"Output directory: {self.out_dir}")
+		self._prepare()
+		parts = [part for part, exclude in ((self.body, FLAGS.EXCLUDE_BODY),
+			(self.head, FLAGS.EXCLUDE_HEAD)) if not (self.flag & exclude)]
+		variants = [str(i).zfill(len(str(len(decalspecs))))
+			for i in range(1, len(decalspecs) + 1)]
+		start = time.perf_counter()
+		with ThreadPoolExecutor(jobs) as executor:
+			for part in parts:
+				self.logger.log(25, f"===Sweeping {len(decalspecs)} decalspecs over "
+					f"{part.lwr}===")
+				dif_img, msk_img = self._open_textures(part)
+				self._fill_part_attrs(part)
+				decalpath = self._seek_decal(part)
+				if decalpath is None:
+					self.logger.log(30, f"No decal to place on {part.lwr}, skipping it.")
+					continue
+				mask_arr, dif_img_arr = self._decode_textures(part, dif_img, msk_img)
+				hard_mask_arr, soft_mask_arr = self._split_mask(part, mask_arr)
+				overlay_arr = self._render_overlay(part, hard_mask_arr, soft_mask_arr)
+				self.logger.log(25, f"Merging overlay and base image...")
+				with self._profile("multiply", part):
+					base_arr = self.backend.multiply(overlay_arr, dif_img_arr,
+						threads = self.threads)
+				# Raise the first exception once all variants are done.
+				futures = [executor.submit(self._sweep_variant, part, decalpath, spec,
+					variant, hard_mask_arr, overlay_arr, dif_img_arr, base_arr)
+					for spec, variant in zip(decalspecs, variants)]
+				for future in futures:
+					future.exception()
+				for future in futures:
+					future.result()
+		self.logger.log(22, f"Finished in {time.perf_counter() - start:.2f}s")
+
+	def _sweep_variant(self, part, decalpath, spec, variant, hard_mask_arr, overlay_arr,
+			dif_img_arr, base_arr):
+		"""
+		Stamps the decal at `decalpath` onto a copy of the part's overlay
+		according to the decalspec `spec`, merges the region it covers into a
+		copy of the part's image without its decal and saves the result and
+		its mipmaps as `variant`.
+		"""
+		self._local.logger = PrefixLoggerAdapter(self._logger,
+			{"prefix": f"{part.lwr} {variant}"})
+		self.logger.log(25, f"Stamping decal with decalspec {spec!r}...")
+		overlay_arr = overlay_arr.copy()
+		off_x, off_y, dec_w, dec_h = self._stamp_decal(overlay_arr, hard_mask_arr,
+			part.decal_color, part.decal_area, decalpath,
+			self._get_decalspec(part, hard_mask_arr.shape[1], hard_mask_arr.shape[0], spec),
+			part)
+		final_arr = base_arr.copy()
+		region = numpy.s_[off_y:off_y + dec_h, off_x:off_x + dec_w]
+		if dec_w and dec_h:
+			with self._profile("multiply", part):
+				final_arr[region] = self.backend.multiply(overlay_arr[region],
+					dif_img_arr[region], threads = self.threads)
+		for mip_arr in iter_mips(final_arr, self.mips):
+			self._save_image(mip_arr, part, variant)
+
+	@property
+	def logger(self):
+		return getattr(self._local, "logger", self._logger)
+
+	def _profile(self, stage, part = None):
+		"""
+		Returns a context manager recording the code run in it as `stage`
+		of `part` with the profiler, if there is one.
+		"""
+		if self.profiler is None:
+			return nullcontext()
+		return self.profiler.stage(stage, None if part is None else part.lwr)
+
+	def _merged_profile(self):
+		"""
+		Returns a context manager merging the stages recorded in it per
+		part, see Profiler.merged.
+		"""
+		if self.profiler is None:
+			return nullcontext()
+		return self.profiler.merged()
+
+	def _set_part_logger(self, part):
+		"""
+		Makes the calling thread log through a logger prefixing messages
+		with the part's name.
+		"""
+		self._local.logger = PrefixLoggerAdapter(self._logger, {"prefix": part.lwr})
+
+	def render(self, parts = None):
+		"""
+		Renders parts of the package without writing anything to disk and
+		returns them as a dict mapping the parts' lowercase names to RGB
+		numpy arrays.
+
+		parts : None;Iterable[str] | Names of the parts to render, "body"
+			and/or "head". None to render those not excluded by the flags.
+		"""
+		if parts is None:
+			parts = [part.lwr for part, exclude in ((self.body, FLAGS.EXCLUDE_BODY),
+				(self.head, FLAGS.EXCLUDE_HEAD)) if not (self.flag & exclude)]
+		parts = [self._get_part(name) for name in parts]
+		self._prepare()
+		res = {}
+		for part in parts:
+			dif_img, msk_img = self._open_textures(part)
+			self._fill_part_attrs(part)
+			res[part.lwr] = self._render_part(part, dif_img, msk_img, self._seek_decal(part))
+		return res
+
+	def _get_part(self, name):
+		for part in (self.body, self.head):
+			if part.lwr == name.lower():
+				return part
+		raise ValueError(f"Unknown part: {name!r}")
+
+	def _prepare(self):
+		"""
+		Locates and parses the props files and validates the textures.
+		"""
+		self.logger.log(22, f"Imaging backend: {self.backend.name}, {self.threads} thread(s)")
 		self.logger.log(22, f"Seeking for props files...")
-		self._locate_props_files()
+		with self._profile("locate"):
+			self._locate_props_files()
 		self.logger.log(22, f"Parsing props files and getting textures...")
-		self._parse_props_files()
+		with self._profile("parse"):
+			self._parse_props_files()
 		self.logger.log(22, f"Fetching and validating textures...")
-		self._get_textures()
-		if not (self.flag & FLAGS.EXCLUDE_BODY):
-			self.logger.log(25, f"===Generating body file===")
-			self._generate_image(self.body)
-		if not (self.flag & FLAGS.EXCLUDE_HEAD):
-			self.logger.log(25, f"===Generating head file===")
-			self._generate_image(self.head)
+		with self._profile("check_textures"):
+			self._get_textures()
 
 	@staticmethod
 	def is_perfect_square(img: Image.Image):
@@ -207,8 +484,7 @@ class SkinGenerator():
 		for part in (self.body, self.head):
 			tmp_pat = Path(self.in_dir, PROPSFILE.format(self.skin_name, part.cap))
 			if not tmp_pat.exists():
-				self.logger.log(50, f"COULD NOT FIND {tmp_pat}!")
-				sys.exit()
+				raise PackageError(f"COULD NOT FIND {tmp_pat}!")
 			setattr(part, "props", tmp_pat)
 			self.logger.log(20, f"\tFound {tmp_pat.name}")
 
@@ -219,18 +495,25 @@ class SkinGenerator():
 		instance in the part's unif_props attribute.
 		"""
 		for part in (self.body, self.head):
+			if self.index is not None:
+				try:
+					part.unif_props = self.index.get_props(part.props)
+				except sqlite3.Error as exc:
+					self.logger.log(30, f"Unable to read from the index: {exc}")
+				if part.unif_props is not None:
+					self.logger.log(20, f"\tRead {part.props.name} from the index")
+					continue
 			with open(part.props, "r") as h:
-				u_prsr = UParser(h.read())
+				# Nothing outside of the parameter values is used.
+				u_prsr = UParser(h.read(), PARAMETER_VALUE_KEYS)
 			try:
 				res = u_prsr.parse()
 			except UnrealNotationParseError as exc:
-				self.logger.log(50, f"Error parsing Unreal Notation file: {exc}")
-				sys.exit()
+				raise PropsError(f"Error parsing Unreal Notation file: {exc}") from exc
 			try:
 				res = unify_props(res)
 			except Exception as exc:
-				self.logger.log(50, f"Unexpected error while parsing {part.props}")
-				sys.exit()
+				raise PropsError(f"Unexpected error while parsing {part.props}") from exc
 			part.unif_props = res
 
 	def _get_textures(self):
@@ -239,22 +522,17 @@ class SkinGenerator():
 		If they do, stores them in the respective objects.
 		"""
 		for part in (self.body, self.head):
-			for param_node in part.unif_props.TexturePV:
-				if param_node.name not in MAP_TEX_PARAM_NAME_TO_PART_ATTR:
+			for param_name, attr in MAP_TEX_PARAM_NAME_TO_PART_ATTR.items():
+				if param_name not in part.unif_props.TexturePV:
 					continue
-				attr = MAP_TEX_PARAM_NAME_TO_PART_ATTR[param_node.name]
-
-				ue_tex_name = RE_TEXTURE_UE_INTERNAL_PATH.search(param_node.value)
-				if not ue_tex_name:
-					self.logger.log(50, f"Could not apply regex to get texture file: "
-						"{param_node.value}")
-					sys.exit()
-				ue_tex_name = ue_tex_name[1]
-				ue_tex_name = ue_tex_name.split(UE_TEX_SEP)[-1]
-				tmp_pat = Path(self.in_dir, TEXTURE_FILE.format(ue_tex_name))
+				param_node = part.unif_props.TexturePV.get_node(param_name)
+
+				tmp_pat = resolve_texture_path(self.in_dir, param_node.value)
+				if tmp_pat is None:
+					raise PropsError(f"Could not apply regex to get texture file: "
+						f"{param_node.value}")
 				if not tmp_pat.exists():
-					self.logger.log(50, f"Unable to find texture file {tmp_pat}!")
-					sys.exit()
+					raise TextureError(f"Unable to find texture file {tmp_pat}!")
 				setattr(part, attr, tmp_pat)
 				self.logger.log(19, f"\t{attr} {part.cap}: {tmp_pat.name}")
 
@@ -278,23 +556,25 @@ class SkinGenerator():
 		decal_color = DEF_DECAL_COL.copy()
 		decal_area = DEF_DECAL_AREA.copy()
 
-		for node in part.unif_props.VectorPV:
-			if node.name == "p_DecalColor":
-				decal_color = DEF_DECAL_COL.copy()
-				mul = 1
-				for v in node.value.values():
-					v = float(v.strip()) * mul
-					if v > 1:
-						mul = 1 / v
-				for j, k in node.value.items():
-					decal_color[MAP_CHNL_TO_IDX[j]] = round(float(k.strip()) * 255 * mul)
-			if node.name == "p_DecalChannelScale":
-				for k, v in node.value.items():
-					if not k in MAP_CHNL_TO_IDX or k == "A": # Doesn't support alpha
-						continue
-					decal_area[MAP_CHNL_TO_IDX[k]] = round(float(v.strip()) * 255)
+		vector_pv = part.unif_props.VectorPV
+		if "p_DecalColor" in vector_pv:
+			node = vector_pv.get_node("p_DecalColor")
+			mul = 1
+			for v in node.value.values():
+				v = float(v.strip()) * mul
+				if v > 1:
+					mul = 1 / v
+			for j, k in node.value.items():
+				decal_color[MAP_CHNL_TO_IDX[j]] = round(float(k.strip()) * 255 * mul)
+		if "p_DecalChannelScale" in vector_pv:
+			node = vector_pv.get_node("p_DecalChannelScale")
+			for k, v in node.value.items():
+				if not k in MAP_CHNL_TO_IDX or k == "A": # Doesn't support alpha
+					continue
+				decal_area[MAP_CHNL_TO_IDX[k]] = round(float(v.strip()) * 255)
+		for node in vector_pv:
 			color_name_match = RE_DEFINES_CHNL_COL.match(node.name)
-			if color_name_match:
+			if color_name_match and color_name_match[2].lower() in MAP_NAME_TO_IDX:
 				nrm_colors = [0, 0, 0, 0]
 				mul = 1
 				for val in node.value.values():
@@ -327,28 +607,24 @@ class SkinGenerator():
 		checks whether the path exists and finally returns it as a Path object.
 		If the decal or the image do not exist, None is returned.
 		"""
-		decalimg = None
-		for node in part.unif_props.TexturePV:
-			if node.name == "p_Decal":
-				if node.value in ("", "None"):
-					self.logger.log(25, "Part has no decal associated with it.")
-				tmp = RE_TEXTURE_UE_INTERNAL_PATH.search(node.value)
-				if tmp is None:
-					self.logger.log(30, "Error while locating decal. Key found, "
-						"but could not determine image path.")
-					break
-				decalimg = Path(self.in_dir,
-					TEXTURE_FILE.format(tmp[1].split(UE_TEX_SEP)[-1]))
-				if not decalimg.exists():
-					self.logger.log(30, "Decal image not found on disk.")
-					return None
-				break
-		else: #No key "p_Decal" was encountered
+		if "p_Decal" not in part.unif_props.TexturePV:
+			self.logger.log(25, "Part has no decal associated with it.")
+			return None
+		node = part.unif_props.TexturePV.get_node("p_Decal")
+		if node.value in ("", "None"):
 			self.logger.log(25, "Part has no decal associated with it.")
+		decalimg = resolve_texture_path(self.in_dir, node.value)
+		if decalimg is None:
+			self.logger.log(30, "Error while locating decal. Key found, "
+				"but could not determine image path.")
+			return None
+		if not decalimg.exists():
+			self.logger.log(30, "Decal image not found on disk.")
+			return None
 		return decalimg
 
 	def _stamp_decal(self, overlay_arr, hard_mask_arr, decal_color,
-			decal_area, decalpath, decalspec):
+			decal_area, decalpath, decalspec, part = None):
 		"""
 		Applies decal to `overlay_arr` in-place.
 
@@ -364,139 +640,556 @@ class SkinGenerator():
 			ints; [R, G, B, A]
 		decal_area : numpy.ndarray[np.uint8, ndim = 1] | Numpy array
 			containing the decal area in 3 values.
+		part : None;Bodypart | Part to profile the decal's stages for.
+		Returns the region of `overlay_arr` that was changed as a tuple of
+		(x, y, width, height).
 		"""
-		decal_image = Image.open(decalpath)
-		processed_decal_arr = apply_decal(
-			decal_image,
-			hard_mask_arr,
-			decal_color,
-			decal_area,
-			decalspec.posx, decalspec.posy,
-			decalspec.rot,
-			decalspec.scalex, decalspec.scaley,
-			decalspec.repeat
-		)
-		blend_inplace(processed_decal_arr, overlay_arr)
-
-	def _generate_image(self, part):
-		self.logger.log(20, f"Opening {part.dif}")
-		dif_img = Image.open(part.dif)
-		difx, dify = dif_img.size
-
-		self.logger.log(20, f"Opening {part.msk} and expanding")
-		msk_img = Image.open(part.msk)
-		if not self.is_perfect_square(msk_img):
-			self.logger.log(50, "Image has bad constraints.")
-			sys.exit()
-
-		m_x, m_y = msk_img.size
-		if m_x != difx or m_y != dify:
-			self.logger.log(50, "Well this shouldn't happen but the dif "
-				"and mask images are of different sizes.")
-			sys.exit()
-
-		soft_mask = msk_img.resize((difx, dify),
-			box = (0.0, 0.0, difx/2, float(dify)))
-		hard_mask = msk_img.resize((difx, dify),
-			box = (difx/2, 0.0, float(difx), float(dify)))
+		with self._profile("decal_transform", part):
+			decal_image = self._open_decal(decalpath)
+			processed_decal_arr, off_x, off_y = self.backend.apply_decal(
+				decal_image,
+				hard_mask_arr,
+				decal_color,
+				decal_area,
+				decalspec.posx, decalspec.posy,
+				decalspec.rot,
+				decalspec.scalex, decalspec.scaley,
+				decalspec.repeat,
+				threads = self.threads
+			)
+		dec_h, dec_w = processed_decal_arr.shape[:2]
+		if dec_h == 0 or dec_w == 0: # Decal lies outside of the image
+			return (off_x, off_y, 0, 0)
+		with self._profile("decal_blend", part):
+			self.backend.blend_inplace(processed_decal_arr,
+				overlay_arr[off_y:off_y + dec_h, off_x:off_x + dec_w], threads = self.threads)
+		return (off_x, off_y, dec_w, dec_h)
+
+	def _open_textures(self, part):
+		"""
+		Opens the part's diffuse and mask texture, checks their sizes and
+		returns them as PIL images.
+		"""
+		with self._profile("check_textures", part):
+			try:
+				self.logger.log(20, f"Opening {part.dif}")
+				dif_img = Image.open(part.dif)
+				self.logger.log(20, f"Opening {part.msk}")
+				msk_img = Image.open(part.msk)
+			except OSError as exc:
+				raise TextureError(f"Unable to open texture: {exc}") from exc
+			if not self.is_perfect_square(msk_img):
+				raise TextureError("Image has bad constraints.")
+
+			if msk_img.size != dif_img.size:
+				raise TextureError("Well this shouldn't happen but the dif "
+					"and mask images are of different sizes.")
+		return dif_img, msk_img
+
+	def _open_decal(self, decalpath):
+		"""
+		Opens and loads the decal at `decalpath`, returning it as a PIL
+		image.
+		"""
+		try:
+			self.logger.log(20, f"Opening {decalpath}")
+			decal_img = Image.open(decalpath)
+			# Images are read lazily; truncated files only fail once loaded.
+			decal_img.load()
+		except OSError as exc:
+			raise TextureError(f"Unable to open decal: {exc}") from exc
+		return decal_img
+
+	def _seek_decal(self, part):
+		"""
+		Returns the path of the part's decal, None if there is none or
+		decals are turned off.
+		"""
+		if self.flag & FLAGS.NO_DECAL:
+			return None
+		self.logger.log(25, f"Seeking decal...")
+		decalpath = self._get_decal(part)
+		if decalpath is not None:
+			self.logger.log(25, f"Applying decal from: {decalpath}")
+		else:
+			self.logger.log(25, "No decal found.")
+		return decalpath
+
+	def _render_part(self, part, dif_img, msk_img, decalpath):
+		"""
+		Renders the part, whose attributes have to be filled already, and
+		returns it as an RGB numpy array.
+		"""
+		mask_arr, dif_img_arr = self._decode_textures(part, dif_img, msk_img)
+		return self._render_arrays(part, mask_arr, dif_img_arr, decalpath)
+
+	def _decode_textures(self, part, dif_img, msk_img):
+		"""
+		Returns the part's mask and diffuse texture as numpy arrays.
+		"""
+		with self._profile("decode", part):
+			try:
+				mask_arr = self._load_texture(part.msk, "array", lambda: numpy.array(msk_img))
+				dif_img_arr = self._load_texture(part.dif, "array", lambda: numpy.array(dif_img))
+			except OSError as exc:
+				raise TextureError(f"Unable to decode texture: {exc}") from exc
+			part.scale = 1.0
+			if self.preview is not None:
+				full_width = dif_img_arr.shape[1]
+				halvings = 0
+				while (full_width >> halvings) > max(self.preview, 1):
+					halvings += 1
+				if halvings:
+					variant = f"preview_{full_width >> halvings}"
+					mask_arr = self._load_texture(part.msk, variant,
+						lambda: _halve_times(mask_arr, halvings))
+					dif_img_arr = self._load_texture(part.dif, variant,
+						lambda: _halve_times(dif_img_arr, halvings))
+					part.scale = dif_img_arr.shape[1] / full_width
+					self.logger.log(22, f"Rendering a preview at {dif_img_arr.shape[1]}x"
+						f"{dif_img_arr.shape[0]}")
+		return mask_arr, dif_img_arr
+
+	def _get_decalspec(self, part, width, height, spec = None):
+		"""
+		Returns the part's decalspec, or `spec` if given, parsed for a
+		`width` x `height` base image. For previews, it is parsed for the
+		full size textures and scaled down to the preview's size, so the
+		decal lands in the same place.
+		"""
+		decalspec = parse_decalspec(part.decalspec if spec is None else spec,
+			round(width / part.scale),
+			round(height / part.scale))
+		if part.scale == 1.0:
+			return decalspec
+		return scale_decalspec(decalspec, part.scale)
+
+	def _render_arrays(self, part, mask_arr, dif_img_arr, decalpath):
+		"""
+		Renders the part from its decoded textures and returns it as an RGB
+		numpy array.
+		"""
+		color_lut = None
+		if self.flag & FLAGS.COLOR_LUT:
+			with self._profile("color_lut", part):
+				color_lut = self.backend.build_color_lut(part.colors)
+
+		if self.flag & FLAGS.MULTIPASS:
+			return self._render_multipass(part, mask_arr, dif_img_arr, color_lut, decalpath)
+		return self._render_fused(part, mask_arr, dif_img_arr, color_lut, decalpath)
+
+	def _read_part(self, part):
+		"""
+		First stage of run's pipeline. Opens and decodes the part's
+		textures and looks for its decal. Returns the part, or None if it
+		does not need to be generated again.
+		"""
+		self.logger.log(25, f"===Generating {part.lwr} file===")
+		dif_img, msk_img = self._open_textures(part)
 
 		self.logger.log(20, f"Reading and converting part information...")
 		self._fill_part_attrs(part)
-		self.logger.log(19, f"Part colors:\n{part.colors}")
-		self.logger.log(19, f"Decal colors: {part.decal_color}")
-		self.logger.log(19, f"Decal area: {part.decal_area}")
-		self.logger.log(19, f"Decalspec: {part.decalspec.__repr__()}")
+		# Formatting the arrays is not free, skip it unless it is shown.
+		if self.logger.isEnabledFor(19):
+			self.logger.log(19, f"Part colors:\n{part.colors}")
+			self.logger.log(19, f"Decal colors: {part.decal_color}")
+			self.logger.log(19, f"Decal area: {part.decal_area}")
+			self.logger.log(19, f"Decalspec: {part.decalspec.__repr__()}")
 
 		######DEBUG BLOCK
 		if self.flag & FLAGS.DUMP_PALETTE:
 			p = self.dump_color_palette(part.colors)
-			self._save_image(p, Bodypart("palette"))
+			# Named after the part, as the parts may be rendered concurrently.
+			self._save_image(numpy.array(p), Bodypart(f"{part.name}_palette"))
 		######
 
-		self.logger.log(25, f"Generating overlay image...")
-		hard_mask_arr = numpy.array(hard_mask)
-		soft_mask_arr = numpy.array(soft_mask)
-		overlay_arr = ue_color_diff(hard_mask_arr, soft_mask_arr, part.colors)
+		part.decalpath = self._seek_decal(part)
+
+		part.part_fingerprint = None
+		if self.manifest is not None:
+			part.part_fingerprint = self._fingerprint(part, part.decalpath)
+			targetpaths = [self._get_target_path(part, size)
+				for size in self._mip_sizes(dif_img.size[0])]
+			if not (self.flag & FLAGS.FORCE) and all(targetpath.exists() and
+					self.manifest.is_current(targetpath.name, part.part_fingerprint)
+					for targetpath in targetpaths):
+				self.logger.log(25, f"Inputs unchanged since {targetpaths[0].name} was "
+					f"generated, skipping.")
+				self.skipped_parts += 1
+				return None
+
+		if self._banded():
+			part.mask_rows, part.dif_rows = self._open_texture_rows(part)
+		else:
+			part.mask_arr, part.dif_arr = self._decode_textures(part, dif_img, msk_img)
+		return part
+
+	def _render_read_part(self, part):
+		"""
+		Second stage of run's pipeline. Renders the part read by _read_part
+		into its `final_arr` and returns it. When rendering band by band,
+		only sets up its `final_bands` instead, which renders each band as
+		the last stage saves it.
+		"""
+		if part.dif_rows is not None:
+			part.final_shape = part.dif_rows.shape[:2] + (3,)
+			part.final_bands = self._render_bands(part, part.mask_rows, part.dif_rows,
+				part.decalpath)
+			part.mask_rows = part.dif_rows = None
+			return part
+		part.final_arr = self._render_arrays(part, part.mask_arr, part.dif_arr, part.decalpath)
+		part.mask_arr = part.dif_arr = None
+		return part
+
+	def _banded(self):
+		return self.band is not None and self.preview is None and \
+			not (self.flag & FLAGS.MULTIPASS)
+
+	def _open_texture_rows(self, part):
+		"""
+		Returns TextureRows of the part's mask and diffuse texture.
+		"""
+		try:
+			with self._profile("decode", part):
+				return TextureRows(part.msk), TextureRows(part.dif)
+		except (OSError, ValueError) as exc:
+			raise TextureError(f"Unable to decode texture: {exc}") from exc
 
-		if not (self.flag & FLAGS.NO_DECAL):
-			self.logger.log(25, f"Seeking decal...")
-			decalpath = self._get_decal(part)
+	def _render_bands(self, part, mask_rows, dif_rows, decalpath):
+		"""
+		Generator rendering the part like _render_fused, but in bands of
+		`self.band` rows. Each band only reads its rows of the textures from
+		`mask_rows` and `dif_rows` and places the part of the decal that
+		falls onto it, so no image is held in full. The decal is scaled and
+		rotated once up front. Yields the bands of the final image as RGB
+		numpy arrays and closes the TextureRows once done.
+		"""
+		try:
+			height, width = dif_rows.shape[:2]
+			color_lut = None
+			if self.flag & FLAGS.COLOR_LUT:
+				with self._profile("color_lut", part):
+					color_lut = self.backend.build_color_lut(part.colors)
+			decal = None
 			if decalpath is not None:
-				self.logger.log(25, f"Applying decal from: {decalpath}")
-				self._stamp_decal(
-					overlay_arr,
-					hard_mask_arr,
-					part.decal_color,
-					part.decal_area,
-					decalpath,
-					parse_decalspec(
-						part.decalspec,
-						difx, dify
-					)
-				)
-			else:
-				self.logger.log(25, "No decal found.")
+				decalspec = self._get_decalspec(part, width, height)
+				with self._profile("decal_transform", part):
+					decal = self.backend.transform_decal(self._open_decal(decalpath),
+						decalspec.rot, decalspec.scalex, decalspec.scaley)
+				# Truncated once here as place_decal would, so every band is
+				# shifted by exactly its first row.
+				pos_x, pos_y = int(decalspec.posx), int(decalspec.posy)
+
+			self.logger.log(25, f"Rendering overlay, decal and base image in bands of "
+				f"{self.band} rows...")
+			for y0 in range(0, height, self.band):
+				y1 = min(y0 + self.band, height)
+				with self._profile("decode", part):
+					mask_band = mask_rows.read(y0, y1)
+					dif_band = dif_rows.read(y0, y1)
+				decal_arr = None
+				decal_x = decal_y = 0
+				if decal is not None:
+					with self._profile("decal_transform", part):
+						decal_arr, decal_x, decal_y = self.backend.insert_decal(decal,
+							width, y1 - y0, pos_x, pos_y - y0, decalspec.repeat)
+					if decal_arr.shape[0] == 0 or decal_arr.shape[1] == 0:
+						decal_arr = None
+				with self._profile("render_fused", part):
+					band = self.backend.render_fused(mask_band, part.colors, color_lut,
+						decal_arr, decal_x, decal_y, part.decal_color, part.decal_area,
+						dif_band, mask_filter = self.mask_filter, threads = self.threads)
+				yield band
+		finally:
+			mask_rows.close()
+			dif_rows.close()
+
+	def _write_part(self, part):
+		"""
+		Last stage of run's pipeline. Saves the part's `final_arr` and its
+		mipmaps and records them in the manifest.
+		"""
+		if part.final_bands is not None:
+			return self._write_banded_part(part)
+		# Only the level the next one is derived from is kept around.
+		mips = iter_mips(part.final_arr, self.mips)
+		part.final_arr = None
+		for mip_arr in mips:
+			targetpath = self._save_image(mip_arr, part)
+			if targetpath is not None and self.manifest is not None:
+				self.manifest.record(targetpath.name, part.part_fingerprint)
+		return part
+
+	def _write_banded_part(self, part):
+		"""
+		Saves the image rendered by the part's `final_bands` as they are
+		produced, along with its mipmaps, and records them in the manifest.
+		The first mipmap is halved from the bands on the way; only it is
+		kept in full to derive the smaller ones from.
+		The stages run for every band are profiled as one per part.
+		"""
+		bands = part.final_bands
+		part.final_bands = None
+		halved = []
+		if self.mips:
+			bands = _halve_bands(bands, halved)
+		with self._merged_profile():
+			targetpath = self._save_bands(bands, part.final_shape, part)
+		if targetpath is None:
+			return part
+		if self.manifest is not None:
+			self.manifest.record(targetpath.name, part.part_fingerprint)
+		if not halved:
+			return part
+		for mip_arr in iter_mips(numpy.concatenate(halved), self.mips - 1):
+			targetpath = self._save_image(mip_arr, part)
+			if targetpath is not None and self.manifest is not None:
+				self.manifest.record(targetpath.name, part.part_fingerprint)
+		return part
+
+	def _mip_sizes(self, size):
+		"""
+		Returns the sizes of a `size` pixels wide image and its mipmaps.
+		"""
+		sizes = [size]
+		while len(sizes) <= self.mips and sizes[-1] > 1:
+			sizes.append(sizes[-1] // 2)
+		return sizes
+
+	def _fingerprint(self, part, decalpath):
+		"""
+		Returns a fingerprint of everything the image generated for `part`
+		depends on; its props file, its textures, the effective decalspec,
+		the flags that change the image, the mask filter and the version.
+		Expects `_fill_part_attrs` to have been run on `part`.
+		"""
+		return fingerprint({
+			"version": __version__,
+			"props": file_digest(part.props),
+			"dif": file_digest(part.dif),
+			"msk": file_digest(part.msk),
+			"decal": None if decalpath is None else file_digest(decalpath),
+			"decalspec": part.decalspec,
+			"flag": self.flag & FINGERPRINT_FLAGS,
+			"mask_filter": MASK_FILTERS[self.mask_filter],
+		})
+
+	def _load_texture(self, path, variant, producer):
+		"""
+		Returns the array `producer` derives from the texture at `path`,
+		taking it from the texture cache if possible. `variant` names the
+		array in the cache.
+		"""
+		if self.cache is None:
+			return producer()
+		return self.cache.get(path, variant, producer)
+
+	def _render_multipass(self, part, mask_arr, dif_img_arr, color_lut, decalpath):
+		"""
+		Renders the part's final image, splitting the mask texture, creating
+		the overlay image, stamping the decal onto it and merging it with the
+		diffuse texture in separate passes. Returns the final image as a numpy
+		array.
+		`color_lut` and `decalpath` may be None.
+		"""
+		hard_mask_arr, soft_mask_arr = self._split_mask(part, mask_arr)
+		overlay_arr = self._render_overlay(part, hard_mask_arr, soft_mask_arr, color_lut)
+
+		if decalpath is not None:
+			self.logger.log(25, f"Stamping decal...")
+			self._stamp_decal(
+				overlay_arr,
+				hard_mask_arr,
+				part.decal_color,
+				part.decal_area,
+				decalpath,
+				self._get_decalspec(
+					part,
+					hard_mask_arr.shape[1], hard_mask_arr.shape[0]
+				),
+				part
+			)
 
 		self.logger.log(25, f"Merging overlay and base image...")
-		dif_img_arr = numpy.array(dif_img)
-		final_arr = multiply(overlay_arr, dif_img_arr)
-		self._save_image(Image.fromarray(final_arr), part)
+		with self._profile("multiply", part):
+			return self.backend.multiply(overlay_arr, dif_img_arr, threads = self.threads)
 
-	def _save_image(self, img, part):
+	def _split_mask(self, part, mask_arr):
 		"""
-		Choose a target path based on class variables, the current bodypart,
-		which has to be supplied and save the image.
-		Asks user whether they want to overwrite an existing file or create
-		non-existing directories.
+		Returns the hard and soft halves of the mask texture, stretched to
+		its full width.
+		"""
+		self.logger.log(25, f"Expanding mask...")
+		variant = f"split_{MASK_FILTERS[self.mask_filter]}"
+		if part.scale != 1.0:
+			variant += f"_preview_{mask_arr.shape[1]}"
+		with self._profile("split_mask", part):
+			return self._load_texture(
+				part.msk, variant,
+				lambda: numpy.stack(self.backend.split_mask(mask_arr, self.mask_filter))
+			)
+
+	def _render_overlay(self, part, hard_mask_arr, soft_mask_arr, color_lut = None):
+		"""
+		Returns the overlay image coloring the part's diffuse texture,
+		without its decal. `color_lut` is built from the part's colors if
+		FLAGS.COLOR_LUT is set and it is None.
+		"""
+		self.logger.log(25, f"Generating overlay image...")
+		with self._profile("color_diff", part):
+			if color_lut is None and self.flag & FLAGS.COLOR_LUT:
+				color_lut = self.backend.build_color_lut(part.colors)
+			if color_lut is not None:
+				return self.backend.ue_color_diff_lut(hard_mask_arr, soft_mask_arr,
+					color_lut, threads = self.threads)
+			return self.backend.ue_color_diff(hard_mask_arr, soft_mask_arr,
+				part.colors, threads = self.threads)
+
+	def _render_fused(self, part, mask_arr, dif_img_arr, color_lut, decalpath):
+		"""
+		Renders the part's final image in a single pass over the image,
+		reading the mask texture's halves directly. Only the decal is placed
+		beforehand. Returns the final image as a numpy array.
+		`color_lut` and `decalpath` may be None.
+		"""
+		decal_arr = None
+		decal_x = decal_y = 0
+		if decalpath is not None:
+			self.logger.log(25, f"Placing decal...")
+			decalspec = self._get_decalspec(part,
+				dif_img_arr.shape[1], dif_img_arr.shape[0])
+			with self._profile("decal_transform", part):
+				decal_arr, decal_x, decal_y = self.backend.place_decal(
+					self._open_decal(decalpath),
+					dif_img_arr.shape[1], dif_img_arr.shape[0],
+					decalspec.posx, decalspec.posy,
+					decalspec.rot,
+					decalspec.scalex, decalspec.scaley,
+					decalspec.repeat
+				)
+
+		self.logger.log(25, f"Rendering overlay, decal and base image...")
+		with self._profile("render_fused", part):
+			return self.backend.render_fused(mask_arr, part.colors, color_lut, decal_arr,
+				decal_x, decal_y, part.decal_color, part.decal_area, dif_img_arr,
+				mask_filter = self.mask_filter, threads = self.threads)
+
+	def _get_target_path(self, part, size, variant = ""):
+		"""
+		Returns the path the `size` pixels wide image generated for `part`
+		is saved to. `variant` names the decalspec of a sweep.
 		"""
 		f_stub = self.out_fmt.format(
 			class_ = self.class_, skin = self.skin_name, part = part.lwr,
-			date = datetime.datetime.now().strftime("%d%m%Y-%H%M%S")
+			date = datetime.datetime.now().strftime("%d%m%Y-%H%M%S"), size = size,
+			variant = variant
 		)
-		targetpath = Path(self.out_dir, (f_stub + ".png"))
-		if not self.out_dir.exists():
-			if not (self.flag & FLAGS.NO_ASK):
+		if self.preview is not None:
+			f_stub += "_preview"
+		return Path(self.out_dir, (f_stub + self.writer.extension))
+
+	def _save_image(self, arr, part, variant = ""):
+		"""
+		Saves the image in the numpy array `arr`, see _save_bands.
+		"""
+		return self._save_bands(iter_bands(arr), arr.shape, part, variant)
+
+	def _save_bands(self, bands, shape, part, variant = ""):
+		"""
+		Choose a target path based on class variables, the current bodypart,
+		which has to be supplied and save the image of shape `shape`, given
+		as consecutive bands of rows by `bands`, with the writer.
+		Asks user whether they want to overwrite an existing file or create
+		non-existing directories.
+		Returns the path the image was saved to, or None if the user
+		declined to.
+		"""
+		targetpath = self._get_target_path(part, shape[1], variant)
+		with self._ask_lock:
+			if not self.out_dir.exists():
+				if not (self.flag & FLAGS.NO_ASK):
+					while True:
+						self.logger.log(30, "Target directory does not seem to exist.")
+						userchoice = input("Create it? (Y/N) > ").lower()
+						if userchoice != "n" and userchoice != "y":
+							continue
+						if userchoice == "n":
+							return None
+						if userchoice == "y":
+							break
+				os.makedirs(self.out_dir, exist_ok = True)
+			self.logger.log(25, f"Saving generated texture to {targetpath}")
+			if targetpath.exists() and not (self.flag & FLAGS.NO_ASK):
+				self.logger.log(30, f"File {targetpath} already exists!")
 				while True:
-					self.logger.log(30, "Target directory does not seem to exist.")
-					userchoice = input("Create it? (Y/N) > ").lower()
+					userchoice = input("Overwrite it? (Y/N) > ").lower()
 					if userchoice != "n" and userchoice != "y":
 						continue
 					if userchoice == "n":
-						return
-					if userchoice == "y":
+						return None
+					elif userchoice == "y":
 						break
-			os.makedirs(self.out_dir)
-		self.logger.log(25, f"Saving generated texture to {targetpath}")
-		if targetpath.exists() and not (self.flag & FLAGS.NO_ASK):
-			self.logger.log(30, f"File {targetpath} already exists!")
-			while True:
-				userchoice = input("Overwrite it? (Y/N) > ").lower()
-				if userchoice != "n" and userchoice != "y":
-					continue
-				if userchoice == "n":
-					return
-				elif userchoice == "y":
-					break
-		img.save(targetpath, format = "PNG")
+		with self._profile("encode", part):
+			# Hands the writer small bands, so its temporaries stay small.
+			self.writer.write_bands((sub for band in bands for sub in iter_bands(band)),
+				shape, targetpath)
+		return targetpath
 
-def main():
-	argparser = get_argparser()
+def _halve_bands(bands, halved):
+	"""
+	Passes the `bands` of an image through, appending each one halved to
+	the list `halved`. All bands but the last need an even amount of rows.
+	"""
+	for band in bands:
+		halved.append(halve(band))
+		yield band
 
-	if len(sys.argv) == 1:
-		argparser.print_help()
-		sys.exit()
+def _halve_times(arr, times):
+	for _ in range(times):
+		arr = halve(arr)
+	return arr
 
-	args = argparser.parse_args()
+def check_out_fmt(out_fmt, mips = 0, sweep = False):
+	"""
+	Returns a message describing why `out_fmt` can not be used to name
+	output files, or None if it can. If `mips` is not 0, it has to
+	contain a {size} field to tell the mipmaps apart, if `sweep` is set a
+	{variant} field to tell the decalspecs apart.
+	"""
 	# Prevent directory traversal.
 	for pathsep in BAD_PATH_CHARS:
-		if pathsep in args.out_fmt:
-			SKINGEN_LOGGER.log(50, "Illegal characters in output file format! "
-				"Remove all occurrences of " + ", ".join(BAD_PATH_CHARS))
-			sys.exit()
+		if pathsep in out_fmt:
+			return "Illegal characters in output file format! " \
+				"Remove all occurrences of " + ", ".join(BAD_PATH_CHARS)
 	try: # Test the outformat.
-		args.out_fmt.format(class_ = "test", skin = "test", part = "test", date = "test")
+		out_fmt.format(class_ = "test", skin = "test", part = "test", date = "test",
+			size = 0, variant = "test")
 	except (IndexError, KeyError, ValueError):
-		SKINGEN_LOGGER.log(50, "Invalid format string for output!")
+		return "Invalid format string for output!"
+	if mips < 0:
+		return "The amount of mipmaps can not be negative!"
+	fields = [field for _, field, _, _ in string.Formatter().parse(out_fmt)]
+	if mips and "size" not in fields:
+		return "Output file format needs a {size} field to save mipmaps!"
+	if sweep and "variant" not in fields:
+		return "Output file format needs a {variant} field to sweep decalspecs!"
+	return None
+
+def process_common_args(args):
+	"""
+	Validates the arguments shared by all of skingen's argparsers.
+	Exits if the output format is unusable, removes a bad decalspec
+	from `args` and returns the flagnumber.
+	"""
+	out_fmt_error = check_out_fmt(args.out_fmt, args.mips)
+	if out_fmt_error is not None:
+		SKINGEN_LOGGER.log(50, out_fmt_error)
+		sys.exit()
+	if args.preview is not None and args.preview < 1:
+		SKINGEN_LOGGER.log(50, "Preview width must be at least 1!")
+		sys.exit()
+	if args.band is not None and args.band < 1:
+		SKINGEN_LOGGER.log(50, "Band height must be at least 1!")
 		sys.exit()
 
 	# Calculate the flagnumber
@@ -511,13 +1204,137 @@ def main():
 			SKINGEN_LOGGER.log(30, "Bad decalspec, will ignore decal for this run.")
 			setattr(args, "decalspec", None)
 
-	sg = SkinGenerator(
-		in_dir = args.input_dir, out_dir = args.out, out_fmt = args.out_fmt,
-		silence = args.silence - (((flag & FLAGS.DEBUG) // FLAGS.DEBUG) * 2), flag = flag,
-		logger = SKINGEN_LOGGER, decalspec = args.decalspec
-	)
+	return flag
 
-	sg.run()
+def read_sweep_file(args):
+	"""
+	Returns the decalspecs of the file given to -sweep. Exits if it can
+	not be read, holds an invalid decalspec or the output format can not
+	tell them apart.
+	"""
+	out_fmt_error = check_out_fmt(args.out_fmt, args.mips, sweep = True)
+	if out_fmt_error is not None:
+		SKINGEN_LOGGER.log(50, out_fmt_error)
+		sys.exit()
+	if args.sweep_jobs < 1:
+		SKINGEN_LOGGER.log(50, "Amount of sweep jobs must be at least 1!")
+		sys.exit()
+	try:
+		decalspecs = read_decalspec_file(args.sweep)
+	except (OSError, UnicodeDecodeError, ValueError) as exc:
+		SKINGEN_LOGGER.log(50, f"Unable to read decalspecs from {args.sweep}: {exc}")
+		sys.exit()
+	if not decalspecs:
+		SKINGEN_LOGGER.log(50, f"No decalspecs found in {args.sweep}.")
+		sys.exit()
+	return decalspecs
+
+def write_profile(profiler, path, sg):
+	"""
+	Writes the report of `profiler`, which recorded the run of the
+	SkinGenerator `sg`, to `path` and logs where to.
+	"""
+	profiler.close()
+	try:
+		profiler.write_json(path, package = str(sg.in_dir), backend = sg.backend.name,
+			threads = sg.threads, flag = sg.flag, stage_times = sg.stage_times)
+	except OSError as exc:
+		SKINGEN_LOGGER.log(40, f"Unable to write profile to {path}: {exc}")
+		return
+	SKINGEN_LOGGER.log(22, f"Wrote profile to {path}")
+
+def save_manifest(manifest, logger):
+	"""
+	Saves `manifest`, logging an error instead of raising one if it can not
+	be written. The parts it lists have been written already either way.
+	"""
+	try:
+		manifest.save()
+	except OSError as exc:
+		logger.log(40, f"Unable to save manifest to {manifest.path}: {exc}")
+
+def get_texture_cache(args, flag):
+	"""
+	Returns the TextureCache described by the arguments shared by all of
+	skingen's argparsers, or None if caching is turned off. Clears the
+	cache if requested.
+	"""
+	cache = TextureCache(args.cache_dir, args.cache_size << 20)
+	if args.clear_cache:
+		removed = cache.clear()
+		SKINGEN_LOGGER.log(25, f"Removed {removed} entries from the texture cache "
+			f"in {cache.directory}.")
+	if flag & FLAGS.NO_CACHE:
+		return None
+	return cache
+
+def get_image_writer(args):
+	"""
+	Returns the ImageWriter described by the arguments shared by all of
+	skingen's argparsers.
+	"""
+	return ImageWriter(args.format, args.png_level, args.npy_mmap, args.png_filter)
+
+def get_parameter_index(args):
+	"""
+	Returns the ParameterIndex given by the arguments shared by all of
+	skingen's argparsers, or None if there is none.
+	"""
+	if args.index is None:
+		return None
+	if not os.path.isfile(args.index):
+		SKINGEN_LOGGER.log(30, f"Index {args.index} does not exist, props files will be "
+			f"parsed instead.")
+		return None
+	return ParameterIndex(args.index)
+
+def main():
+	if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+		subcommand = importlib.import_module(SUBCOMMANDS[sys.argv[1]])
+		subcommand.main(sys.argv[2:])
+		return
+
+	argparser = get_argparser()
+
+	if len(sys.argv) == 1:
+		argparser.print_help()
+		sys.exit()
+
+	args = argparser.parse_args()
+	flag = process_common_args(args)
+	decalspecs = None
+	if args.sweep is not None:
+		decalspecs = read_sweep_file(args)
+		if args.sweep_jobs > 1:
+			flag |= FLAGS.NO_ASK
+	cache = get_texture_cache(args, flag)
+	profiler = None if args.profile is None else Profiler()
+
+	try:
+		sg = SkinGenerator(
+			in_dir = args.input_dir, out_dir = args.out, out_fmt = args.out_fmt,
+			silence = args.silence - (((flag & FLAGS.DEBUG) // FLAGS.DEBUG) * 2), flag = flag,
+			logger = SKINGEN_LOGGER, decalspec = args.decalspec, backend = args.backend,
+			threads = args.threads, mask_filter = args.mask_filter, cache = cache,
+			manifest = Manifest.load(args.out), index = get_parameter_index(args),
+			writer = get_image_writer(args), mips = args.mips, preview = args.preview,
+			profiler = profiler, band = args.band
+		)
+		try:
+			if decalspecs is None:
+				sg.run()
+			else:
+				sg.sweep(decalspecs, args.sweep_jobs)
+		finally:
+			if sg.manifest is not None:
+				save_manifest(sg.manifest, SKINGEN_LOGGER)
+			if profiler is not None:
+				write_profile(profiler, args.profile, sg)
+	except SkinGenerationError as exc:
+		SKINGEN_LOGGER.log(50, str(exc))
+		sys.exit()
+	if sg.skipped_parts:
+		SKINGEN_LOGGER.log(25, f"Skipped {sg.skipped_parts} unchanged part(s).")
 
 if __name__ == "__main__":
 	main()
@@ -0,0 +1,151 @@
+"""
+Provides the TextureCache, which keeps decoded textures as .npy files
+on disk, so later runs can memory-map them instead of decoding the
+tga files again.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+import tempfile
+
+import numpy
+
+# 1 GiB
+DEFAULT_CACHE_SIZE = 1 << 30
+
+def default_cache_dir():
+	"""
+	Returns the directory the cache lives in by default;
+	$XDG_CACHE_HOME/bl2_skingen or ~/.cache/bl2_skingen.
+	"""
+	base = os.environ.get("XDG_CACHE_HOME")
+	if not base:
+		base = Path.home() / ".cache"
+	return Path(base, "bl2_skingen")
+
+class TextureCache():
+	"""
+	Cache of arrays derived from texture files. Entries are keyed by the
+	texture's path, size and modification time as well as the name of the
+	derived array, so changed textures are never served from the cache.
+	Once the cache grows beyond `max_size` bytes, the least recently used
+	entries are removed.
+	Storing and loading is best-effort; if the cache directory can not be
+	written to, arrays are simply not cached.
+	"""
+	def __init__(self, directory = None, max_size = DEFAULT_CACHE_SIZE):
+		"""
+		directory : None;str;pathlib.Path | Directory to store the entries in.
+			None to use default_cache_dir().
+		max_size : int | Size in bytes the cache is trimmed down to after
+			storing an entry.
+		"""
+		self.directory = Path(directory) if directory is not None else default_cache_dir()
+		self.max_size = max_size
+
+	def _entry_path(self, path, variant):
+		path = Path(path).absolute()
+		stat = path.stat()
+		key = f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\0{variant}"
+		return Path(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npy")
+
+	def _entries(self):
+		"""
+		Returns a list of (path, stat_result) tuples of all cache entries.
+		"""
+		res = []
+		try:
+			candidates = list(self.directory.glob("*.npy"))
+		except OSError:
+			return res
+		for entry in candidates:
+			try:
+				res.append((entry, entry.stat()))
+			except FileNotFoundError: # Evicted by another process
+				pass
+		return res
+
+	def get(self, path, variant, producer):
+		"""
+		Returns the array derived from the texture at `path` under the name
+		`variant`, memory-mapped read-only from the cache. If it is not
+		cached yet or the texture has changed since, calls `producer`,
+		stores its result in the cache and returns it.
+
+		path : str;pathlib.Path | Path to the texture file.
+		variant : str | Name of the array derived from the texture.
+		producer : Callable[[], numpy.ndarray] | Creates the array.
+		"""
+		entry = self._entry_path(path, variant)
+		try:
+			arr = numpy.load(entry, mmap_mode = "r")
+		except (OSError, ValueError): # Not cached or broken
+			pass
+		else:
+			try:
+				os.utime(entry) # Mark as recently used
+			except OSError:
+				pass
+			return arr
+
+		arr = producer()
+		self._store(entry, arr)
+		return arr
+
+	def _store(self, entry, arr):
+		tmp_path = None
+		try:
+			self.directory.mkdir(parents = True, exist_ok = True)
+			# Write to a temporary file first so concurrent readers never see
+			# a partially written entry.
+			fd, tmp_path = tempfile.mkstemp(suffix = ".tmp", dir = self.directory)
+			with os.fdopen(fd, "wb") as h:
+				numpy.save(h, arr)
+			os.replace(tmp_path, entry)
+		except OSError:
+			if tmp_path is not None:
+				try:
+					os.remove(tmp_path)
+				except OSError:
+					pass
+			return
+		self.evict()
+
+	def evict(self):
+		"""
+		Removes the least recently used entries until the cache is no
+		larger than its max_size.
+		"""
+		entries = self._entries()
+		total = sum(stat.st_size for _, stat in entries)
+		if total <= self.max_size:
+			return
+		entries.sort(key = lambda e: e[1].st_mtime)
+		for entry, stat in entries:
+			if total <= self.max_size:
+				break
+			try:
+				entry.unlink()
+			except FileNotFoundError:
+				pass
+			except OSError:
+				continue
+			total -= stat.st_size
+
+	def clear(self):
+		"""
+		Removes all entries from the cache. Returns the amount of removed
+		entries.
+		"""
+		removed = 0
+		for entry, _ in self._entries():
+			try:
+				entry.unlink()
+				removed += 1
+			except OSError:
+				pass
+		return removed
+
+	def __repr__(self):
+		return f"<TextureCache {str(self.directory)!r}, max. {self.max_size} bytes>"
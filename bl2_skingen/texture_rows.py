@@ -0,0 +1,99 @@
+"""
+Provides TextureRows, which reads bands of rows of a texture without
+decoding all of it. Uncompressed TGA files, the format UE Viewer exports
+textures in, are memory mapped, so only the rows asked for are read from
+disk; other files are decoded in full once.
+"""
+
+import struct
+
+import numpy
+from PIL import Image
+
+TGA_HEADER = struct.Struct("<BBBHHBHHHHBB")
+TGA_TRUECOLOR = 2
+TGA_RIGHT_TO_LEFT = 0x10
+TGA_TOP_TO_BOTTOM = 0x20
+# Channels of a TGA pixel -> order to read them in to get RGB(A).
+TGA_CHANNEL_ORDER = {3: [2, 1, 0], 4: [2, 1, 0, 3]}
+
+class TextureRows():
+	"""
+	Gives access to the rows of a texture as RGB(A) numpy arrays, in the
+	same layout numpy.array(PIL.Image.open(path)) has.
+	"""
+	def __init__(self, path):
+		"""
+		path : str;pathlib.Path | Path of the texture.
+		Raises an OSError if the texture can not be read and a ValueError
+		if it is smaller than its header claims.
+		"""
+		self.path = path
+		self._order = None
+		self._top_down = True
+		self._arr = self._map_tga(path)
+		if self._arr is None:
+			with Image.open(path) as img:
+				self._arr = numpy.array(img)
+		self.mapped = self._order is not None
+
+	def _map_tga(self, path):
+		"""
+		Memory maps the pixels of `path` if it is an uncompressed 24 or 32
+		bit TGA file and returns them; returns None otherwise.
+		"""
+		with open(path, "rb") as h:
+			header = h.read(TGA_HEADER.size)
+		if len(header) < TGA_HEADER.size:
+			return None
+		id_len, cmap_type, img_type, _, cmap_len, cmap_bits, _, _, width, height, bpp, \
+			descriptor = TGA_HEADER.unpack(header)
+		if img_type != TGA_TRUECOLOR or bpp not in (24, 32) or \
+				descriptor & TGA_RIGHT_TO_LEFT or width == 0 or height == 0:
+			return None
+		offset = TGA_HEADER.size + id_len
+		if cmap_type:
+			offset += cmap_len * ((cmap_bits + 7) // 8)
+		channels = bpp // 8
+		arr = numpy.memmap(path, dtype = numpy.uint8, mode = "r", offset = offset,
+			shape = (height, width, channels))
+		self._order = TGA_CHANNEL_ORDER[channels]
+		self._top_down = bool(descriptor & TGA_TOP_TO_BOTTOM)
+		return arr
+
+	@property
+	def shape(self):
+		"""
+		Shape of the whole texture; (height, width, channels).
+		"""
+		return self._arr.shape
+
+	def read(self, y0, y1):
+		"""
+		Returns rows `y0` up to `y1` of the texture as a C-contiguous uint8
+		array of shape (y1 - y0, width, channels).
+		"""
+		if self._order is None:
+			return self._arr[y0:y1]
+		height = self._arr.shape[0]
+		if self._top_down:
+			rows = self._arr[y0:y1]
+		else:
+			rows = self._arr[height - y1:height - y0][::-1]
+		# Copies the rows out of the file, swapping BGR(A) to RGB(A).
+		return numpy.ascontiguousarray(rows[..., self._order])
+
+	def close(self):
+		"""
+		Releases the texture's memory map or decoded pixels.
+		"""
+		self._arr = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *_):
+		self.close()
+
+	def __repr__(self):
+		return f"<TextureRows {str(self.path)!r}>"
@@ -1,6 +1,6 @@
-"""Hacky and unstable module to parse an unkown unreal engine file format.
-It does not care about clarity / readability / efficiency.
-See the Parser class and its parse method.
+"""Module to parse an unkown unreal engine file format.
+See the Parser class and its parse method. LegacyParser is the original,
+hacky implementation, kept around as a reference for the Parser's output.
 """
 
 """The format seems to follow these rules: Key Value Pairs, key and value being
@@ -26,10 +26,116 @@ RE_EQ = re.compile(r"\s*=((?= \n))?(?(1)|\s*)")
 RE_VAL = re.compile(r"(.*?)((,|\n|$)|(?=}))")
 RE_WHITESPACE = re.compile(r"\s*")
 
+# Matches a closing bracket or an entire key value pair up to and including its
+# separator, or up to the opening bracket of a dict/list. Anything that can not
+# start a key, such as the separator following a closing bracket, is skipped.
+# Groups: key, index, value; key is None for closing brackets and value is None
+# for opening ones.
+RE_TOKEN = re.compile(
+	r"[^a-zA-Z0-9_}]*"
+	r"(?:}|"
+		r"(?P<key>[a-zA-Z0-9_]+)(?:\[(?P<index>\d*)\])?\s*=(?:(?= \n)|\s*)"
+		r"(?:{|(?P<value>[^,\n}]*)[,\n]?))"
+)
+RE_BRACKET = re.compile(r"[{}]")
+
 class UnrealNotationParseError(ValueError):
 	pass
 
 class Parser():
+	"""
+	Parses the file in a single pass, matching one key value pair at a time.
+	Produces the same output as LegacyParser.
+	"""
+	def __init__(self, raw_file, keys = None):
+		"""
+		raw_file : str | The file's complete contents.
+		keys : None;Iterable[str] | If given, only the top-level keys in it
+			are parsed and returned, the values of all others are skipped.
+		"""
+		self.raw_file = raw_file
+		self.keys = None if keys is None else frozenset(keys)
+		self.pos = 0
+
+	def parse(self):
+		"""
+		Returns the file's contents as a dict. Dicts are returned as dicts,
+		lists as lists of their elements and all other values as strings.
+		"""
+		raw = self.raw_file
+		keys = self.keys
+		match_token = RE_TOKEN.match
+		res = {}
+		stack = [] # Containers enclosing the one being parsed
+		cur = res
+		in_list = False
+		found_any = False
+		pos = self.pos
+		while True:
+			match = match_token(raw, pos)
+			if match is None:
+				if stack:
+					raise UnrealNotationParseError(f"EOF without closing bracket at around {pos}")
+				if found_any and (pos == len(raw) or raw[pos:].isspace()):
+					break
+				raise UnrealNotationParseError(f"Expected key value pair at around {pos}")
+			pos = match.end()
+			found_any = True
+
+			key, index, value = match.group("key", "index", "value")
+			if key is None: # Closing bracket
+				if not stack:
+					raise UnrealNotationParseError(f"Unexpected closing bracket at around {pos}")
+				cur = stack.pop()
+				in_list = isinstance(cur, list)
+				continue
+
+			if in_list:
+				if not index:
+					raise UnrealNotationParseError(f"Index-less list key at around {pos}")
+				key = int(index)
+				if key >= len(cur):
+					raise UnrealNotationParseError(f"List index out of range at around {pos}")
+			elif keys is not None and not stack and key not in keys:
+				if value is None: # Skip over the bracketed value
+					pos = self._skip_brackets(pos)
+				continue
+
+			if value is not None:
+				cur[key] = value
+				continue
+
+			# List elements can not be lists themselves.
+			if index is not None and not in_list:
+				if not index:
+					raise UnrealNotationParseError(f"Expected list length at around {pos}")
+				child = [None] * int(index)
+			else:
+				child = {}
+			cur[key] = child
+			stack.append(cur)
+			cur = child
+			in_list = not in_list and index is not None
+
+		self.pos = pos
+		return res
+
+	def _skip_brackets(self, pos):
+		"""
+		Returns the position behind the bracket closing the one opened
+		right before `pos`.
+		"""
+		depth = 1
+		for match in RE_BRACKET.finditer(self.raw_file, pos):
+			if match[0] == "{":
+				depth += 1
+			else:
+				depth -= 1
+				if depth == 0:
+					return match.end()
+		raise UnrealNotationParseError(f"EOF without closing bracket at around {pos}")
+
+class LegacyParser():
 	def __init__(self, raw_file):
 		"raw_file: The file's complete contents."
 		self.raw_file = raw_file
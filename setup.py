@@ -1,3 +1,4 @@
+import re
 import sys
 from setuptools import setup, find_packages, Extension
 
@@ -6,25 +7,52 @@ if "--build_unneeded" in sys.argv:
 	only_needed = False
 	sys.argv.remove("--build_unneeded")
 
-from Cython.Build import cythonize
+try:
+	from Cython.Build import cythonize
+except ImportError:
+	# Without Cython, install the pure python parts only; the numpy imaging
+	# backend will be used then.
+	print("Cython not found, the imaging extension modules will not be built.")
+	cythonize = None
 import numpy # Just for get_include()
 
+# The kernels split their rows across threads with OpenMP where it's known to be
+# available; elsewhere, they are compiled without it and run on one thread.
+if sys.platform == "win32":
+	COMPILE_ARGS = ["-DMS_WIN64"]
+	LINK_ARGS = []
+elif sys.platform.startswith("linux"):
+	COMPILE_ARGS = ["-fopenmp"]
+	LINK_ARGS = ["-fopenmp"]
+else:
+	COMPILE_ARGS = []
+	LINK_ARGS = []
+
+def _ext(name):
+	return Extension(f"bl2_skingen.imaging.{name}", [f"bl2_skingen/imaging/{name}.pyx"],
+		extra_compile_args = COMPILE_ARGS, extra_link_args = LINK_ARGS)
+
 NEEDED_MODULES = (
-	Extension("bl2_skingen.imaging.apply_decal", ["bl2_skingen/imaging/apply_decal.pyx"], extra_compile_args = ["-DMS_WIN64"]),
-	Extension("bl2_skingen.imaging.blend_inplace", ["bl2_skingen/imaging/blend_inplace.pyx"], extra_compile_args = ["-DMS_WIN64"]),
-	Extension("bl2_skingen.imaging.multiply_sqrt", ["bl2_skingen/imaging/multiply_sqrt.pyx"], extra_compile_args = ["-DMS_WIN64"]),
-	Extension("bl2_skingen.imaging.ue_color_diff", ["bl2_skingen/imaging/ue_color_diff.pyx"], extra_compile_args = ["-DMS_WIN64"]),
+	_ext("apply_decal"),
+	_ext("blend_inplace"),
+	_ext("multiply_sqrt"),
+	_ext("render_fused"),
+	_ext("ue_color_diff"),
 )
 
 UNUSED_MODULES = (
-	Extension("bl2_skingen.imaging.darken", ["bl2_skingen/imaging/darken.pyx"], extra_compile_args = ["-DMS_WIN64"]),
-	Extension("bl2_skingen.imaging.overlay", ["bl2_skingen/imaging/overlay.pyx"], extra_compile_args = ["-DMS_WIN64"])
+	_ext("darken"),
+	_ext("overlay"),
 )
 
 to_compile = list(NEEDED_MODULES)
 if not only_needed:
 	to_compile.extend(UNUSED_MODULES)
 
+# Defined once in the package, which can not be imported before it is built.
+with open("bl2_skingen/skingen.py", "r") as h:
+	version = re.search(r'^__version__ = "(.+)"$', h.read(), re.MULTILINE)[1]
+
 with open("README.md", "r") as h:
 	l_desc = h.read()
 
@@ -33,12 +61,12 @@ with open("requirements.txt", "r") as h:
 
 setup(
 	name = "BL2_skingen",
-	version = "1.4.0",
+	version = version,
 	description = "Utility to generate png files from Borderlands 2 in-game skin files.",
 	long_description = l_desc,
 	long_description_content_type = "text/markdown",
-	packages = ["bl2_skingen"],
-	ext_modules = cythonize(to_compile, language_level = "3"),
+	packages = ["bl2_skingen", "bl2_skingen.imaging"],
+	ext_modules = cythonize(to_compile, language_level = "3") if cythonize is not None else [],
 	classifiers = [
 		"License :: OSI Approved :: MIT License",
 		"Natural Language :: English",
@@ -0,0 +1,210 @@
+"""
+Checks the imaging kernels of every backend that can be loaded against
+each other and against straightforward reference implementations, and
+that every backend renders the same pixels, with and without -band and
+FLAGS.MULTIPASS, for decalspecs that repeat and rotate the decal.
+Run from the repository's root with `python -m unittest discover tests`
+or `python -m pytest tests`.
+"""
+
+import logging
+from math import cos, sin, radians
+from pathlib import Path
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+
+import numpy
+from PIL import Image
+
+from bl2_skingen.api import render_skin
+from bl2_skingen.backends import BACKENDS, get_backend
+from bl2_skingen.flags import FLAGS
+from bl2_skingen.imaging import numpy_kernels
+from bl2_skingen.output import ImageWriter
+from bl2_skingen.skingen import SkinGenerator
+
+from benchmarks.synthetic import make_decal, make_package
+
+SIZE = 128
+DECALSPECS = (
+	# Tiled over the whole image.
+	"10% 10% 30 1.5 y",
+	# Tiled from an origin outside of the image.
+	"-50 -70 20 1.3 y",
+	# Rotated once, partly outside of the image.
+	"80% 30% 75 0.8 n",
+	# Along an axis, where a hole between tiles would be easy to see.
+	"5 9 0 0.7 y",
+)
+# Odd sizes are rounded up to an even amount of rows.
+BANDS = (1, 6, 40)
+
+TEST_LOGGER = logging.getLogger(__name__)
+TEST_LOGGER.addHandler(logging.NullHandler())
+TEST_LOGGER.propagate = False
+
+def _load_backends():
+	names = []
+	for name in BACKENDS:
+		try:
+			get_backend(name)
+		except ImportError:
+			continue
+		names.append(name)
+	return names
+
+def _tile_array_kernels():
+	kernels = [("numpy", numpy_kernels.tile_array)]
+	try:
+		from bl2_skingen.imaging.apply_decal import tile_array
+	except ImportError:
+		pass
+	else:
+		kernels.append(("cython", tile_array))
+	return kernels
+
+def _lattice(width, height, rot):
+	# Vectors between repeated decals of the given size, as place_decal computes them.
+	rot = radians(rot)
+	return (int(cos(rot) * width), int(-sin(rot) * width),
+		int(cos(rot + numpy.pi / 2) * height), int(-sin(rot + numpy.pi / 2) * height))
+
+def reference_tile_array(target, source, pos_x, pos_y, lr_x, lr_y, ud_x, ud_y, reach):
+	"""
+	Inserts source at every lattice position with |i|, |j| <= reach one
+	after another, in the order tile_array documents.
+	"""
+	order = list(range(0, reach + 1)) + list(range(-1, -reach - 1, -1))
+	for j in [-k for k in range(0, reach + 1)] + list(range(1, reach + 1)):
+		for i in order:
+			numpy_kernels.insert_array(target, source,
+				pos_x + lr_x * i + ud_x * j, pos_y + lr_y * i + ud_y * j)
+
+class TileDecalTest(unittest.TestCase):
+	def test_tile_array_matches_reference(self):
+		rng = numpy.random.default_rng(0)
+		source = rng.integers(0, 256, (13, 11, 4), dtype = numpy.uint8)
+		# Some fully transparent and opaque pixels, where blending is exact.
+		source[:3, :, 3] = 0
+		source[-3:, :, 3] = 255
+		for rot in (0, 30, 75, 90, 200):
+			lattice = _lattice(9, 7, rot)
+			for pos in ((0, 0), (5, 3), (-40, -55), (90, 70)):
+				expected = numpy.zeros((48, 64, 4), dtype = numpy.uint8)
+				reference_tile_array(expected, source, *pos, *lattice, reach = 40)
+				for name, tile_array in _tile_array_kernels():
+					with self.subTest(backend = name, rot = rot, pos = pos):
+						res = numpy.zeros((48, 64, 4), dtype = numpy.uint8)
+						tile_array(res, source, *pos, *lattice)
+						numpy.testing.assert_array_equal(expected, res)
+
+	def test_repeated_decal_has_no_holes(self):
+		source = numpy.full((7, 5, 4), 255, dtype = numpy.uint8)
+		for rot in (0, 90, 180):
+			lattice = _lattice(5, 7, rot)
+			for pos in ((0, 0), (3, 2), (-12, -30), (90, 70)):
+				for name, tile_array in _tile_array_kernels():
+					with self.subTest(backend = name, pos = pos, rot = rot):
+						# Rotated by a multiple of 90 degrees, the decal swaps sides.
+						rotated = source if rot % 180 == 0 else source.transpose(1, 0, 2)
+						res = numpy.zeros((48, 64, 4), dtype = numpy.uint8)
+						tile_array(res, rotated.copy(), *pos, *lattice)
+						self.assertTrue((res == 255).all())
+
+	def test_thin_rotated_decal(self):
+		# A long, thin decal has a nearly flat lattice, with hundreds of candidate
+		# tiles per pixel, none of which may be kept in memory all at once.
+		decal = Image.fromarray(numpy.full((4, 1000, 4), 200, dtype = numpy.uint8))
+		source, *lattice = get_backend("numpy").transform_decal(decal, 45, 1.0, 0.5)
+		results = []
+		for name, tile_array in _tile_array_kernels():
+			res = numpy.zeros((512, 512, 4), dtype = numpy.uint8)
+			if name == "numpy":
+				tracemalloc.start()
+				try:
+					tile_array(res, source, 10, 20, *lattice)
+					peak = tracemalloc.get_traced_memory()[1]
+				finally:
+					tracemalloc.stop()
+				self.assertLess(peak, 64 * 2**20)
+			else:
+				tile_array(res, source, 10, 20, *lattice)
+			results.append((name, res))
+		self.assertTrue(results[0][1][..., 3].any())
+		for name, res in results[1:]:
+			with self.subTest(backend = name):
+				numpy.testing.assert_array_equal(results[0][1], res)
+
+	def test_banded_insert_matches_whole(self):
+		decal = Image.fromarray(make_decal(16))
+		width, height = 64, 48
+		for name in _load_backends():
+			backend = get_backend(name)
+			for pos_x, pos_y, rot, scale, repeat in ((3, 5, 30, 1.5, True),
+					(-20, -9, 75, 0.8, True), (30, 20, 45, 2.0, False), (-8, 40, 0, 1.0, False)):
+				with self.subTest(backend = name, pos = (pos_x, pos_y), rot = rot,
+						repeat = repeat):
+					transformed = backend.transform_decal(decal, rot, scale, scale)
+					whole = numpy.zeros((height, width, 4), dtype = numpy.uint8)
+					res, off_x, off_y = backend.place_decal(decal, width, height, pos_x,
+						pos_y, rot, scale, scale, repeat)
+					whole[off_y:off_y + res.shape[0], off_x:off_x + res.shape[1]] = res
+					for y0 in range(0, height, 5):
+						y1 = min(y0 + 5, height)
+						band = numpy.zeros((y1 - y0, width, 4), dtype = numpy.uint8)
+						res, off_x, off_y = backend.insert_decal(transformed, width, y1 - y0,
+							pos_x, pos_y - y0, repeat)
+						band[off_y:off_y + res.shape[0], off_x:off_x + res.shape[1]] = res
+						numpy.testing.assert_array_equal(whole[y0:y1], band,
+							err_msg = f"rows {y0} to {y1}")
+
+class BackendEquivalenceTest(unittest.TestCase):
+	@classmethod
+	def setUpClass(cls):
+		cls.workdir = Path(tempfile.mkdtemp(prefix = "skingen_test_"))
+		cls.package = make_package(cls.workdir, SIZE)
+		cls.backends = _load_backends()
+
+	@classmethod
+	def tearDownClass(cls):
+		shutil.rmtree(cls.workdir, ignore_errors = True)
+
+	def render_banded(self, backend, decalspec, band):
+		out_dir = Path(self.workdir, "out", f"{backend}_{band}")
+		SkinGenerator(logger = TEST_LOGGER, in_dir = self.package, out_dir = out_dir,
+			out_fmt = "{part}", flag = FLAGS.NO_ASK | FLAGS.FORCE, decalspec = decalspec,
+			backend = backend, writer = ImageWriter("npy"), band = band).run()
+		return {part: numpy.load(Path(out_dir, f"{part}.npy")) for part in ("body", "head")}
+
+	def assert_same_parts(self, expected, actual, msg):
+		self.assertEqual(expected.keys(), actual.keys(), msg)
+		for part in expected:
+			numpy.testing.assert_array_equal(expected[part], actual[part],
+				err_msg = f"{msg}, {part}")
+
+	def test_backends_and_bands_match(self):
+		for decalspec in DECALSPECS:
+			expected = render_skin(self.package, decalspec = decalspec, backend = "numpy",
+				logger = TEST_LOGGER)
+			for backend in self.backends:
+				with self.subTest(decalspec = decalspec, backend = backend):
+					if backend != "numpy":
+						self.assert_same_parts(expected, render_skin(self.package,
+							decalspec = decalspec, backend = backend, logger = TEST_LOGGER),
+							f"{backend} backend with {decalspec!r}")
+					for band in BANDS:
+						self.assert_same_parts(expected,
+							self.render_banded(backend, decalspec, band),
+							f"{backend} backend at -band {band} with {decalspec!r}")
+
+	def test_multipass_matches(self):
+		for decalspec in DECALSPECS:
+			expected = render_skin(self.package, decalspec = decalspec, backend = "numpy",
+				logger = TEST_LOGGER)
+			for backend in self.backends:
+				with self.subTest(decalspec = decalspec, backend = backend):
+					self.assert_same_parts(expected, render_skin(self.package,
+						decalspec = decalspec, backend = backend, flags = FLAGS.MULTIPASS,
+						logger = TEST_LOGGER), f"{backend} multipass with {decalspec!r}")
@@ -0,0 +1,47 @@
+"""
+Checks that the Parser returns what LegacyParser does for the quirks of
+the props file format, and that parsing only some keys returns the same
+as parsing everything and leaving out the others.
+Run from the repository's root with `python -m unittest discover tests`
+or `python -m pytest tests`.
+"""
+
+import random
+import unittest
+
+from bl2_skingen.props import PARAMETER_VALUE_KEYS
+from bl2_skingen.unreal_notation import LegacyParser, Parser
+
+from benchmarks.synthetic import make_props
+
+PROPS = make_props("Synth", "Body", random.Random(0))
+
+CASES = {
+	"props file": PROPS,
+	"crlf": PROPS.replace("\n", "\r\n"),
+	"no eol": "A = 1\nB = { X=1, Y=2 }\nC = last",
+	"no eol after bracket": "A = 1\nB = { X=1, Y=2 }",
+	# "B =" takes the next line as its value, as it always has.
+	"empty values": "A = \nB =\nC = 3\nD = { X=, Y=2 }\n",
+	"inline list": "L[3] = { L[0] = a, L[1] = b, L[2] = c }\nM = 1\n",
+	"nesting": "O =\n{\n\tL[2] =\n\t{\n\t\tL[0] =\n\t\t{\n\t\t\tN = { R=1, G=2 }\n\t\t}\n"
+		"\t\tL[1] = x\n\t}\n\tZ = z\n}\n",
+	"trailing commas": "A = { R=1, G=2, }\nB = 1,\nC = 2\n",
+	"spaces": "A = some value with spaces\n  B   =   spaced\n",
+}
+
+class ParserTest(unittest.TestCase):
+	def test_matches_legacy_parser(self):
+		for name, data in CASES.items():
+			with self.subTest(case = name):
+				self.assertEqual(LegacyParser(data).parse(), Parser(data).parse())
+
+	def test_selected_keys_match_full_parse(self):
+		for name, data in CASES.items():
+			full = Parser(data).parse()
+			selections = [PARAMETER_VALUE_KEYS, ("Parent",), ("L", "C"), ("O",), ()]
+			selections.extend((key,) for key in full)
+			for keys in selections:
+				with self.subTest(case = name, keys = keys):
+					self.assertEqual({k: v for k, v in full.items() if k in keys},
+						Parser(data, keys).parse())